@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, Response
+from flask import Flask, request, jsonify, Response, g
 from flask_cors import CORS
 import subprocess
 import threading
@@ -8,10 +8,58 @@ import os
 import json
 import psutil
 import signal
+import shlex
+import uuid
+import hmac
+from collections import OrderedDict
 
 app = Flask(__name__)
 CORS(app)
 
+# How a command in a persistent shell ended
+COMPLETED = 'completed'
+SHELL_EXITED = 'shell_exited'
+TIMED_OUT = 'timed_out'
+
+class RequestTrace:
+    """Spans for one traced request, returned to the caller in the JSON response.
+
+    The client sends a W3C traceparent header; spans recorded here become its
+    children and are merged into the client's trace file.
+    """
+    def __init__(self, traceparent):
+        parts = (traceparent or '').split('-')
+        self.trace_id, self.parent_id = (parts[1], parts[2]) if len(parts) == 4 else (None, None)
+        self.spans = []
+        self.stack = []
+
+    @property
+    def enabled(self):
+        return self.trace_id is not None
+
+    def start(self, name, **attributes):
+        span = {
+            'name': name,
+            'trace_id': self.trace_id,
+            'span_id': uuid.uuid4().hex[:16],
+            'parent_id': self.stack[-1]['span_id'] if self.stack else self.parent_id,
+            'start_us': time.time_ns() // 1000,
+            'end_us': None,
+            'attributes': attributes,
+            'process': 'cmd-tool',
+            'pid': os.getpid(),
+            'tid': threading.get_ident()
+        }
+        self.stack.append(span)
+        self.spans.append(span)
+        return span
+
+    def end(self, span):
+        span['end_us'] = time.time_ns() // 1000
+        if span in self.stack:
+            self.stack.remove(span)
+
+
 class CommandExecutor:
     def __init__(self):
         self.active_processes = {}
@@ -109,7 +157,226 @@ class CommandExecutor:
             return False
         return self.active_processes[pid]['process'].poll() is None
 
+class ShellSession:
+    """A long-lived bash process that keeps cwd, variables and activated envs between commands.
+
+    Each command is framed by a random sentinel line carrying its exit
+    code and the shell's working directory afterwards, so output, status
+    and cwd are captured per command on one pipe. The
+    command text reaches bash as a quoted string run by eval, so a syntax
+    error or an unbalanced quote fails that command instead of breaking
+    the framing or the shell.
+    """
+    def __init__(self, shell_path):
+        self.process = subprocess.Popen(
+            [shell_path, '--noprofile', '--norc'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+            start_new_session=True
+        )
+        self.lines = queue.Queue()
+        self.lock = threading.Lock()
+        self.created = time.time()
+        self.last_used = time.time()
+        self.commands_run = 0
+        threading.Thread(target=self._read_output, daemon=True).start()
+
+    def _read_output(self):
+        try:
+            for line in self.process.stdout:
+                self.lines.put(line)
+        except (ValueError, OSError):
+            pass  # Pipe closed
+        self.lines.put(None)
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def run(self, command, working_dir=None, timeout=120):
+        """Run a command and return (output, exit_code, outcome, cwd).
+
+        The outcome is COMPLETED, SHELL_EXITED (the command ended the shell,
+        e.g. with `exit`; exit_code is the shell's status) or TIMED_OUT
+        (exit_code is None and the shell is killed). cwd is the shell's
+        working directory after a completed command, else None.
+        """
+        sentinel = f"__CMDTOOL_DONE_{uuid.uuid4().hex}__"
+        script = f"__cmdtool_command={shlex.quote(command)}\n"
+        if working_dir:
+            script += f"cd {shlex.quote(working_dir)} && "
+        # eval in the current shell keeps cd/export; stdin is closed so commands cannot eat the framing
+        script += "{ eval \"$__cmdtool_command\"; } < /dev/null 2>&1\n"
+        script += f"printf '\\n%s %d %s\\n' '{sentinel}' \"$?\" \"$PWD\"\n"
+
+        with self.lock:
+            self.last_used = time.time()
+            self.commands_run += 1
+            try:
+                self.process.stdin.write(script)
+                self.process.stdin.flush()
+            except (BrokenPipeError, OSError):
+                return "", self.process.poll(), SHELL_EXITED, None
+
+            output = []
+            deadline = time.time() + timeout
+            while True:
+                remaining = deadline - time.time()
+                try:
+                    line = self.lines.get(timeout=max(0.0, remaining))
+                except queue.Empty:
+                    self.close()
+                    return "".join(output), None, TIMED_OUT, None
+                if line is None:
+                    # The command ended the shell itself, e.g. with `exit`
+                    try:
+                        exit_code = self.process.wait(timeout=2)
+                    except subprocess.TimeoutExpired:
+                        exit_code = None
+                    return "".join(output), exit_code, SHELL_EXITED, None
+                if line.startswith(sentinel):
+                    self.last_used = time.time()
+                    text = "".join(output)
+                    _, exit_code, cwd = line.rstrip("\n").split(" ", 2)
+                    # Drop the newline printed before the sentinel
+                    return (text[:-1] if text.endswith("\n") else text), int(exit_code), COMPLETED, cwd
+                output.append(line)
+
+    def close(self):
+        try:
+            os.killpg(self.process.pid, signal.SIGTERM)
+        except (ProcessLookupError, PermissionError, OSError):
+            pass
+        try:
+            self.process.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+class ShellSessionManager:
+    """Maps conversation ids to persistent shells, backed by a pool of pre-forked warm shells.
+
+    A session whose shell was reaped or died gets a fresh shell on its next
+    command, and that command is reported with shell_reset so the caller
+    knows its shell state is gone.
+    """
+    MAX_LOST_SESSIONS = 10000
+
+    def __init__(self, shell_path=None, warm_size=2, idle_timeout=900):
+        self.shell_path = shell_path or os.environ.get('CMDTOOL_SHELL', '/bin/bash')
+        self.warm_size = warm_size
+        self.idle_timeout = idle_timeout
+        self.sessions = {}
+        self.lost = OrderedDict()  # Session ids whose shell was closed without the caller being told
+        self.warm = queue.Queue()
+        self.lock = threading.Lock()
+        self.supported = os.name == 'posix' and os.path.exists(self.shell_path)
+        if self.supported:
+            self._refill()
+            self._start_reaper_thread()
+
+    def _refill(self):
+        """Top the warm pool back up on a background thread"""
+        def fill():
+            while self.warm.qsize() < self.warm_size:
+                try:
+                    self.warm.put(ShellSession(self.shell_path))
+                except OSError as e:
+                    print(f"Error starting warm shell: {e}")
+                    return
+        threading.Thread(target=fill, daemon=True).start()
+
+    def _start_reaper_thread(self):
+        def reap_idle_sessions():
+            while True:
+                time.sleep(30)
+                self.reap()
+
+        threading.Thread(target=reap_idle_sessions, daemon=True).start()
+
+    def reap(self):
+        """Close shells that are idle past the timeout or have died"""
+        now = time.time()
+        with self.lock:
+            idle = [sid for sid, shell in self.sessions.items()
+                    if now - shell.last_used > self.idle_timeout or not shell.is_alive()]
+            shells = [self.sessions.pop(sid) for sid in idle]
+            for sid in idle:
+                self._mark_lost(sid)
+        for shell in shells:
+            shell.close()
+
+    def _take_warm_shell(self):
+        while True:
+            try:
+                shell = self.warm.get_nowait()
+            except queue.Empty:
+                shell = ShellSession(self.shell_path)
+            if shell.is_alive():
+                self._refill()
+                return shell
+
+    def _mark_lost(self, session_id):
+        self.lost[session_id] = True
+        while len(self.lost) > self.MAX_LOST_SESSIONS:
+            self.lost.popitem(last=False)
+
+    def get(self, session_id):
+        """Return (shell, replaced) for a session, starting (or recycling) a shell if needed.
+
+        `replaced` is True when the session had a shell that was reaped or died.
+        """
+        with self.lock:
+            shell = self.sessions.get(session_id)
+            replaced = self.lost.pop(session_id, None) is not None
+            if shell is None or not shell.is_alive():
+                replaced = replaced or shell is not None
+                if shell is not None:
+                    shell.close()
+                shell = self._take_warm_shell()
+                self.sessions[session_id] = shell
+            return shell, replaced
+
+    def run(self, session_id, command, working_dir=None, timeout=120):
+        """Run a command in the session's shell; returns (output, exit_code, outcome, cwd, replaced)"""
+        if not self.supported:
+            completed = subprocess.run(command, shell=True, cwd=working_dir or None, capture_output=True,
+                                       text=True, timeout=timeout)
+            return (completed.stdout + completed.stderr, completed.returncode, COMPLETED,
+                    os.path.abspath(working_dir or os.getcwd()), False)
+        shell, replaced = self.get(session_id)
+        output, exit_code, outcome, cwd = shell.run(command, working_dir, timeout)
+        if outcome != COMPLETED:
+            # The session gets a fresh shell on its next command
+            with self.lock:
+                if self.sessions.get(session_id) is shell:
+                    del self.sessions[session_id]
+            shell.close()
+        return output, exit_code, outcome, cwd, replaced
+
+    def close(self, session_id):
+        with self.lock:
+            shell = self.sessions.pop(session_id, None)
+        if shell:
+            shell.close()
+            return True
+        return False
+
+    def list_sessions(self):
+        with self.lock:
+            return {
+                sid: {
+                    'pid': shell.process.pid,
+                    'idle_seconds': round(time.time() - shell.last_used, 1),
+                    'commands_run': shell.commands_run,
+                    'alive': shell.is_alive()
+                }
+                for sid, shell in self.sessions.items()
+            }
+
 executor = CommandExecutor()
+shell_sessions = ShellSessionManager()
 
 # Whitelist configuration
 WHITELIST = {
@@ -124,11 +391,43 @@ def check_whitelist(command):
         return WHITELIST[cmd]['approved']
     return False
 
+# Shared secret required on every request except /health; set with --token or CMDTOOL_TOKEN
+AUTH_TOKEN = os.environ.get('CMDTOOL_TOKEN') or None
+
+@app.before_request
+def check_token():
+    if AUTH_TOKEN is None or request.endpoint == 'health':
+        return None
+    supplied = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(supplied.encode(), f"Bearer {AUTH_TOKEN}".encode()):
+        return jsonify({'error': 'Missing or invalid token'}), 401
+    return None
+
+@app.before_request
+def start_trace():
+    g.trace = RequestTrace(request.headers.get('traceparent'))
+    if g.trace.enabled:
+        g.request_span = g.trace.start(f"cmdtool.{request.endpoint}", path=request.path)
+
+@app.after_request
+def attach_trace(response):
+    trace = g.get('trace')
+    if not trace or not trace.enabled or not response.is_json:
+        return response
+    trace.end(g.request_span)
+    g.request_span['attributes']['status'] = response.status_code
+    body = response.get_json(silent=True)
+    if isinstance(body, dict):
+        body['trace_spans'] = trace.spans
+        response.set_data(json.dumps(body))
+    return response
+
 @app.route('/execute', methods=['POST'])
 def execute_command():
     print("Received execute request") # Debug print
     command = request.json.get('command', '').strip()
-    working_dir = request.json.get('working_directory', os.getcwd())
+    session_id = request.json.get('session_id')
+    working_dir = request.json.get('working_directory', None if session_id else os.getcwd())
     
     print(f"Command: {command}") # Debug print
     print(f"Working dir: {working_dir}") # Debug print
@@ -159,8 +458,44 @@ def execute_command():
         print(f"Returning approval required: {response}") # Debug print
         return jsonify(response), 202
     
+    if session_id:
+        # Run in the conversation's persistent shell and wait for the result
+        timeout = float(request.json.get('timeout', 120))
+        span = g.trace.start('cmdtool.process', session_id=session_id, command=command) if g.trace.enabled else None
+        try:
+            output, exit_code, outcome, cwd, replaced = shell_sessions.run(session_id, command, working_dir, timeout)
+        except Exception as e:
+            print(f"Error executing command: {str(e)}") # Debug print
+            return jsonify({'error': str(e)}), 500
+        finally:
+            if span:
+                shell = shell_sessions.sessions.get(session_id)
+                span['attributes']['shell_pid'] = shell.process.pid if shell else None
+                g.trace.end(span)
+        if outcome == TIMED_OUT:
+            return jsonify({
+                'status': TIMED_OUT,
+                'error': f'Command timed out after {timeout} seconds',
+                'partial_output': output,
+                'shell_reset': True
+            }), 504
+        return jsonify({
+            'status': outcome,
+            'output': output,
+            'exit_code': exit_code,
+            'cwd': cwd,
+            'session_id': session_id,
+            'shell_reset': outcome == SHELL_EXITED or replaced,
+            # The command ran in a new shell because the session's old one was reaped or died
+            'shell_replaced': replaced
+        })
+
     try:
+        span = g.trace.start('cmdtool.spawn', command=command) if g.trace.enabled else None
         pid = executor.execute_command(command, working_dir)
+        if span:
+            span['attributes']['pid'] = pid
+            g.trace.end(span)
         response = {
             'status': 'started',
             'pid': pid
@@ -191,6 +526,24 @@ def terminate_process(pid):
         return jsonify({'status': 'terminated'})
     return jsonify({'error': 'Process not found'}), 404
 
+@app.route('/health', methods=['GET'])
+def health():
+    return jsonify({
+        'status': 'ok',
+        'sessions': len(shell_sessions.sessions),
+        'active_processes': len(executor.active_processes)
+    })
+
+@app.route('/sessions', methods=['GET'])
+def list_sessions():
+    return jsonify({'sessions': shell_sessions.list_sessions()})
+
+@app.route('/sessions/<session_id>', methods=['DELETE'])
+def close_session(session_id):
+    if shell_sessions.close(session_id):
+        return jsonify({'status': 'closed'})
+    return jsonify({'error': 'Session not found'}), 404
+
 @app.route('/approve', methods=['POST'])
 def approve_command():
     command = request.json.get('command', '').strip()
@@ -209,4 +562,19 @@ def approve_command():
     return jsonify({'status': 'approved'})
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5001)
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Command execution tool server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--token', default=None,
+                        help="Shared token clients must send (default: $CMDTOOL_TOKEN); required off loopback")
+    parser.add_argument('--debug', action='store_true', help="Run Flask in debug mode (loopback only)")
+    args = parser.parse_args()
+    if args.token:
+        AUTH_TOKEN = args.token
+    loopback = args.host in ('127.0.0.1', 'localhost', '::1')
+    if not loopback and AUTH_TOKEN is None:
+        parser.error(f"--host {args.host} exposes command execution; set --token or CMDTOOL_TOKEN")
+    if not loopback and args.debug:
+        parser.error("--debug is only allowed on a loopback host")
+    app.run(debug=args.debug, host=args.host, port=args.port)
\ No newline at end of file
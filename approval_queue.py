@@ -0,0 +1,104 @@
+import uuid
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Decisions, matching CommandApprovalDialog.result
+DENY = 'deny'
+APPROVE = 'approve'
+APPROVE_ALWAYS = 'approve_always'
+
+
+class ApprovalPending(Exception):
+    """Raised by a tool call that was parked until a command is approved"""
+
+    def __init__(self, pending):
+        super().__init__(f"Command awaiting approval: {pending.command}")
+        self.pending = pending
+
+
+class PendingApproval:
+    """A command waiting for a human decision; every caller waiting on it is released together"""
+
+    def __init__(self, command, conversation_id):
+        self.id = uuid.uuid4().hex
+        self.command = command
+        self.conversation_id = conversation_id
+        self.created = time.time()
+        self.decision = None
+        self.reason = None
+        self._event = threading.Event()
+
+    def resolve(self, decision, reason=None):
+        self.decision = decision
+        self.reason = reason
+        self._event.set()
+
+    def wait(self, timeout=None):
+        """Block until decided; returns the decision or None on timeout"""
+        self._event.wait(timeout)
+        return self.decision
+
+
+class ApprovalQueue:
+    """Holds commands that need sign-off until a listener (the GUI) decides them.
+
+    Waiting callers block on an event rather than polling the server, and
+    listeners are told when the queue changes so that they can put every
+    pending command in front of the user at once. The same command from the
+    same conversation shares one entry.
+    """
+
+    def __init__(self, timeout=600):
+        self.timeout = timeout
+        self._pending = OrderedDict()
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """Call `callback()` from the submitting thread whenever a command is queued"""
+        self._listeners.append(callback)
+
+    def submit(self, command, conversation_id):
+        """Queue a command for approval and return its PendingApproval"""
+        with self._lock:
+            for pending in self._pending.values():
+                if pending.command == command and pending.conversation_id == conversation_id:
+                    return pending
+            pending = PendingApproval(command, conversation_id)
+            if not self._listeners:
+                # Nobody can answer (e.g. running headless), so do not wait for a decision
+                pending.resolve(DENY, "no approver is available")
+                return pending
+            self._pending[pending.id] = pending
+
+        logger.info(f"Command awaiting approval: {command}")
+        for callback in list(self._listeners):
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Error in approval listener: {e}")
+        return pending
+
+    def pending(self):
+        """Return the undecided approvals, oldest first"""
+        with self._lock:
+            return list(self._pending.values())
+
+    def decide(self, approval_ids, decision, reason=None):
+        """Resolve approvals by id, releasing every caller parked on them"""
+        with self._lock:
+            decided = [self._pending.pop(approval_id) for approval_id in approval_ids if approval_id in self._pending]
+        for pending in decided:
+            pending.resolve(decision, reason)
+        return len(decided)
+
+    def wait(self, pending):
+        """Wait for a decision, denying the command if none arrives within the timeout"""
+        decision = pending.wait(self.timeout)
+        if decision is None:
+            self.decide([pending.id], DENY, f"no decision within {self.timeout} seconds")
+        return pending.decision
@@ -0,0 +1,214 @@
+"""Local stand-ins for the Anthropic Messages API and the tool servers.
+
+Each fake is a small threaded HTTP server bound to an ephemeral port on
+localhost, so benchmarks can run ClaudeAPI end to end without network access.
+"""
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _JSONHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output clean
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return self.rfile.read(length) if length else b''
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _dispatch(self, body):
+        owner = self.server.owner
+        owner.record_request(self.path, len(body))
+        payload = json.loads(body) if body else {}
+        status, response = owner.handle(self.path, payload, self.headers)
+        self._send_json(status, response)
+
+    def do_POST(self):
+        self._dispatch(self._read_body())
+
+    def do_GET(self):
+        self._dispatch(b'')
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # The default of 5 drops connections under concurrent load
+
+
+class FakeServer:
+    """Base class for the fake HTTP servers"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.request_count = 0
+        self.request_sizes = []
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+    def start(self):
+        """Start serving on an ephemeral localhost port"""
+        self._httpd = _Server(('127.0.0.1', 0), _JSONHandler)
+        self._httpd.owner = self
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Shut the server down"""
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record_request(self, path, size):
+        with self._lock:
+            self.request_count += 1
+            self.request_sizes.append(size)
+
+    def reset_stats(self):
+        with self._lock:
+            self.request_count = 0
+            self.request_sizes = []
+
+    def handle(self, path, payload, headers):
+        """Return (status, json_payload) for a request"""
+        raise NotImplementedError
+
+
+class FakeAnthropicServer(FakeServer):
+    """Scripted stand-in for the Messages endpoint (POST /v1/messages)"""
+
+    def __init__(self, latency=0.0, model='claude-fake'):
+        super().__init__(latency)
+        self.model = model
+        self.fail_models = set()  # Requests for these models get a 404 not_found_error
+        self._script = deque()
+
+    @staticmethod
+    def tool_use(name, tool_input, text="Working on the next step."):
+        """Build a scripted response that requests a single tool call"""
+        return {
+            'content': [
+                {'type': 'text', 'text': text},
+                {
+                    'type': 'tool_use',
+                    'id': f"toolu_{uuid.uuid4().hex[:24]}",
+                    'name': name,
+                    'input': tool_input,
+                },
+            ],
+            'stop_reason': 'tool_use',
+        }
+
+    @staticmethod
+    def text(text="Done."):
+        """Build a scripted final text response"""
+        return {
+            'content': [{'type': 'text', 'text': text}],
+            'stop_reason': 'end_turn',
+        }
+
+    def script(self, responses):
+        """Queue responses to serve, in order; a final text reply is served once empty"""
+        with self._lock:
+            self._script.extend(responses)
+
+    def clear_script(self):
+        with self._lock:
+            self._script.clear()
+
+    def handle(self, path, payload, headers):
+        if not path.rstrip('/').endswith('/v1/messages'):
+            return 404, {'type': 'error', 'error': {'type': 'not_found_error', 'message': path}}
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if payload.get('model') in self.fail_models:
+            return 404, {'type': 'error', 'error': {'type': 'not_found_error', 'message': f"model: {payload.get('model')}"}}
+
+        with self._lock:
+            scripted = self._script.popleft() if self._script else self.text()
+            input_size = self.request_sizes[-1] if self.request_sizes else 0
+
+        output_size = len(json.dumps(scripted['content']))
+        return 200, {
+            'id': f"msg_{uuid.uuid4().hex[:24]}",
+            'type': 'message',
+            'role': 'assistant',
+            'model': payload.get('model', self.model),
+            'content': scripted['content'],
+            'stop_reason': scripted['stop_reason'],
+            'stop_sequence': None,
+            'usage': {
+                # Rough 4-bytes-per-token estimate, good enough for trends
+                'input_tokens': max(1, input_size // 4),
+                'output_tokens': max(1, output_size // 4),
+            },
+        }
+
+
+class FakeFilesystemServer(FakeServer):
+    """Stand-in for the filesystem MCP server (POST /mcp)"""
+
+    def __init__(self, latency=0.0, payload_size=1024):
+        super().__init__(latency)
+        self.payload_size = payload_size
+
+    def handle(self, path, payload, headers):
+        if self.latency:
+            time.sleep(self.latency)
+
+        params = payload.get('params', {})
+        arguments = params.get('arguments', {})
+        target = arguments.get('path', '')
+        filler = f"{params.get('name')} {target}\n"
+        content = (filler * (self.payload_size // max(1, len(filler)) + 1))[:self.payload_size]
+        return 200, {'content': content, 'is_error': False}
+
+
+class FakeCmdToolServer(FakeServer):
+    """Stand-in for the cmd-tool server (POST /execute)"""
+
+    def __init__(self, latency=0.0, payload_size=256):
+        super().__init__(latency)
+        self.payload_size = payload_size
+
+    def handle(self, path, payload, headers):
+        if path.startswith('/health'):
+            return 200, {'status': 'ok'}
+        if not path.startswith('/execute'):
+            return 404, {'error': 'Not found'}
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        line = f"$ {payload.get('command', '')}\n"
+        output = (line * (self.payload_size // max(1, len(line)) + 1))[:self.payload_size]
+        return 200, {'status': 'completed', 'output': output, 'exit_code': 0}
@@ -0,0 +1,409 @@
+"""Offline benchmark suite for ClaudeChat.
+
+Runs ClaudeAPI end to end against the local stand-ins in fakes.py and
+writes machine-readable JSON results so regressions can be tracked.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--output results.json] [--only NAME ...]
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from fakes import FakeAnthropicServer, FakeFilesystemServer, FakeCmdToolServer  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+def summarize(samples):
+    """Return summary statistics (in milliseconds) for a list of durations in seconds"""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    p95_index = min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))
+    return {
+        'count': len(ordered),
+        'min_ms': ordered[0] * 1000,
+        'median_ms': statistics.median(ordered) * 1000,
+        'mean_ms': statistics.fmean(ordered) * 1000,
+        'p95_ms': ordered[p95_index] * 1000,
+        'max_ms': ordered[-1] * 1000,
+    }
+
+
+def tool_block(name, tool_input, index=0):
+    """Build an object shaped like an SDK tool_use content block"""
+    return SimpleNamespace(type='tool_use', name=name, input=tool_input, id=f"toolu_bench_{index}")
+
+
+class BenchEnvironment:
+    """Starts the fakes and builds a ClaudeAPI instance wired to them"""
+
+    def __init__(self, args, scratch):
+        self.args = args
+        self.scratch = scratch
+        self.anthropic = FakeAnthropicServer(latency=args.api_latency)
+        self.filesystem = FakeFilesystemServer(latency=args.tool_latency, payload_size=args.payload_size)
+        self.cmdtools = [FakeCmdToolServer(latency=args.tool_latency, payload_size=args.payload_size)
+                         for _ in range(args.cmd_workers)]
+        self.servers = [self.anthropic, self.filesystem] + self.cmdtools
+
+    def __enter__(self):
+        for server in self.servers:
+            server.start()
+        os.environ['ANTHROPIC_API_KEY'] = 'sk-bench-offline'
+        os.environ['ANTHROPIC_BASE_URL'] = self.anthropic.base_url
+        # Keep everything ClaudeAPI writes inside the scratch directory
+        with open(os.path.join(self.scratch, 'config.json'), 'w') as f:
+            json.dump({
+                'sessions_db': os.path.join(self.scratch, 'sessions.db'),
+                'blob_dir': os.path.join(self.scratch, 'blobs'),
+            }, f)
+        return self
+
+    def __exit__(self, *exc):
+        for server in self.servers:
+            server.stop()
+
+    def make_api(self):
+        from claude_api import ClaudeAPI
+
+        api = ClaudeAPI()
+        api.filesystem_url = f"{self.filesystem.base_url}/mcp"
+        api.set_cmdtool_endpoints([server.base_url for server in self.cmdtools])
+        api.retry_delay = 0
+        return api
+
+    def reset(self):
+        for server in self.servers:
+            server.reset_stats()
+        self.anthropic.clear_script()
+
+    def script_turn(self, tool_calls):
+        """Script one user turn that makes `tool_calls` tool calls before answering"""
+        responses = []
+        for i in range(tool_calls):
+            if i % 2:
+                responses.append(FakeAnthropicServer.tool_use(
+                    'execute_command', {'command': f"echo step {i}", 'working_directory': '.'}))
+            else:
+                responses.append(FakeAnthropicServer.tool_use('read_file', {'path': f"file_{i}.txt"}))
+        responses.append(FakeAnthropicServer.text("All steps finished."))
+        self.anthropic.script(responses)
+
+
+def bench_send_message_loop(env, args):
+    """End-to-end latency of ClaudeAPI.send_message for a multi-step tool turn"""
+    api = env.make_api()
+    api.warm_up()  # Keep the lazy SDK import and client construction out of the first sample
+    durations = []
+    model_calls = []
+    request_bytes = []
+
+    for _ in range(args.repeat):
+        api.clear_conversation()
+        env.reset()
+        env.script_turn(args.tool_calls)
+        start = time.perf_counter()
+        api.send_message("Run the scripted task.")
+        durations.append(time.perf_counter() - start)
+        model_calls.append(env.anthropic.request_count)
+        request_bytes.extend(env.anthropic.request_sizes)
+
+    simulated = (args.tool_calls + 1) * args.api_latency + args.tool_calls * args.tool_latency
+    latency = summarize(durations)
+    return {
+        'tool_calls_per_turn': args.tool_calls,
+        'latency': latency,
+        'overhead_median_ms': latency['median_ms'] - simulated * 1000,
+        'model_calls_per_turn': statistics.fmean(model_calls),
+        'mean_request_bytes': statistics.fmean(request_bytes) if request_bytes else 0,
+        'routes': api.get_route_stats(),
+    }
+
+
+def bench_tool_round_trip(env, args):
+    """Overhead of a single handle_tool_use call per tool server"""
+    api = env.make_api()
+    api.warm_up()
+    results = {}
+    cases = {
+        'read_file': {'path': 'bench.txt'},
+        'execute_command': {'command': 'echo bench', 'working_directory': '.'},
+    }
+    for name, tool_input in cases.items():
+        durations = []
+        for i in range(args.samples):
+            block = tool_block(name, tool_input, i)
+            start = time.perf_counter()
+            api.handle_tool_use(block)
+            durations.append(time.perf_counter() - start)
+        stats = summarize(durations)
+        stats['overhead_median_ms'] = stats['median_ms'] - args.tool_latency * 1000
+        results[name] = stats
+    return results
+
+
+def bench_cmd_tool_throughput(env, args):
+    """Commands per second with N concurrent conversations sharing one dispatcher"""
+    base = env.make_api()
+    results = []
+    for concurrency in args.concurrency:
+        env.reset()
+        # One ClaudeAPI per conversation, as with sub-agents or several windows
+        apis = [base] + [env.make_api() for _ in range(concurrency - 1)]
+        for api in apis[1:]:
+            api.set_cmd_dispatcher(base.cmd_dispatcher)
+        total = max(args.commands, concurrency)
+        calls = [(apis[i % concurrency],
+                  tool_block('execute_command', {'command': f"echo {i}"}, i))
+                 for i in range(total)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(lambda call: call[0].handle_tool_use(call[1]), calls))
+        elapsed = time.perf_counter() - start
+        errors = sum(1 for outcome in outcomes if isinstance(outcome, dict) and outcome.get('is_error'))
+        results.append({
+            'concurrency': concurrency,
+            'workers': len(env.cmdtools),
+            'requests_per_worker': [server.request_count for server in env.cmdtools],
+            'commands': total,
+            'errors': errors,
+            'elapsed_s': elapsed,
+            'commands_per_s': total / elapsed if elapsed else 0.0,
+        })
+    return {'levels': results}
+
+
+def bench_memory_growth(env, args):
+    """Traced memory and request size as the conversation history grows"""
+    api = env.make_api()
+    api.clear_conversation()
+    env.reset()
+    samples = []
+
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        for turn in range(1, args.turns + 1):
+            env.script_turn(1)
+            api.send_message(f"Turn {turn}")
+            if turn % args.sample_every == 0 or turn == args.turns:
+                current, peak = tracemalloc.get_traced_memory()
+                samples.append({
+                    'turn': turn,
+                    'history_messages': len(api.conversation_history),
+                    'traced_bytes': current - baseline,
+                    'peak_bytes': peak - baseline,
+                    'last_request_bytes': env.anthropic.request_sizes[-1],
+                })
+    finally:
+        tracemalloc.stop()
+
+    first, last = samples[0], samples[-1]
+    turns = last['turn'] - first['turn']
+    return {
+        'turns': args.turns,
+        'samples': samples,
+        'bytes_per_turn': (last['traced_bytes'] - first['traced_bytes']) / turns if turns else 0.0,
+        'request_bytes_per_turn': (last['last_request_bytes'] - first['last_request_bytes']) / turns if turns else 0.0,
+    }
+
+
+def bench_replay_loop(env, args):
+    """send_message latency when replaying a recorded cassette instead of calling the servers"""
+    from cassette import Cassette, RECORD, REPLAY
+
+    path = os.path.join(env.scratch, 'bench_cassette.jsonl')
+    if os.path.exists(path):
+        os.remove(path)
+
+    api = env.make_api()
+    env.reset()
+    env.script_turn(args.tool_calls)
+    api.set_cassette(Cassette(path, mode=RECORD))
+    start = time.perf_counter()
+    api.send_message("Run the scripted task.")
+    recorded = time.perf_counter() - start
+
+    replay = Cassette(path, mode=REPLAY, strict=True)
+    api.set_cassette(replay)
+    env.reset()
+    durations = []
+    for _ in range(args.repeat):
+        api.clear_conversation()
+        replay.rewind()
+        start = time.perf_counter()
+        api.send_message("Run the scripted task.")
+        durations.append(time.perf_counter() - start)
+
+    return {
+        'tool_calls_per_turn': args.tool_calls,
+        'recorded_ms': recorded * 1000,
+        'replay': summarize(durations),
+        'server_requests_during_replay': sum(server.request_count for server in env.servers),
+    }
+
+
+def load_cmd_tool():
+    """Import Tools/cmd-tool/cmd-tool.py, which is not an importable module name"""
+    import importlib.util
+
+    path = os.path.join(REPO_ROOT, 'Tools', 'cmd-tool', 'cmd-tool.py')
+    spec = importlib.util.spec_from_file_location('cmd_tool', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def bench_shell_sessions(env, args):
+    """Per-command cost of a fresh shell versus a persistent cmd-tool shell session"""
+    try:
+        cmd_tool = load_cmd_tool()
+    except ImportError as e:
+        return {'skipped': f"cmd-tool dependencies missing: {e}"}
+    manager = cmd_tool.ShellSessionManager(warm_size=1)
+    if not manager.supported:
+        return {'skipped': 'persistent shells need a POSIX system with bash'}
+
+    import subprocess
+
+    one_shot = []
+    for _ in range(args.samples):
+        start = time.perf_counter()
+        subprocess.run('echo bench', shell=True, capture_output=True, text=True)
+        one_shot.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    manager.run('bench', 'true')
+    first_command = time.perf_counter() - start
+
+    session = []
+    for _ in range(args.samples):
+        start = time.perf_counter()
+        manager.run('bench', 'echo bench')
+        session.append(time.perf_counter() - start)
+    manager.close('bench')
+
+    return {
+        'one_shot': summarize(one_shot),
+        'session_first_command_ms': first_command * 1000,
+        'session': summarize(session),
+    }
+
+
+def bench_subagent_fanout(env, args):
+    """Wall-clock time of a run_subagents fan-out at each concurrency limit"""
+    from subagents import SubAgentRunner
+
+    # Fan-out only pays off when model calls take time, so simulate some if none is set
+    latency = args.api_latency or 0.05
+    saved_latency, env.anthropic.latency = env.anthropic.latency, latency
+    api = env.make_api()
+    api.warm_up()  # Children share the parent's SDK client; keep its construction out of the timings
+    tasks = [f"Review module_{i}.py" for i in range(args.fanout_tasks)]
+    levels = []
+    try:
+        for limit in args.concurrency:
+            env.reset()
+            start = time.perf_counter()
+            results = SubAgentRunner(api, limit).run(tasks)
+            elapsed = time.perf_counter() - start
+            levels.append({
+                'concurrency': limit,
+                'wall_s': elapsed,
+                'failed': sum(1 for result in results if result.error),
+                'model_calls': env.anthropic.request_count,
+            })
+    finally:
+        env.anthropic.latency = saved_latency
+
+    serial = len(tasks) * latency
+    for level in levels:
+        level['speedup_vs_serial'] = serial / level['wall_s'] if level['wall_s'] else 0.0
+    return {'tasks': len(tasks), 'api_latency_s': latency, 'levels': levels}
+
+
+BENCHMARKS = {
+    'send_message_loop': bench_send_message_loop,
+    'tool_round_trip': bench_tool_round_trip,
+    'cmd_tool_throughput': bench_cmd_tool_throughput,
+    'memory_growth': bench_memory_growth,
+    'shell_sessions': bench_shell_sessions,
+    'replay_loop': bench_replay_loop,
+    'subagent_fanout': bench_subagent_fanout,
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the offline ClaudeChat benchmarks")
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help="Run only these benchmarks")
+    parser.add_argument('--output', help="Write JSON results to this file instead of stdout")
+    parser.add_argument('--repeat', type=int, default=20, help="Turns per send_message_loop run")
+    parser.add_argument('--tool-calls', type=int, default=3, help="Tool calls per scripted turn")
+    parser.add_argument('--samples', type=int, default=200, help="Calls per tool round-trip case")
+    parser.add_argument('--commands', type=int, default=200, help="Commands per throughput level")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16], help="Concurrency levels")
+    parser.add_argument('--turns', type=int, default=200, help="Turns for the memory growth run")
+    parser.add_argument('--sample-every', type=int, default=25, help="Memory sampling interval in turns")
+    parser.add_argument('--api-latency', type=float, default=0.0, help="Simulated model latency in seconds")
+    parser.add_argument('--tool-latency', type=float, default=0.0, help="Simulated tool latency in seconds")
+    parser.add_argument('--cmd-workers', type=int, default=1, help="Number of fake cmd-tool workers")
+    parser.add_argument('--payload-size', type=int, default=2048, help="Bytes returned by each tool call")
+    parser.add_argument('--fanout-tasks', type=int, default=16, help="Sub-agent tasks per fan-out run")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    selected = args.only or list(BENCHMARKS)
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'params': {key: value for key, value in vars(args).items() if key not in ('only', 'output')},
+        },
+        'results': {},
+    }
+
+    # Run from a scratch directory so Config never touches the real config.json
+    original_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch, BenchEnvironment(args, scratch) as env:
+        os.chdir(scratch)
+        try:
+            for name in selected:
+                start = time.perf_counter()
+                result = BENCHMARKS[name](env, args)
+                result['wall_s'] = time.perf_counter() - start
+                report['results'][name] = result
+        finally:
+            os.chdir(original_cwd)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+import os
+import time
+import hashlib
+import logging
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+
+class BlobStore:
+    """Content-addressed, on-disk store for large tool results.
+
+    Blobs are keyed by a prefix of their SHA-256 digest, so storing the same
+    output twice costs nothing and a handle stays valid across sessions.
+    Storing or reading a blob refreshes its modification time, and prune()
+    removes the least recently used blobs by age and total size.
+    """
+    HANDLE_PREFIX = 'blob:'
+    DIGEST_LENGTH = 16
+
+    def __init__(self, root):
+        self.root = os.path.expanduser(root)
+
+    def _path(self, blob_id):
+        return os.path.join(self.root, blob_id[:2], blob_id)
+
+    def _blob_id(self, handle):
+        """Return the blob id of a handle, or None if the handle is malformed"""
+        if not isinstance(handle, str):
+            return None
+        blob_id = handle[len(self.HANDLE_PREFIX):] if handle.startswith(self.HANDLE_PREFIX) else handle
+        if len(blob_id) != self.DIGEST_LENGTH or any(c not in '0123456789abcdef' for c in blob_id):
+            return None
+        return blob_id
+
+    def put(self, text):
+        """Store text and return its handle"""
+        data = text.encode('utf-8')
+        blob_id = hashlib.sha256(data).hexdigest()[:self.DIGEST_LENGTH]
+        path = self._path(blob_id)
+        if os.path.exists(path):
+            self._touch(path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except Exception:
+                os.unlink(tmp_path)
+                raise
+        return f"{self.HANDLE_PREFIX}{blob_id}"
+
+    def get(self, handle):
+        """Return the full text of a blob, or None if it is unknown"""
+        blob_id = self._blob_id(handle)
+        if blob_id is None:
+            return None
+        path = self._path(blob_id)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        except FileNotFoundError:
+            return None
+        self._touch(path)
+        return text
+
+    @staticmethod
+    def _touch(path):
+        try:
+            os.utime(path)
+        except OSError:
+            pass  # Pruned in the meantime
+
+    def prune(self, max_bytes=None, max_age_days=None):
+        """Delete blobs unused for `max_age_days`, then the least recently used beyond `max_bytes`.
+
+        Returns (blobs removed, bytes freed). Handles of removed blobs read
+        back as unknown.
+        """
+        entries = []  # (mtime, size, path)
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        cutoff = time.time() - max_age_days * 86400 if max_age_days else None
+        total = sum(size for _, size, _ in entries)
+        removed = freed = 0
+        for mtime, size, path in entries:
+            expired = cutoff is not None and mtime < cutoff
+            over_size = max_bytes is not None and total > max_bytes
+            if not (expired or over_size):
+                break  # Entries are oldest first
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+            freed += size
+        if removed:
+            logger.info(f"Pruned {removed} blobs ({freed} bytes) from {self.root}")
+        return removed, freed
+
+    def read_slice(self, handle, offset=0, length=4000):
+        """Return (text, total_length) for a character range of a blob, or (None, 0)"""
+        text = self.get(handle)
+        if text is None:
+            return None, 0
+        offset = max(0, offset)
+        return text[offset:offset + max(0, length)], len(text)
@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import defaultdict, deque
+
+logger = logging.getLogger(__name__)
+
+OFF = 'off'
+RECORD = 'record'
+REPLAY = 'replay'
+
+
+class CassetteMiss(LookupError):
+    """Raised in strict replay when no recorded interaction matches a request"""
+
+
+def fingerprint(kind, payload):
+    """Stable hash of a request, independent of dict ordering"""
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(f"{kind}:{canonical}".encode('utf-8')).hexdigest()
+
+
+class Cassette:
+    """Records Anthropic responses and tool results to a JSON Lines file and replays them.
+
+    Interactions are matched by request fingerprint, in recorded order for
+    repeated requests. Outside strict mode an unmatched request falls back
+    to the next unused interaction of the same kind, so small prompt changes
+    do not break a replay.
+    """
+
+    def __init__(self, path, mode=RECORD, latency_scale=0.0, strict=False):
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = os.path.expanduser(path)
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.strict = strict
+        self._lock = threading.Lock()
+        self._entries = []
+        if mode == REPLAY:
+            self._load()
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.rewind()
+
+    def _load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            self._entries = [json.loads(line) for line in f if line.strip()]
+        logger.info(f"Loaded {len(self._entries)} interactions from {self.path}")
+
+    def rewind(self):
+        """Make every recorded interaction available again"""
+        with self._lock:
+            self._by_fingerprint = defaultdict(deque)
+            self._by_kind = defaultdict(deque)
+            self._used = set()
+            for index, entry in enumerate(self._entries):
+                self._by_fingerprint[entry['fingerprint']].append(index)
+                self._by_kind[entry['kind']].append(index)
+
+    def _append(self, entry):
+        with self._lock:
+            self._entries.append(entry)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, default=str) + "\n")
+
+    def _take(self, kind, key):
+        """Return the next unused entry for a fingerprint (or kind, when not strict)"""
+        with self._lock:
+            candidates = [self._by_fingerprint[key]]
+            if not self.strict:
+                candidates.append(self._by_kind[kind])
+            for pending in candidates:
+                while pending:
+                    index = pending.popleft()
+                    if index in self._used:
+                        continue
+                    self._used.add(index)
+                    entry = self._entries[index]
+                    if entry['fingerprint'] != key:
+                        logger.warning(f"Cassette miss for {kind} request; replaying next recorded {kind}")
+                    return entry
+        raise CassetteMiss(f"No recorded {kind} interaction matches fingerprint {key[:12]}")
+
+    def _simulate_latency(self, entry):
+        if self.latency_scale:
+            time.sleep(entry.get('latency', 0.0) * self.latency_scale)
+
+    def message(self, request, call):
+        """Record or replay a messages.create call; `call` performs the live request"""
+        key = fingerprint('message', request)
+        if self.mode == REPLAY:
+            from anthropic.types import Message
+
+            entry = self._take('message', key)
+            self._simulate_latency(entry)
+            return Message.model_validate(entry['response'])
+
+        started = time.monotonic()
+        response = call()
+        self._append({
+            'kind': 'message',
+            'fingerprint': key,
+            'model': request.get('model'),
+            'latency': time.monotonic() - started,
+            'response': response.model_dump(mode='json'),
+        })
+        return response
+
+    def tool(self, tool_name, tool_input, tool_id, call):
+        """Record or replay a tool dispatch; `call` performs the live tool call"""
+        key = fingerprint('tool', {'name': tool_name, 'input': tool_input})
+        if self.mode == REPLAY:
+            entry = self._take('tool', key)
+            self._simulate_latency(entry)
+            result = dict(entry['result'])
+            if 'tool_use_id' in result:
+                result['tool_use_id'] = tool_id
+            return result
+
+        started = time.monotonic()
+        result = call()
+        self._append({
+            'kind': 'tool',
+            'fingerprint': key,
+            'tool': tool_name,
+            'input': tool_input,
+            'latency': time.monotonic() - started,
+            'result': result,
+        })
+        return result
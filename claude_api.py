@@ -1,32 +1,76 @@
 import logging
 import os
+import json
 import base64
 import requests
 import time
-from anthropic import Anthropic
+import uuid
+import mimetypes
+from types import SimpleNamespace
 from secure_tools import ToolManager, OperationType
 from config import Config
+from blob_store import BlobStore
+from cassette import Cassette, OFF, REPLAY
+from cmd_dispatcher import CmdToolDispatcher
+from model_router import ModelRouter, FIRST_TURN, TOOL_CONTINUATION, ESCALATION
+from tracing import tracer
+from history import ConversationHistory
+from session_store import message_text
+from subagents import SubAgentRunner
+from command_outputs import CommandOutputHistory
+from prefetch import FilePrefetcher
+from tool_selection import ToolSelector, FILESYSTEM_TOOLS
+from approval_queue import ApprovalQueue, ApprovalPending, APPROVE, APPROVE_ALWAYS
 
 logger = logging.getLogger(__name__)
 
+SHELL_RESET_NOTE = ("The next command starts in a fresh shell: the working directory, exported variables "
+                    "and activated environments were reset")
+NEW_SHELL_NOTE = ("This command ran in a new shell because the previous one was closed (idle or stopped): "
+                  "the working directory, exported variables and activated environments were reset")
+MOVED_NOTE = ("This command ran in a new shell on another command worker because the previous worker could not "
+              "be reached: the working directory, exported variables and activated environments were reset")
+
+
 class ClaudeAPI:
-    def __init__(self):
+    def __init__(self, config=None):
         logger.info("Initializing ClaudeAPI")
         try:
-            self.max_iterations = 10  # Maximum number of conversation turns to prevent infinite loops
-            self.config = Config()
+            self.config = config or Config()
+            # Per-turn budgets that stop the tool loop
+            self.max_iterations = self.config.get_max_iterations()
+            self.max_turn_tokens = self.config.get_max_turn_tokens()
+            self.max_turn_seconds = self.config.get_max_turn_seconds()
+            self.cassette = self._open_cassette()
+            tracer.configure_from_config(self.config)
             api_key = self.config.get_api_key()
-            
-            if not api_key:
+
+            # A replay never calls the API, so it runs without a key
+            if not api_key and not (self.cassette and self.cassette.mode == REPLAY):
                 raise ValueError("API key not found")
             
-            self.client = Anthropic(api_key=api_key)
-            self.conversation_history = []
+            self.api_key = api_key
+            self._client = None  # Created on first use, see the client property
+            self._http = None
+            self.blob_store = BlobStore(self.config.get_blob_dir())
+            self.router = ModelRouter(self.config)
+            self.tool_selector = ToolSelector(self.config)  # Picks the tool schemas for each call
+            self.model_override = None  # User-selected model that bypasses routing
+            self.approvals = ApprovalQueue(self.config.get_approval_timeout())  # Commands awaiting sign-off
+            self.conversation_history = ConversationHistory(self.blob_store)
+            self.command_outputs = CommandOutputHistory(self.blob_store)  # Turns re-runs into diffs
             self.tools = None  # Will be set by GUI
+            self.is_subagent = False  # Set on children created by spawn_child
+            self.session_store = None  # Will be set by GUI
+            self.tool_output_callback = None  # Will be set by GUI
+            self.session_id = None
+            self.conversation_id = uuid.uuid4().hex  # Keys the persistent shell on the cmd-tool server
+            self._history_loaded = True
             
             # Server configurations
             self.filesystem_url = 'http://localhost:5000/mcp'  # Filesystem tool endpoint
-            self.cmdtool_url = 'http://localhost:5001/execute'  # Command tool endpoint
+            self._cmd_dispatcher = None  # Routes commands over the configured cmd-tool endpoints
+            self._fs_allowed_directories = None  # Filesystem server allowlist, fetched for prefetching
             self.max_retries = 3  # Maximum number of retry attempts
             self.retry_delay = 2  # Seconds between retries
             
@@ -34,168 +78,612 @@ class ClaudeAPI:
             logger.error(f"Error initializing ClaudeAPI: {e}")
             raise
 
-    def _needs_continuation(self, response_text, tool_result):
-        """Determine if the process should continue based on response and tool result"""
-        # Check for explicit continuation phrases in the AI's response
-        continuation_phrases = [
-            "next step",
-            "continue",
-            "proceed",
-            "moving on",
-            "following up",
-        ]
-        
-        # Check if the response indicates more steps
-        if any(phrase in response_text.lower() for phrase in continuation_phrases):
-            return True
-            
-        # Check if the tool result was successful and incomplete
-        if isinstance(tool_result, dict) and tool_result.get('success'):
-            if tool_result.get('needs_continuation'):
-                return True
-                
-        return False
+    def _open_cassette(self):
+        """Open the record/replay cassette configured for this instance, if any"""
+        settings = self.config.get_cassette()
+        if settings.get('mode', OFF) == OFF:
+            return None
+        cassette = Cassette(
+            settings['path'],
+            mode=settings['mode'],
+            latency_scale=settings.get('latency_scale', 0.0),
+            strict=settings.get('strict', False)
+        )
+        logger.info(f"Cassette {settings['mode']} mode: {cassette.path}")
+        return cassette
+
+    def set_cassette(self, cassette):
+        """Record to or replay from `cassette`; None returns to live calls"""
+        self.cassette = cassette
+
+    @property
+    def client(self):
+        """The Anthropic SDK client, imported and constructed on first use"""
+        if self._client is None:
+            from anthropic import Anthropic
+            self._client = Anthropic(api_key=self.api_key)
+        return self._client
+
+    @property
+    def http(self):
+        """Shared keep-alive HTTP session for the tool servers"""
+        if self._http is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=32)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._http = session
+        return self._http
+
+    @property
+    def cmd_dispatcher(self):
+        """Dispatcher over the configured cmd-tool endpoints, created on first use"""
+        if self._cmd_dispatcher is None:
+            self._cmd_dispatcher = CmdToolDispatcher(
+                self.config.get_cmdtool_endpoints(),
+                http=self.http,
+                health_interval=self.config.get_cmdtool_health_interval(),
+                token=self.config.get_cmdtool_token()
+            )
+        return self._cmd_dispatcher
+
+    def set_cmdtool_endpoints(self, urls):
+        """Replace the cmd-tool endpoints used for command execution"""
+        self.set_cmd_dispatcher(CmdToolDispatcher(
+            urls, http=self.http, health_interval=self.config.get_cmdtool_health_interval(),
+            token=self.config.get_cmdtool_token()
+        ))
+
+    def set_cmd_dispatcher(self, dispatcher):
+        """Use a dispatcher shared with other ClaudeAPI instances, so load is balanced across them"""
+        if self._cmd_dispatcher is not None and self._cmd_dispatcher is not dispatcher:
+            self._cmd_dispatcher.stop()
+        self._cmd_dispatcher = dispatcher
+
+    def warm_up(self):
+        """Create the SDK client and tool session ahead of the first message"""
+        replaying = self.cassette and self.cassette.mode == REPLAY
+        if (replaying or self.client) and self.http:
+            logger.debug("SDK client and tool session ready")
 
     def _format_tool_result_message(self, result):
-        """Format tool result for conversation history"""
-        if isinstance(result, dict):
-            if result.get('success'):
-                return {
-                    "role": "system",
-                    "content": (
-                        f"Tool execution successful.\n"
-                        f"Result: {result.get('content')}\n"
-                        f"You can proceed with the next step."
-                    )
-                }
-            elif result.get('is_error'):
-                return {
-                    "role": "system",
-                    "content": (
-                        f"Tool execution failed.\n"
-                        f"Error: {result.get('content')}\n"
-                        f"Please handle this error or try an alternative approach."
-                    )
-                }
-        
+        """Format a tool result as a tool_result content block for the next user turn"""
+        if isinstance(result, dict) and result.get('type') == 'tool_result':
+            content = result.get('content', '')
+            if not isinstance(content, str) and not (
+                isinstance(content, list) and all(isinstance(block, dict) and 'type' in block for block in content)
+            ):
+                content = str(content)
+            block = {
+                "type": "tool_result",
+                "tool_use_id": result.get('tool_use_id'),
+                "content": self._offload_large_content(content)
+            }
+            if result.get('is_error'):
+                block["is_error"] = True
+            return block
+
+        return {
+            "type": "tool_result",
+            "tool_use_id": result.get('tool_use_id') if isinstance(result, dict) else None,
+            "content": str(result)
+        }
+
+    def _offload_large_content(self, content):
+        """Replace tool output above the blob threshold with a preview and a fetch_result handle"""
+        if isinstance(content, list):
+            if any(block.get('type') != 'text' for block in content):
+                return content
+            text = "\n".join(block.get('text', '') for block in content)
+        else:
+            text = content
+
+        threshold = self.config.get_blob_threshold()
+        if len(text) <= threshold:
+            return content
+
+        try:
+            handle = self.blob_store.put(text)
+        except Exception as e:
+            logger.error(f"Error storing large tool result: {e}")
+            return content
+
+        preview_length = self.config.get_blob_preview_chars()
+        return (
+            f"{text[:preview_length]}\n\n"
+            f"[Output truncated: showing the first {preview_length} of {len(text)} characters. "
+            f"The full result is stored as {handle}; call fetch_result with this handle and an "
+            f"offset to read more.]"
+        )
+
+    def _fetch_result(self, tool_input, tool_id):
+        """Return a slice of a stored tool result"""
+        handle = tool_input.get('handle', '')
+        # Keep slices under the threshold so they are never offloaded again
+        max_length = max(1, self.config.get_blob_threshold() - 200)
+        try:
+            offset = self._non_negative_int(tool_input, 'offset', 0)
+            length = min(self._non_negative_int(tool_input, 'length', max_length) or max_length, max_length)
+        except ValueError as e:
+            return {
+                "type": "tool_result",
+                "tool_use_id": tool_id,
+                "content": str(e),
+                "is_error": True
+            }
+
+        text, total = self.blob_store.read_slice(handle, offset, length)
+        if text is None:
+            return {
+                "type": "tool_result",
+                "tool_use_id": tool_id,
+                "content": f"Unknown result handle: {handle}",
+                "is_error": True
+            }
+
+        end = offset + len(text)
+        remaining = f" Call again with offset {end} for more." if end < total else ""
+        return {
+            "type": "tool_result",
+            "tool_use_id": tool_id,
+            "content": f"[{handle}: characters {offset}-{end} of {total}.{remaining}]\n{text}",
+            "success": True
+        }
+
+    @staticmethod
+    def _non_negative_int(tool_input, name, default):
+        """Parse an integer tool argument supplied by the model; a missing value means the default"""
+        value = tool_input.get(name)
+        if value is None:
+            return default
+        if isinstance(value, bool) or not isinstance(value, (int, str)) \
+                or not str(value).strip().isdigit():
+            raise ValueError(f"Invalid {name}: expected a non-negative integer, got {value!r}")
+        return int(value)
+
+    def _run_subagents(self, tool_input, tool_id):
+        """Fan the tasks out over child conversations and merge their answers"""
+        tasks = [str(task) for task in tool_input.get('tasks') or [] if str(task).strip()]
+        max_tasks = self.config.get_subagent_max_tasks()
+        if self.is_subagent or not tasks or len(tasks) > max_tasks:
+            if self.is_subagent:
+                error = "Sub-agents cannot start sub-agents"
+            elif not tasks:
+                error = "No tasks given"
+            else:
+                error = f"Too many tasks ({len(tasks)}); at most {max_tasks} sub-agents can run per call"
+            return {
+                "type": "tool_result",
+                "tool_use_id": tool_id,
+                "content": error,
+                "is_error": True
+            }
+
+        runner = SubAgentRunner(self, self.config.get_subagent_concurrency())
+        results = runner.run(tasks, tool_input.get('instructions', ''))
         return {
-            "role": "system",
-            "content": f"Tool execution completed with result: {str(result)}"
+            "type": "tool_result",
+            "tool_use_id": tool_id,
+            "content": SubAgentRunner.reduce(results),
+            "success": True
         }
 
-    def send_message(self, message, image_path=None):
+    def spawn_child(self, subagent=True):
+        """Create a conversation sharing this instance's clients, tool endpoints and queues.
+
+        Sub-agents cannot fan out again; background jobs pass subagent=False.
+        """
+        child = ClaudeAPI(self.config)
+        child.is_subagent = subagent
+        if not (self.cassette and self.cassette.mode == REPLAY):
+            child._client = self.client  # Building a client per child costs about 100 ms
+        child._http = self.http
+        child.set_cassette(self.cassette)
+        child.set_cmd_dispatcher(self.cmd_dispatcher)
+        child.set_approval_queue(self.approvals)
+        child.blob_store = self.blob_store
+        child.conversation_history = ConversationHistory(self.blob_store)
+        child.command_outputs = CommandOutputHistory(self.blob_store)
+        child.router = self.router
+        child.tool_selector = self.tool_selector
+        child.model_override = self.model_override
+        child.filesystem_url = self.filesystem_url
+        child._fs_allowed_directories = self._fs_allowed_directories
+        child.max_retries = self.max_retries
+        child.retry_delay = self.retry_delay
+        child.tools = self.tools
+        child.tool_output_callback = self.tool_output_callback
+        return child
+
+    def release_child(self):
+        """Drop the routing state of a finished child conversation's shell session"""
+        if self._cmd_dispatcher is not None:
+            self._cmd_dispatcher.forget_session(self.conversation_id)
+
+    def _serialize_block(self, block):
+        """Convert an SDK content block into a plain dict for the history"""
+        if hasattr(block, 'model_dump'):
+            return block.model_dump(exclude_none=True)
+        return dict(block)
+
+    def _budget_exceeded(self, iteration_count, tokens_used, started_at):
+        """Return a reason string if the per-turn budget is spent, else None"""
+        if iteration_count >= self.max_iterations:
+            return f"Reached maximum number of conversation iterations ({self.max_iterations})."
+        if tokens_used >= self.max_turn_tokens:
+            return f"Reached the token budget for this turn ({tokens_used} of {self.max_turn_tokens} tokens)."
+        if time.monotonic() - started_at >= self.max_turn_seconds:
+            return f"Reached the time budget for this turn ({self.max_turn_seconds} seconds)."
+        return None
+
+    def send_message(self, message, image_path=None, checkpoint=None):
         logger.info("Sending message to Claude")
+        with tracer.span('claude_api.send_message', conversation_id=self.conversation_id), tracer.profile('turn'):
+            return self._run_turn(message, image_path, checkpoint)
+
+    def _run_turn(self, message, image_path=None, checkpoint=None):
         try:
             # Prepare the message content
             message_content = message
             if image_path:
                 with open(image_path, "rb") as img:
                     image_data = base64.b64encode(img.read()).decode()
+                    media_type = mimetypes.guess_type(image_path)[0] or "image/jpeg"
                     message_content = [
                         {
                             "type": "image",
                             "source": {
                                 "type": "base64",
-                                "media_type": "image/jpeg",
+                                "media_type": media_type,
                                 "data": image_data
                             }
                         },
                         {"type": "text", "text": message}
                     ]
 
-            # Initialize variables for the conversation loop
-            continue_processing = True
-            current_response = ""
-            iteration_count = 0
-            
-            while continue_processing and iteration_count < self.max_iterations:
-                iteration_count += 1
-                logger.debug(f"Conversation iteration {iteration_count}")
+            # Files the message names go in with it, saving a read_file round trip
+            documents = self._prefetch_files(message)
+            if documents:
+                if isinstance(message_content, str):
+                    message_content = [{"type": "text", "text": message_content}]
+                message_content = documents + message_content
+
+            self._ensure_history_loaded()
+            self._append_user_turn(message_content)
+
+            return self._run_loop(checkpoint=checkpoint)
 
-                # Get the response from Claude
-                response = self.client.messages.create(
-                    model=self.config.get_model(),
-                    max_tokens=self.config.get_max_tokens(),
-                    messages=self.conversation_history + [{"role": "user", "content": message_content}],
-                    system=self.config.get_system_prompt(),
-                    tools=self.define_tools(),
-                    tool_choice={"type": "auto"}
-                )
-                
-                # Process the response and handle tools
-                response_text = ""
-                tool_results = []
-                continue_processing = False  # Reset for each iteration
-
-                for content in response.content:
-                    if content.type == "text":
-                        response_text += content.text
-                    elif content.type == "tool_use":
-                        result = self.handle_tool_use(content)
-                        
-                        # Handle tool results
-                        if result:
-                            tool_results.append(result)
-                            if isinstance(result, dict):
-                                if result.get('is_error'):
-                                    response_text += f"\nTool error: {result.get('content')}\n"
-                                    continue_processing = False
-                                else:
-                                    # Format tool result for conversation history
-                                    tool_result_msg = self._format_tool_result_message(result)
-                                    self.conversation_history.append(tool_result_msg)
-                                    
-                                    # Check if we need to continue processing
-                                    continue_processing = self._needs_continuation(response_text, result)
-                                    if continue_processing:
-                                        message_content = "Continue with the next step based on the previous result."
-
-                # Add the current exchange to conversation history
-                self.conversation_history.append({"role": "user", "content": message_content})
-                self.conversation_history.append({"role": "assistant", "content": response_text})
-                
-                # Accumulate responses
-                current_response += response_text + "\n"
-                
-                # Add tool results to logging
-                if tool_results:
-                    logger.info(f"Tool results: {tool_results}")
-            
-            if iteration_count >= self.max_iterations:
-                logger.warning("Reached maximum number of conversation iterations")
-                current_response += "\nReached maximum number of conversation iterations. Some tasks may be incomplete."
-            
-            return current_response.strip()
-            
         except Exception as e:
             logger.error(f"Error sending message: {str(e)}")
             raise
 
-    def handle_tool_use(self, tool_use_content):
-        """Handle tool use requests from Claude with retry logic and error handling"""
+    def _prefetch_files(self, message):
+        """Return document blocks for the allowed files a message mentions"""
+        settings = self.config.get_prefetch()
+        if not settings.get('enabled'):
+            return []
+        with tracer.span('claude_api.prefetch') as span:
+            allowed = self._filesystem_allowed_directories()
+            if not allowed:
+                return []
+            try:
+                prefetcher = FilePrefetcher(
+                    allowed,
+                    max_files=settings['max_files'],
+                    max_file_bytes=settings['max_file_bytes'],
+                    max_total_bytes=settings['max_total_bytes'],
+                    workers=settings['workers']
+                )
+                files = prefetcher.prefetch(message)
+            except Exception as e:
+                logger.error(f"Error prefetching files: {e}")
+                return []
+            if span is not None:
+                span.attributes['files'] = len(files)
+            if files:
+                logger.info(f"Prefetched {len(files)} files ({sum(len(f.text) for f in files)} characters): "
+                            f"{', '.join(f.path for f in files)}")
+            blocks = FilePrefetcher.to_blocks(files)
+            for block in blocks:
+                # Large files keep a preview in the history, like large tool results
+                block['source']['data'] = self._offload_large_content(block['source']['data'])
+            return blocks
+
+    def _filesystem_allowed_directories(self):
+        """Return the filesystem server's allowed directories, asked once; [] if it cannot be reached"""
+        if self._fs_allowed_directories is None:
+            result = self._handle_filesystem_operation('list_allowed_directories', {}, None)
+            content = result.get('content')
+            text = message_text(content) if isinstance(content, list) else str(content or '')
+            if result.get('is_error') or not text.startswith('Allowed directories:'):
+                logger.warning(f"Could not get the filesystem server's allowed directories: {text[:200]}")
+                return []  # Asked again next turn
+            self._fs_allowed_directories = [line.strip() for line in text.splitlines()[1:] if line.strip()]
+        return self._fs_allowed_directories
+
+    def resume_turn(self, iteration_count=0, tokens_used=0, checkpoint=None):
+        """Continue an interrupted turn of the current session from the state in its history.
+
+        Tool calls made by the last assistant message without stored results
+        are run again; a session whose last message is a final answer
+        returns that answer.
+        """
+        with tracer.span('claude_api.resume_turn', conversation_id=self.conversation_id):
+            self._ensure_history_loaded()
+            last = self.conversation_history[-1] if self.conversation_history else None
+            if last is None:
+                raise ValueError("Nothing to resume: the session is empty")
+
+            pending = []
+            if last.role == 'assistant':
+                blocks = [] if isinstance(last.content, str) else last.content
+                pending = [SimpleNamespace(**block) for block in blocks
+                           if isinstance(block, dict) and block.get('type') == 'tool_use']
+                if not pending:
+                    return message_text(last.to_dict()['content']).strip()
+            return self._run_loop(iteration_count, tokens_used, checkpoint, pending)
+
+    def _run_loop(self, iteration_count=0, tokens_used=0, checkpoint=None, pending_tool_uses=None):
+        """Loop until the model stops asking for tools or the turn budget is spent.
+
+        `checkpoint(iteration_count, tokens_used, pending_tool_calls)` is called
+        whenever the history reaches a state resume_turn() can continue from.
+        """
+        response_parts = []
+        started_at = time.monotonic()
+        if checkpoint:
+            checkpoint(iteration_count, tokens_used, [])
+        if pending_tool_uses:
+            self._answer_tool_uses(pending_tool_uses, iteration_count, tokens_used, checkpoint)
+
+        while True:
+            budget_reason = self._budget_exceeded(iteration_count, tokens_used, started_at)
+            if budget_reason:
+                logger.warning(budget_reason)
+                response_parts.append(f"{budget_reason} Some tasks may be incomplete.")
+                break
+
+            iteration_count += 1
+            with tracer.span('claude_api.iteration', iteration=iteration_count):
+                logger.debug(f"Conversation iteration {iteration_count}")
+
+                turn_type = FIRST_TURN if iteration_count == 1 else TOOL_CONTINUATION
+                response = self._create_message(turn_type, self.conversation_history)
+                if response.usage:
+                    tokens_used += response.usage.input_tokens + response.usage.output_tokens
+
+                self._append_history({
+                    "role": "assistant",
+                    "content": [self._serialize_block(block) for block in response.content]
+                })
+
+                response_text = "".join(block.text for block in response.content if block.type == "text")
+                if response_text:
+                    response_parts.append(response_text)
+
+                tool_uses = [block for block in response.content if block.type == "tool_use"]
+                if response.stop_reason != "tool_use":
+                    if tool_uses:
+                        # A response cut off (e.g. by max_tokens) can end in a tool_use block;
+                        # answer it so the history stays valid for the next request
+                        self._append_history({"role": "user", "content": [
+                            self._unanswered_tool_result(block, response.stop_reason) for block in tool_uses
+                        ]})
+                    break
+
+                self._answer_tool_uses(tool_uses, iteration_count, tokens_used, checkpoint)
+
+        logger.debug(f"Turn finished after {iteration_count} iterations, {tokens_used} tokens")
+        return "\n".join(response_parts).strip()
+
+    def _answer_tool_uses(self, tool_uses, iteration_count, tokens_used, checkpoint=None):
+        """Run a response's tool calls and store their results in the next user turn"""
+        if checkpoint:
+            checkpoint(iteration_count, tokens_used,
+                       [{"id": block.id, "name": block.name, "input": block.input} for block in tool_uses])
+
+        # Every tool_use block must be answered in the next user turn
+        tool_results = [self._format_tool_result_message(result)
+                        for result in self._run_tool_calls(tool_uses)]
+        logger.info(f"Tool results: {tool_results}")
+        self._append_history({"role": "user", "content": tool_results})
+
+        if checkpoint:
+            checkpoint(iteration_count, tokens_used, [])
+
+    @staticmethod
+    def _unanswered_tool_result(block, stop_reason):
+        return {
+            "type": "tool_result",
+            "tool_use_id": block.id,
+            "content": f"Not run: the response stopped ({stop_reason}) before this tool call was complete.",
+            "is_error": True
+        }
+
+    def _estimate_tokens(self, messages):
+        """Rough input size estimate (about four bytes per token) used for routing"""
+        return len(json.dumps(messages, default=str)) // 4
+
+    def _call_model(self, model, messages, tools):
+        request = {
+            "model": model,
+            "max_tokens": self.config.get_max_tokens(),
+            "messages": messages,
+            "system": self.config.get_system_prompt()
+        }
+        if tools:
+            request["tools"] = tools
+            request["tool_choice"] = {"type": "auto"}
+        with tracer.span('anthropic.messages.create', model=model, messages=len(messages), tools=len(tools)):
+            if self.cassette:
+                return self.cassette.message(request, lambda: self.client.messages.create(**request))
+            return self.client.messages.create(**request)
+
+    def _create_message(self, turn_type, history):
+        """Call the model chosen by the router, escalating to the larger model on failure"""
+        route, model = self.router.select(
+            turn_type, self._estimate_tokens(history.to_compact()), override=self.model_override
+        )
+        # Attachments stored by reference are only expanded for the request itself
+        messages = history.to_request()
+        tools = self.tool_selector.select(self.define_tools(), history, continuation=turn_type != FIRST_TURN)
+        logger.debug(f"Routing {turn_type} call to {model} via {route}")
+
+        import anthropic
+
+        started = time.monotonic()
+        try:
+            response = self._call_model(model, messages, tools)
+        except (anthropic.AuthenticationError, anthropic.PermissionDeniedError):
+            raise
+        except anthropic.APIError as e:
+            self.router.record(route, model, time.monotonic() - started, failed=True)
+            fallback = None if route == ESCALATION else self.router.escalation_model(model)
+            if not fallback:
+                raise
+            logger.warning(f"Call to {model} failed ({e}); escalating to {fallback}")
+            route, model = ESCALATION, fallback
+            started = time.monotonic()
+            response = self._call_model(model, messages, tools)
+
+        usage = response.usage
+        self.router.record(
+            route, model, time.monotonic() - started,
+            input_tokens=usage.input_tokens if usage else 0,
+            output_tokens=usage.output_tokens if usage else 0
+        )
+        return response
+
+    def set_model_override(self, model):
+        """Use `model` for every call, bypassing routing; None restores routing"""
+        self.model_override = model or None
+
+    def get_route_stats(self):
+        """Return per-route latency and token statistics"""
+        return self.router.stats()
+
+    def get_tool_selection_stats(self):
+        """Return the number of calls and the estimated tool schema tokens sent and saved"""
+        return self.tool_selector.stats()
+
+    def _append_user_turn(self, message_content):
+        """Append the user's message, merging it into a trailing user turn if one is pending"""
+        last = self.conversation_history[-1] if self.conversation_history else None
+        if last is None or last.role != 'user':
+            self._append_history({"role": "user", "content": message_content})
+            return
+
+        # A turn stopped by its budget leaves tool results awaiting a reply;
+        # the API requires alternating roles, so add the new text to that turn.
+        self.conversation_history.replace_last("user", self._as_blocks(last.content) + self._as_blocks(message_content))
+        if self.session_store and self.session_id is not None:
+            try:
+                self.session_store.append_message(
+                    self.session_id, "user", self.conversation_history.compact(message_content)
+                )
+            except Exception as e:
+                logger.error(f"Error saving message to session store: {e}")
+
+    @staticmethod
+    def _as_blocks(content):
+        return [{"type": "text", "text": content}] if isinstance(content, str) else list(content)
+
+    def _run_tool_calls(self, tool_uses):
+        """Run a response's tool calls, letting the rest proceed while commands await approval"""
+        results = [None] * len(tool_uses)
+        parked = []  # (index, block, pending approval or None)
+        for index, block in enumerate(tool_uses):
+            if parked and block.name == "execute_command":
+                # Later commands wait behind the parked one so the shell sees them in order
+                parked.append((index, block, None))
+                continue
+            try:
+                results[index] = self._answer_tool_use(block, park=True)
+            except ApprovalPending as e:
+                parked.append((index, block, e.pending))
+
+        for index, block, pending in parked:
+            if pending is not None and not self._await_approval(pending):
+                results[index] = self._denied_result(block.id, pending)
+                self._notify_tool_output(block.name, block.input, results[index])
+                continue
+            results[index] = self._answer_tool_use(block)
+        return results
+
+    def _answer_tool_use(self, block, park=False):
+        """Run one tool call, turning a failure into an error result so every tool_use is answered"""
+        try:
+            return self.handle_tool_use(block, park=park)
+        except ApprovalPending:
+            raise
+        except Exception as e:
+            logger.error(f"Tool {block.name} failed: {e}")
+            result = {
+                "type": "tool_result",
+                "tool_use_id": block.id,
+                "content": f"Error running {block.name}: {e}",
+                "is_error": True
+            }
+            self._notify_tool_output(block.name, block.input, result)
+            return result
+
+    def handle_tool_use(self, tool_use_content, park=False):
+        """Handle tool use requests from Claude with retry logic and error handling.
+
+        With `park`, a command that needs approval raises ApprovalPending
+        instead of waiting, so the caller can run other tool calls meanwhile.
+        """
         tool_name = tool_use_content.name
         tool_input = tool_use_content.input
         tool_id = tool_use_content.id
         
         logger.debug(f"Handling tool use: {tool_name}")
         logger.debug(f"Tool input: {tool_input}")
-        
-        if tool_name in ["read_file", "write_file", "create_directory", "list_directory", "search_files", "get_file_info"]:
-            return self._handle_filesystem_operation(tool_name, tool_input, tool_id)
+
+        with tracer.span('claude_api.handle_tool_use', tool=tool_name, tool_use_id=tool_id):
+            if self.cassette:
+                result = self.cassette.tool(
+                    tool_name, tool_input, tool_id,
+                    lambda: self._dispatch_tool(tool_name, tool_input, tool_id, park)
+                )
+            else:
+                result = self._dispatch_tool(tool_name, tool_input, tool_id, park)
+
+        self._notify_tool_output(tool_name, tool_input, result)
+        return result
+
+    def _dispatch_tool(self, tool_name, tool_input, tool_id, park=False):
+        """Run a tool call against the tool servers"""
+        if tool_name in FILESYSTEM_TOOLS:
+            result = self._handle_filesystem_operation(tool_name, tool_input, tool_id)
         elif tool_name == "execute_command":
-            return self._execute_command_with_retry(tool_input, tool_id)
-            
-        return {
-            "type": "tool_result",
-            "tool_use_id": tool_id,
-            "content": f"Unknown tool: {tool_name}",
-            "is_error": True
-        }
+            result = self._execute_command_with_retry(tool_input, tool_id, park)
+        elif tool_name == "fetch_result":
+            result = self._fetch_result(tool_input, tool_id)
+        elif tool_name == "run_subagents":
+            result = self._run_subagents(tool_input, tool_id)
+        else:
+            result = {
+                "type": "tool_result",
+                "tool_use_id": tool_id,
+                "content": f"Unknown tool: {tool_name}",
+                "is_error": True
+            }
+        return result
+
+    def _notify_tool_output(self, tool_name, tool_input, result):
+        """Pass a tool result to the GUI callback, if one is set"""
+        if not self.tool_output_callback:
+            return
+        try:
+            self.tool_output_callback(tool_name, tool_input, result)
+        except Exception as e:
+            logger.error(f"Error in tool output callback: {e}")
 
     def _handle_filesystem_operation(self, operation, tool_input, tool_id):
         """Handle filesystem operations using MCP protocol"""
         try:
-            response = requests.post(
+            response = self.http.post(
                 self.filesystem_url,
                 json={
                     "type": "call_tool_request",
@@ -203,7 +691,8 @@ class ClaudeAPI:
                         "name": operation,
                         "arguments": tool_input
                     }
-                }
+                },
+                headers=tracer.inject()
             )
             
             result = response.json()
@@ -221,33 +710,80 @@ class ClaudeAPI:
                 "is_error": True
             }
 
-    def _execute_command_with_retry(self, tool_input, tool_id):
+    def _execute_command_with_retry(self, tool_input, tool_id, park=False):
         """Execute command with retry logic and human intervention"""
         command = tool_input.get('command')
-        working_directory = tool_input.get('working_directory', os.getcwd())
+        command_timeout = self.config.get_command_timeout()
+        payload = {
+            'command': command,
+            # Commands of one conversation share a persistent shell on the cmd-tool server
+            'session_id': self.conversation_id,
+            'timeout': command_timeout
+        }
+        if tool_input.get('working_directory'):
+            payload['working_directory'] = tool_input['working_directory']
         retries = 0
         last_error = None
+        approved = False
         
         while retries < self.max_retries:
             try:
-                response = requests.post(
-                    self.cmdtool_url,
-                    json={
-                        'command': command,
-                        'working_directory': working_directory
-                    },
-                    timeout=10
+                response = self.cmd_dispatcher.post(
+                    '/execute',
+                    self.conversation_id,
+                    payload,
+                    timeout=command_timeout + 10,
+                    headers=tracer.inject()
                 )
                 
                 result = response.json()
+                # The cmd-tool server reports its own spans for this request
+                tracer.add_remote_spans(result.pop('trace_spans', None))
                 logger.debug(f"Command result: {result}")
+
+                # Park until a human decides, instead of re-posting straight away
+                if result.get('status') == 'approval_required':
+                    if approved:
+                        last_error = "The command still requires approval after it was approved"
+                        break
+                    pending = self.approvals.submit(command, self.conversation_id)
+                    if park and pending.decision is None:
+                        raise ApprovalPending(pending)
+                    if not self._await_approval(pending):
+                        return self._denied_result(tool_id, pending)
+                    approved = True
+                    continue
                 
+                # A timed-out command is not retried: it may have done part of its work
+                if result.get('status') == 'timed_out':
+                    note = f"[{result.get('error', 'Command timed out')}. {SHELL_RESET_NOTE}]"
+                    output = (result.get('partial_output') or '').rstrip('\n')
+                    return {
+                        "type": "tool_result",
+                        "tool_use_id": tool_id,
+                        "content": f"{output}\n{note}" if output else note,
+                        "is_error": True
+                    }
+
                 # Check for success
                 if 'output' in result:
+                    # Key on the directory the shell really ran in; `cd` makes the argument unreliable
+                    output = self.command_outputs.report(
+                        command, result.get('cwd') or tool_input.get('working_directory'),
+                        result['output'], result.get('exit_code')
+                    )
+                    if result.get('status') == 'shell_exited':
+                        output = f"{output}\n[The shell exited (exit code {result.get('exit_code')}). {SHELL_RESET_NOTE}]"
+                    elif result.get('exit_code'):
+                        output = f"{output}\n[exit code {result['exit_code']}]"
+                    if getattr(response, 'moved', False):
+                        output = f"{output}\n[{MOVED_NOTE}]"
+                    elif result.get('shell_replaced'):
+                        output = f"{output}\n[{NEW_SHELL_NOTE}]"
                     return {
                         "type": "tool_result",
                         "tool_use_id": tool_id,
-                        "content": result['output'],
+                        "content": output,
                         "success": True
                     }
                 
@@ -268,6 +804,8 @@ class ClaudeAPI:
                     else:
                         break  # Human chose to stop retrying
                 
+            except ApprovalPending:
+                raise
             except Exception as e:
                 last_error = str(e)
                 logger.error(f"Error executing command: {last_error}")
@@ -285,6 +823,38 @@ class ClaudeAPI:
             "is_error": True
         }
 
+    def _await_approval(self, pending):
+        """Wait for a decision on a command and tell its cmd-tool server; True if approved"""
+        decision = self.approvals.wait(pending)
+        if decision not in (APPROVE, APPROVE_ALWAYS):
+            return False
+        try:
+            self.cmd_dispatcher.post(
+                '/approve',
+                self.conversation_id,
+                {'command': pending.command, 'type': 'always' if decision == APPROVE_ALWAYS else 'once'},
+                timeout=10,
+                headers=tracer.inject(),
+                report_move=False  # The command's own response reports a move
+            )
+        except Exception as e:
+            logger.error(f"Error approving command: {e}")
+            return False
+        return True
+
+    def _denied_result(self, tool_id, pending):
+        reason = f" ({pending.reason})" if pending.reason else ""
+        return {
+            "type": "tool_result",
+            "tool_use_id": tool_id,
+            "content": f"Command was not approved{reason}: {pending.command}",
+            "is_error": True
+        }
+
+    def set_approval_queue(self, approvals):
+        """Share an approval queue, e.g. between conversations shown in one window"""
+        self.approvals = approvals
+
     def _should_retry(self, error):
         """Determine if error is retryable"""
         retryable_errors = [
@@ -311,7 +881,57 @@ class ClaudeAPI:
         return dialog.should_continue
 
     def clear_conversation(self):
-        self.conversation_history = []
+        self.conversation_history.clear()
+        self.command_outputs.clear()
+        self.session_id = None  # The next message starts a new session
+        self.conversation_id = uuid.uuid4().hex
+        self._history_loaded = True
+
+    def set_session_store(self, session_store):
+        """Set the session store used to persist the conversation"""
+        self.session_store = session_store
+
+    def open_session(self, session_id):
+        """Switch to a stored session; its history is loaded on the next message"""
+        self.conversation_history.clear()
+        self.command_outputs.clear()
+        self.session_id = session_id
+        self.conversation_id = f"session-{session_id}"
+        self._history_loaded = False
+
+    def _ensure_history_loaded(self):
+        """Load the full history of a reopened session the first time it is needed"""
+        if self._history_loaded:
+            return
+        if self.session_store and self.session_id is not None:
+            # Older sessions stored tool results as "system" messages, which the API rejects
+            for message in self.session_store.load_history(self.session_id):
+                if message['role'] not in ('user', 'assistant'):
+                    continue
+                last = self.conversation_history[-1] if self.conversation_history else None
+                if last is not None and last.role == message['role'] == 'user':
+                    # Text added to a turn that ended on tool results is stored as its own row
+                    self.conversation_history.replace_last('user', self._as_blocks(last.content) +
+                                                           self._as_blocks(message['content']))
+                else:
+                    self.conversation_history.append(message['role'], message['content'])
+        self._history_loaded = True
+
+    def _append_history(self, message):
+        """Append a message to the history and persist it in its compact form"""
+        stored = self.conversation_history.append(message['role'], message['content']).to_dict()
+        if not self.session_store:
+            return
+        try:
+            if self.session_id is None:
+                self.session_id = self.session_store.create_session()
+            self.session_store.append_message(self.session_id, stored['role'], stored['content'])
+        except Exception as e:
+            logger.error(f"Error saving message to session store: {e}")
+
+    def set_tool_output_callback(self, callback):
+        """Set a callback(tool_name, tool_input, result) invoked after every tool call"""
+        self.tool_output_callback = callback
 
     def set_tool_manager(self, tool_manager):
         """Set the tool manager instance"""
@@ -319,7 +939,7 @@ class ClaudeAPI:
 
     def define_tools(self):
         """Define available tools for Claude to use"""
-        return [
+        tools = [
             {
                 "name": "read_file",
                 "description": "Read the complete contents of a file from the file system. Handles various text encodings and provides detailed error messages if the file cannot be read. Use this tool when you need to examine the contents of a single file. Only works within allowed directories.",
@@ -475,5 +1095,69 @@ class ClaudeAPI:
                     "properties": {},
                     "required": []
                 }
+            },
+            {
+                "name": "execute_command",
+                "description": "Run a shell command on the command tool server and return its output and exit code. Commands of one conversation run in the same persistent bash shell, so the working directory, exported variables and activated environments carry over between calls. A result says so when the shell was reset. Commands that are not whitelisted wait for the user's approval.",
+                "input_schema": {
+                    "type": "object",
+                    "properties": {
+                        "command": {
+                            "type": "string",
+                            "description": "The command to run"
+                        },
+                        "working_directory": {
+                            "type": "string",
+                            "description": "Directory to change to before running the command; the change persists for later commands"
+                        }
+                    },
+                    "required": ["command"]
+                }
+            },
+            {
+                "name": "fetch_result",
+                "description": "Read part of a large tool result that was truncated in the conversation. Truncated results end with a note giving a handle such as blob:0123456789abcdef. Returns the requested character range and tells you the offset to continue from.",
+                "input_schema": {
+                    "type": "object",
+                    "properties": {
+                        "handle": {
+                            "type": "string",
+                            "description": "The result handle from the truncation note"
+                        },
+                        "offset": {
+                            "type": "integer",
+                            "description": "Character offset to start reading from",
+                            "default": 0
+                        },
+                        "length": {
+                            "type": "integer",
+                            "description": "Number of characters to read"
+                        }
+                    },
+                    "required": ["handle"]
+                }
+            },
+            {
+                "name": "run_subagents",
+                "description": "Split a task into independent parts and work on them in parallel. Each task goes to a separate sub-agent with a fresh conversation and the same tools, and their answers are returned together. Use this for wide tasks whose parts do not depend on each other, such as reviewing every file in a directory.",
+                "input_schema": {
+                    "type": "object",
+                    "properties": {
+                        "tasks": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "One self-contained task per sub-agent, e.g. a file to review"
+                        },
+                        "instructions": {
+                            "type": "string",
+                            "description": "Instructions shared by every sub-agent"
+                        }
+                    },
+                    "required": ["tasks"]
+                }
             }
         ]
+        if self.is_subagent:
+            # Sub-agents do not fan out again
+            tools = [tool for tool in tools if tool["name"] != "run_subagents"]
+        return tools
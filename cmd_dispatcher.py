@@ -0,0 +1,174 @@
+import time
+import logging
+import threading
+
+import requests
+from urllib3.exceptions import NewConnectionError, ConnectTimeoutError
+
+logger = logging.getLogger(__name__)
+
+
+def request_not_sent(error):
+    """True if a requests error happened before the request reached the server"""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = error.args[0] if error.args else None
+    reason = getattr(reason, 'reason', reason)  # MaxRetryError wraps the cause
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+class Endpoint:
+    """One cmd-tool worker and its routing state"""
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.healthy = True
+        self.outstanding = 0
+        self.completed = 0
+        self.failures = 0
+        self.last_failure = 0.0
+
+    def to_dict(self):
+        return {
+            'url': self.url,
+            'healthy': self.healthy,
+            'outstanding': self.outstanding,
+            'completed': self.completed,
+            'failures': self.failures,
+        }
+
+
+class CmdToolDispatcher:
+    """Spreads commands over several cmd-tool workers.
+
+    A conversation sticks to the worker that holds its shell session. New
+    conversations go to the healthy worker with the fewest outstanding
+    jobs, then the fewest sessions. Workers that cannot be connected to are
+    marked down and their conversations fail over; background health
+    checks bring them back. A request that failed after it was sent is not
+    failed over, since the command may already have run. A conversation
+    that moved to another worker lost its shell there, so the next response
+    for it has `moved` set.
+    """
+
+    def __init__(self, urls, http=None, health_interval=10, token=None):
+        if not urls:
+            raise ValueError("At least one cmd-tool endpoint is required")
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.http = http or requests.Session()
+        self.health_interval = health_interval
+        self.auth_headers = {'Authorization': f"Bearer {token}"} if token else {}
+        self.affinity = {}
+        self.moved = set()  # Sessions moved to another worker since their last reported response
+        self._lock = threading.Lock()
+        self._health_thread = None
+        self._stopped = threading.Event()
+
+    def _start_health_checks(self):
+        """Start the health check thread on first use, when there is anything to route between"""
+        if self._health_thread or len(self.endpoints) < 2 or not self.health_interval:
+            return
+        self._health_thread = threading.Thread(target=self._health_loop, daemon=True)
+        self._health_thread.start()
+
+    def _health_loop(self):
+        while not self._stopped.wait(self.health_interval):
+            self.check_health()
+
+    def check_health(self):
+        """Probe every endpoint's /health and update its state"""
+        for endpoint in self.endpoints:
+            try:
+                response = self.http.get(f"{endpoint.url}/health", timeout=2, headers=self.auth_headers)
+                healthy = response.status_code == 200
+            except requests.RequestException:
+                healthy = False
+            with self._lock:
+                if healthy != endpoint.healthy:
+                    logger.info(f"cmd-tool endpoint {endpoint.url} is {'up' if healthy else 'down'}")
+                endpoint.healthy = healthy
+
+    def stop(self):
+        self._stopped.set()
+
+    def _pick(self, session_id, exclude):
+        """Choose an endpoint for a session; caller holds the lock"""
+        current = self.affinity.get(session_id)
+        if current is not None and current.healthy and current not in exclude:
+            return current
+
+        candidates = [e for e in self.endpoints if e.healthy and e not in exclude]
+        if not candidates:
+            # Everything looks down: try the endpoint that failed longest ago
+            candidates = sorted((e for e in self.endpoints if e not in exclude), key=lambda e: e.last_failure)[:1]
+        if not candidates:
+            return None
+
+        # Least outstanding jobs first; ties go to the worker holding the fewest sessions
+        sessions = {}
+        for assigned in self.affinity.values():
+            sessions[assigned] = sessions.get(assigned, 0) + 1
+        endpoint = min(candidates, key=lambda e: (e.outstanding, sessions.get(e, 0)))
+        if current is not None and current is not endpoint:
+            logger.warning(f"Session {session_id} moved from {current.url} to {endpoint.url}")
+            self.moved.add(session_id)
+        if session_id is not None:
+            self.affinity[session_id] = endpoint
+        return endpoint
+
+    def post(self, path, session_id, payload, timeout, headers=None, report_move=True):
+        """POST to the session's worker, failing over to another worker if it cannot be reached.
+
+        The response's `moved` is True if the session changed workers since
+        the last response that reported it; with `report_move=False` the
+        move stays pending for a later request.
+        """
+        self._start_health_checks()
+        tried = set()
+        last_error = None
+        headers = dict(headers or {}, **self.auth_headers)
+
+        while True:
+            with self._lock:
+                endpoint = self._pick(session_id, tried)
+                if endpoint is None:
+                    break
+                endpoint.outstanding += 1
+            tried.add(endpoint)
+
+            try:
+                response = self.http.post(f"{endpoint.url}{path}", json=payload, timeout=timeout, headers=headers)
+            except requests.ConnectionError as e:
+                with self._lock:
+                    endpoint.healthy = False
+                    endpoint.failures += 1
+                    endpoint.last_failure = time.time()
+                if not request_not_sent(e):
+                    # The worker may have run the command before the connection broke
+                    logger.warning(f"cmd-tool endpoint {endpoint.url} failed mid-request: {e}")
+                    raise
+                # Nothing ran on this worker, so the request is safe to send elsewhere
+                last_error = e
+                logger.warning(f"cmd-tool endpoint {endpoint.url} unreachable: {e}")
+                continue
+            finally:
+                with self._lock:
+                    endpoint.outstanding -= 1
+
+            with self._lock:
+                endpoint.completed += 1
+                response.moved = session_id in self.moved
+                if report_move:
+                    self.moved.discard(session_id)
+            return response
+
+        raise last_error or requests.ConnectionError("No cmd-tool endpoints configured")
+
+    def forget_session(self, session_id):
+        with self._lock:
+            self.affinity.pop(session_id, None)
+            self.moved.discard(session_id)
+
+    def stats(self):
+        with self._lock:
+            return [endpoint.to_dict() for endpoint in self.endpoints]
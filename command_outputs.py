@@ -0,0 +1,77 @@
+import difflib
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class CommandOutputHistory:
+    """Reports re-runs of a command as a diff against the command's previous output.
+
+    The last output of each (command, working directory) pair in a
+    conversation is kept, keyed on the directory the shell actually ran
+    in. Outputs of at least `min_chars` go to the blob store; shorter ones
+    are never diffed and stay in memory. When the same command runs again,
+    the model gets a summary line and a unified diff instead of the full
+    text; the full output stays available through its blob handle. Short
+    outputs, and outputs whose diff would not be much smaller, are passed
+    through unchanged.
+    """
+
+    def __init__(self, blob_store, min_chars=400, max_ratio=0.6, max_entries=64):
+        self.blob_store = blob_store
+        self.min_chars = min_chars
+        self.max_ratio = max_ratio  # Send the diff only if it is at most this fraction of the output
+        self.max_entries = max_entries
+        self._last = OrderedDict()  # (command, working_dir) -> (output or None, handle or None, exit_code)
+
+    def clear(self):
+        self._last.clear()
+
+    def _remember(self, key, entry):
+        self._last[key] = entry
+        if len(self._last) > self.max_entries:
+            self._last.popitem(last=False)
+
+    def report(self, command, working_dir, output, exit_code=None):
+        """Record an output and return what to send to the model in its place"""
+        key = (command.strip(), working_dir or '')
+        previous = self._last.pop(key, None)
+        if len(output) < self.min_chars:
+            self._remember(key, (output, None, exit_code))
+            return output
+        try:
+            handle = self.blob_store.put(output)
+        except Exception as e:
+            logger.error(f"Error storing command output: {e}")
+            return output
+        self._remember(key, (None, handle, exit_code))
+
+        if previous is None:
+            return output
+        previous_output, previous_handle, previous_exit_code = previous
+        if previous_output is None:
+            previous_output = self.blob_store.get(previous_handle)
+        if previous_output is None:
+            return output
+
+        line_count = output.count('\n') + 1
+        exit_note = f"exit code {exit_code}" if exit_code == previous_exit_code \
+            else f"exit code {previous_exit_code} before, {exit_code} now"
+        if previous_output == output:
+            return (f"[Output identical to the previous run of this command "
+                    f"({line_count} lines, {exit_note}). Full output: {handle} (use fetch_result)]")
+
+        diff = list(difflib.unified_diff(
+            previous_output.splitlines(), output.splitlines(),
+            'previous run', 'this run', n=2, lineterm=''
+        ))
+        diff_text = "\n".join(diff)
+        if len(diff_text) > len(output) * self.max_ratio:
+            return output
+
+        added = sum(1 for line in diff[2:] if line.startswith('+'))
+        removed = sum(1 for line in diff[2:] if line.startswith('-'))
+        return (f"[Re-run of a previous command: {added} lines added and {removed} removed "
+                f"of {line_count} ({exit_note}). Diff against the previous run follows; "
+                f"full output: {handle} (use fetch_result)]\n{diff_text}")
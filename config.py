@@ -89,6 +89,178 @@ class Config:
         self.config['temperature'] = temperature
         self.save_config()
 
+    def get_routing(self):
+        """Get the model routing policy, filled in with defaults"""
+        routing = {
+            'enabled': True,
+            'routes': {
+                'first_turn': None,  # None means the configured model
+                'tool_continuation': 'claude-3-haiku-20240307'
+            },
+            'large_input_tokens': None,
+            'large_input_model': None,
+            'escalate_on_failure': True,
+            'escalation_model': None
+        }
+        configured = self.config.get('routing', {})
+        routing.update({key: value for key, value in configured.items() if key != 'routes'})
+        routing['routes'].update(configured.get('routes', {}))
+        return routing
+
+    def set_routing(self, routing):
+        """Set the model routing policy"""
+        self.config['routing'] = routing
+        self.save_config()
+
+    def get_max_iterations(self):
+        """Get the maximum number of API round trips per user turn"""
+        return self.config.get('max_iterations', 10)
+
+    def get_max_turn_tokens(self):
+        """Get the input plus output token budget per user turn"""
+        return self.config.get('max_turn_tokens', 200000)
+
+    def get_max_turn_seconds(self):
+        """Get the wall-clock budget per user turn in seconds"""
+        return self.config.get('max_turn_seconds', 300)
+
+    def get_blob_threshold(self):
+        """Get the size in characters above which tool results are stored out of band"""
+        return self.config.get('blob_threshold_chars', 8000)
+
+    def get_blob_preview_chars(self):
+        """Get how many characters of an out-of-band tool result stay in the conversation"""
+        return self.config.get('blob_preview_chars', 2000)
+
+    def get_blob_dir(self):
+        """Get the directory of the tool result blob store"""
+        return os.path.expanduser(self.config.get('blob_dir', os.path.join('~', '.claude_chat', 'blobs')))
+
+    def get_blob_max_bytes(self):
+        """Get the size cap of the blob store; least recently used blobs are pruned at startup"""
+        return self.config.get('blob_max_bytes', 512 * 1024 * 1024)
+
+    def get_blob_max_age_days(self):
+        """Get the number of days an unused blob is kept (0 keeps blobs regardless of age)"""
+        return self.config.get('blob_max_age_days', 30)
+
+    def get_cmdtool_endpoints(self):
+        """Get the base URLs of the cmd-tool workers"""
+        return self.config.get('cmdtool_endpoints', ['http://localhost:5001'])
+
+    def set_cmdtool_endpoints(self, endpoints):
+        """Set the base URLs of the cmd-tool workers"""
+        self.config['cmdtool_endpoints'] = endpoints
+        self.save_config()
+
+    def get_cmdtool_token(self):
+        """Get the shared token sent to the cmd-tool servers; CMDTOOL_TOKEN overrides the config"""
+        return os.getenv('CMDTOOL_TOKEN') or self.config.get('cmdtool_token')
+
+    def get_cmdtool_health_interval(self):
+        """Get the seconds between cmd-tool health checks"""
+        return self.config.get('cmdtool_health_interval', 10)
+
+    def get_command_timeout(self):
+        """Get the maximum run time of a single command in seconds"""
+        return self.config.get('command_timeout', 120)
+
+    def get_subagent_concurrency(self):
+        """Get how many sub-agent conversations may run at once"""
+        return self.config.get('subagent_concurrency', 4)
+
+    def get_subagent_max_tasks(self):
+        """Get the maximum number of sub-agents one run_subagents call may start"""
+        return self.config.get('subagent_max_tasks', 16)
+
+    def get_job_workers(self):
+        """Get the number of background jobs that run at once"""
+        return self.config.get('job_workers', 2)
+
+    def get_job_max_iterations(self):
+        """Get the maximum number of API round trips of a background job"""
+        return self.config.get('job_max_iterations', 50)
+
+    def get_job_max_seconds(self):
+        """Get the wall-clock budget of a background job in seconds (per run, resets on resume)"""
+        return self.config.get('job_max_seconds', 3600)
+
+    def get_stall_threshold_ms(self):
+        """Get how long the GUI event loop may block before it counts as a stall; 0 disables the watchdog"""
+        return self.config.get('stall_threshold_ms', 250)
+
+    def get_approval_timeout(self):
+        """Get how long a command waits for approval before it is denied, in seconds"""
+        return self.config.get('approval_timeout', 600)
+
+    def get_cassette(self):
+        """Get record/replay settings; the environment overrides the config file"""
+        cassette = {
+            'mode': 'off',
+            'path': os.path.join('~', '.claude_chat', 'cassette.jsonl'),
+            'latency_scale': 0.0,
+            'strict': False
+        }
+        cassette.update(self.config.get('cassette', {}))
+        if os.getenv('CLAUDECHAT_CASSETTE_MODE'):
+            cassette['mode'] = os.getenv('CLAUDECHAT_CASSETTE_MODE')
+        if os.getenv('CLAUDECHAT_CASSETTE'):
+            cassette['path'] = os.getenv('CLAUDECHAT_CASSETTE')
+        cassette['path'] = os.path.expanduser(cassette['path'])
+        return cassette
+
+    def get_tracing(self):
+        """Get tracing settings; CLAUDECHAT_TRACE=1 turns tracing on"""
+        tracing = {
+            'enabled': False,
+            'output_dir': os.path.join('~', '.claude_chat', 'traces'),
+            'profile_turns': False
+        }
+        tracing.update(self.config.get('tracing', {}))
+        if os.getenv('CLAUDECHAT_TRACE'):
+            tracing['enabled'] = os.getenv('CLAUDECHAT_TRACE') not in ('0', 'false', '')
+        if os.getenv('CLAUDECHAT_PROFILE_TURNS'):
+            tracing['profile_turns'] = os.getenv('CLAUDECHAT_PROFILE_TURNS') not in ('0', 'false', '')
+        tracing['output_dir'] = os.path.expanduser(tracing['output_dir'])
+        return tracing
+
+    def get_tool_selection(self):
+        """Get settings for choosing the tool schemas sent with each call (mode 'auto' or 'all')"""
+        selection = {
+            'mode': 'auto',
+            'compact_descriptions': False,
+            'recent_messages': 6
+        }
+        selection.update(self.config.get('tool_selection', {}))
+        return selection
+
+    def get_prefetch(self):
+        """Get settings for reading files named in a message before the first model call"""
+        prefetch = {
+            'enabled': False,
+            'max_files': 8,
+            'max_file_bytes': 32768,
+            'max_total_bytes': 131072,
+            'workers': 4
+        }
+        prefetch.update(self.config.get('prefetch', {}))
+        return prefetch
+
+    def get_allowed_directories(self):
+        """Get the directories the filesystem tools may access"""
+        return self.config.get('allowed_directories', [os.path.expanduser('~')])
+
+    def set_allowed_directories(self, directories):
+        """Set the directories the filesystem tools may access"""
+        self.config['allowed_directories'] = directories
+        self.save_config()
+
+    def get_sessions_db_path(self):
+        """Get the path of the SQLite session database"""
+        return os.path.expanduser(
+            self.config.get('sessions_db', os.path.join('~', '.claude_chat', 'sessions.db'))
+        )
+
     def get_system_prompt(self):
         """Get system prompt"""
         return """You are a helpful AI assistant. When working on tasks that involve multiple steps:
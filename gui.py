@@ -1,48 +1,584 @@
+import time
+STARTUP_T0 = time.perf_counter()  # Taken before the heavy imports for --profile-startup
+
 import sys
 import os
 import json
 import datetime
+import itertools
+import logging
+import threading
+import traceback
+from collections import OrderedDict, deque
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
     QSplitter, QTextEdit, QTreeWidget, QTreeWidgetItem, 
     QTabWidget, QMenuBar, QMenu, QToolBar, QStatusBar, QPlainTextEdit,
-    QMessageBox, QFileDialog, QDialog, QLabel, QLineEdit, QPushButton
+    QMessageBox, QFileDialog, QDialog, QLabel, QLineEdit, QPushButton,
+    QListWidget, QListWidgetItem, QListView, QAbstractItemView, QStyledItemDelegate, QStyle,
+    QInputDialog
+)
+from PyQt6.QtGui import (
+    QAction, QIcon, QTextCharFormat, QColor, QSyntaxHighlighter, QFont, QKeySequence, QTextDocument
+)
+from PyQt6.QtCore import (
+    Qt, QRegularExpression, QAbstractListModel, QModelIndex, QSize, QTimer, pyqtSignal,
+    QObject, QRunnable, QThreadPool, QFileSystemWatcher
 )
-from PyQt6.QtGui import QAction, QIcon, QTextCharFormat, QColor, QSyntaxHighlighter, QFont, QKeySequence
-from PyQt6.QtCore import Qt, QRegularExpression
 
-from claude_api import ClaudeAPI
 from config import Config
+from session_store import SessionStore, message_text
+from tracing import tracer
+from approval_queue import DENY
+
+logger = logging.getLogger(__name__)
+
+def _keywords(*words):
+    return r"\b(?:" + "|".join(words) + r")\b"
+
+# Token patterns per language, combined into one precompiled expression each.
+# Order matters: earlier alternatives win, so comments and strings come first.
+LANGUAGE_RULES = {
+    "python": [
+        ("comment", r"#[^\n]*"),
+        ("string", r"\"(?:[^\"\\]|\\.)*\"|'(?:[^'\\]|\\.)*'"),
+        ("keyword", _keywords(
+            "def", "class", "import", "from", "if", "else", "elif", "for", "while", "return",
+            "try", "except", "finally", "with", "as", "lambda", "yield", "pass", "break",
+            "continue", "raise", "in", "is", "not", "and", "or", "None", "True", "False",
+            "async", "await", "global", "nonlocal", "del", "assert"
+        )),
+        ("number", r"\b\d+(?:\.\d+)?\b"),
+    ],
+    "javascript": [
+        ("comment", r"//[^\n]*"),
+        ("string", r"\"(?:[^\"\\]|\\.)*\"|'(?:[^'\\]|\\.)*'|`(?:[^`\\]|\\.)*`"),
+        ("keyword", _keywords(
+            "function", "const", "let", "var", "if", "else", "for", "while", "return", "class",
+            "extends", "new", "try", "catch", "finally", "throw", "import", "export", "from",
+            "default", "async", "await", "typeof", "instanceof", "null", "undefined", "true",
+            "false", "this", "switch", "case", "break", "continue", "interface", "type", "enum"
+        )),
+        ("number", r"\b\d+(?:\.\d+)?\b"),
+    ],
+    "bash": [
+        ("comment", r"#[^\n]*"),
+        ("string", r"\"(?:[^\"\\]|\\.)*\"|'[^']*'"),
+        ("keyword", _keywords(
+            "if", "then", "else", "elif", "fi", "for", "while", "do", "done", "case", "esac",
+            "function", "return", "export", "local", "in", "echo", "cd", "source"
+        )),
+        ("variable", r"\$\{?\w+\}?"),
+    ],
+    "json": [
+        ("keyword", r"\"(?:[^\"\\]|\\.)*\"(?=\s*:)"),
+        ("string", r"\"(?:[^\"\\]|\\.)*\""),
+        ("number", r"-?\b\d+(?:\.\d+)?(?:[eE][+-]?\d+)?\b"),
+        ("constant", _keywords("true", "false", "null")),
+    ],
+    "text": [
+        ("string", r"\"(?:[^\"\\]|\\.)*\"|'(?:[^'\\]|\\.)*'"),
+        ("number", r"\b\d+(?:\.\d+)?\b"),
+    ],
+}
+
+LANGUAGE_ALIASES = {
+    "py": "python", "python3": "python",
+    "js": "javascript", "jsx": "javascript", "ts": "javascript", "tsx": "javascript",
+    "typescript": "javascript",
+    "sh": "bash", "shell": "bash", "zsh": "bash", "console": "bash",
+}
+
+TOKEN_COLORS = {
+    "keyword": "#569CD6",   # Blue
+    "string": "#CE9178",    # Orange
+    "comment": "#6A9955",   # Green
+    "number": "#B5CEA8",    # Light green
+    "constant": "#569CD6",  # Blue
+    "variable": "#9CDCFE",  # Light blue
+}
 
 class CodeHighlighter(QSyntaxHighlighter):
+    """Highlights fenced code blocks (```lang ... ```) inside conversation text.
+
+    The block state tracks whether a line is inside a fence and in which
+    language, so prose is skipped with a cheap prefix check and each code
+    line is scanned once by a single precompiled expression.
+    """
+    OUTSIDE_CODE = -1
+    FENCE = "```"
+
+    # Compiled once and shared by every highlighter (one per message document)
+    languages = list(LANGUAGE_RULES)
+    expressions = None  # Block states >= 0 index into this list of (expression, group names)
+    formats = None
+    fence_format = None
+
     def __init__(self, parent=None):
         super().__init__(parent)
-        
-        # Define syntax highlighting rules
-        keyword_format = QTextCharFormat()
-        keyword_format.setForeground(QColor("#569CD6"))  # Blue
-        keyword_format.setFontWeight(QFont.Weight.Bold)
-        
-        keywords = [
-            "def", "class", "import", "from", "if", "else", "elif", 
-            "for", "while", "return", "try", "except", "finally"
-        ]
-        
-        self.highlighting_rules = [(QRegularExpression(f"\\b{keyword}\\b"), keyword_format) for keyword in keywords]
+        if CodeHighlighter.expressions is None:
+            CodeHighlighter.compile_rules()
+
+    @classmethod
+    def compile_rules(cls):
+        formats = {}
+        for token, color in TOKEN_COLORS.items():
+            token_format = QTextCharFormat()
+            token_format.setForeground(QColor(color))
+            if token == "keyword":
+                token_format.setFontWeight(QFont.Weight.Bold)
+            if token == "comment":
+                token_format.setFontItalic(True)
+            formats[token] = token_format
+
+        fence_format = QTextCharFormat()
+        fence_format.setForeground(QColor("#808080"))
+
+        expressions = []
+        for language in cls.languages:
+            rules = LANGUAGE_RULES[language]
+            pattern = "|".join(f"(?<{token}>{regex})" for token, regex in rules)
+            expressions.append((QRegularExpression(pattern), [token for token, _ in rules]))
+
+        cls.formats, cls.fence_format, cls.expressions = formats, fence_format, expressions
+
+    def language_state(self, info):
+        """Map a fence info string (```python) to a block state"""
+        name = info.strip().split(" ")[0].lower() if info.strip() else "text"
+        name = LANGUAGE_ALIASES.get(name, name)
+        if name not in LANGUAGE_RULES:
+            name = "text"
+        return self.languages.index(name)
 
     def highlightBlock(self, text):
-        for pattern, format in self.highlighting_rules:
-            expression = QRegularExpression(pattern)
-            iterator = expression.globalMatch(text)
-            while iterator.hasNext():
-                match = iterator.next()
-                self.setFormat(match.capturedStart(), match.capturedLength(), format)
-
-class ConversationView(QTextEdit):
+        state = self.previousBlockState()
+        stripped = text.lstrip()
+
+        if stripped.startswith(self.FENCE):
+            self.setFormat(0, len(text), self.fence_format)
+            if state >= 0:
+                self.setCurrentBlockState(self.OUTSIDE_CODE)
+            else:
+                self.setCurrentBlockState(self.language_state(stripped[len(self.FENCE):]))
+            return
+
+        self.setCurrentBlockState(state if state >= 0 else self.OUTSIDE_CODE)
+        if state < 0 or not stripped:
+            return
+
+        expression, tokens = self.expressions[state]
+        iterator = expression.globalMatch(text)
+        while iterator.hasNext():
+            match = iterator.next()
+            for token in tokens:
+                if match.capturedStart(token) != -1:
+                    self.setFormat(match.capturedStart(), match.capturedLength(), self.formats[token])
+                    break
+
+class MessageListModel(QAbstractListModel):
+    """Compact message model: one (key, speaker, text) tuple per message"""
+    KeyRole = Qt.ItemDataRole.UserRole + 1
+    SpeakerRole = Qt.ItemDataRole.UserRole + 2
+    TextRole = Qt.ItemDataRole.UserRole + 3
+
     def __init__(self, parent=None):
         super().__init__(parent)
+        self.messages = []
+        self.keys = itertools.count()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.messages)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        key, speaker, text = self.messages[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return f"{speaker}: {text}" if speaker else text
+        if role == self.KeyRole:
+            return key
+        if role == self.SpeakerRole:
+            return speaker
+        if role == self.TextRole:
+            return text
+        return None
+
+    def append_message(self, speaker, text):
+        row = len(self.messages)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.messages.append((next(self.keys), speaker, text))
+        self.endInsertRows()
+
+    def prepend_messages(self, messages):
+        """Insert (speaker, text) pairs before the first row"""
+        if not messages:
+            return
+        self.beginInsertRows(QModelIndex(), 0, len(messages) - 1)
+        self.messages[:0] = [(next(self.keys), speaker, text) for speaker, text in messages]
+        self.endInsertRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self.messages = []
+        self.endResetModel()
+
+class MessageDelegate(QStyledItemDelegate):
+    """Paints messages as rich text without creating per-row widgets.
+
+    Row heights are cached per message for the current width, and laid-out
+    documents (with code highlighting) are kept in a small LRU so only the
+    rows actually on screen hold a QTextDocument.
+    """
+    MARGIN = 6
+    MAX_DOCUMENTS = 200
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.documents = OrderedDict()
+        self.heights = {}
+        self.width = -1
+
+    def text_width(self):
+        return max(50, self.parent().viewport().width() - 2 * self.MARGIN)
+
+    def check_width(self):
+        width = self.text_width()
+        if width != self.width:
+            self.width = width
+            self.heights.clear()
+            self.documents.clear()
+        return width
+
+    def build_document(self, index, width):
+        document = QTextDocument()
+        document.setDocumentMargin(0)
+        # The speaker gets its own line so a message that opens with a fence starts on its own block
+        speaker = index.data(MessageListModel.SpeakerRole)
+        text = index.data(MessageListModel.TextRole)
+        document.setPlainText(f"{speaker}:\n{text}" if speaker else text)
+        document.setTextWidth(width)
+        document.highlighter = CodeHighlighter(document)
+        return document
+
+    def document(self, index):
+        width = self.check_width()
+        key = index.data(MessageListModel.KeyRole)
+        document = self.documents.get(key)
+        if document is None:
+            document = self.build_document(index, width)
+            self.documents[key] = document
+            if len(self.documents) > self.MAX_DOCUMENTS:
+                self.documents.popitem(last=False)
+        else:
+            self.documents.move_to_end(key)
+        return document
+
+    def sizeHint(self, option, index):
+        width = self.check_width()
+        key = index.data(MessageListModel.KeyRole)
+        height = self.heights.get(key)
+        if height is None:
+            document = self.document(index)
+            height = int(document.size().height()) + 2 * self.MARGIN
+            self.heights[key] = height
+        return QSize(width + 2 * self.MARGIN, height)
+
+    def forget(self):
+        self.documents.clear()
+        self.heights.clear()
+
+    def paint(self, painter, option, index):
+        painter.save()
+        if option.state & QStyle.StateFlag.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+        document = self.document(index)
+        painter.translate(option.rect.left() + self.MARGIN, option.rect.top() + self.MARGIN)
+        painter.setClipRect(0, 0, option.rect.width() - self.MARGIN, option.rect.height() - self.MARGIN)
+        document.drawContents(painter)
+        painter.restore()
+
+class ConversationView(QListView):
+    PAGE_SIZE = 50
+    SPEAKERS = {"user": "You", "assistant": "Claude"}
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.message_model = MessageListModel(self)
+        self.delegate = MessageDelegate(self)
+        self.setModel(self.message_model)
+        self.setItemDelegate(self.delegate)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        self.setLayoutMode(QListView.LayoutMode.Batched)
+        self.setBatchSize(100)
+        self.setUniformItemSizes(False)
+
+        self.session_store = None
+        self.session_id = None
+        self.oldest_seq = 0
+        self.verticalScrollBar().valueChanged.connect(self.on_scroll)
+
+    def add_message(self, speaker, text):
+        """Append a live message and keep the view pinned to the bottom"""
+        self.message_model.append_message(speaker, text)
+        self.scrollToBottom()
+
+    def clear_messages(self):
+        """Clear the view and detach it from any stored session"""
+        self.session_id = None
+        self.oldest_seq = 0
+        self.message_model.clear()
+        self.delegate.forget()
+
+    def show_session(self, session_store, session_id):
+        """Show the newest page of a stored session; older pages load on scroll"""
+        self.clear_messages()
+        self.session_store = session_store
+        self.session_id = session_id
+        self.oldest_seq = session_store.message_count(session_id)
+        self.load_older_page()
+        self.scrollToBottom()
+
+    def format_message(self, message):
+        """Return the (speaker, text) pair for a stored message, or None to skip it"""
+        speaker = self.SPEAKERS.get(message['role'])
+        text = message_text(message['content'])
+        if not speaker or not text:
+            return None
+        return speaker, text
+
+    def load_older_page(self):
+        """Prepend the page of messages preceding the oldest one shown"""
+        messages = []
+        while not messages and self.session_id is not None and self.oldest_seq > 0:
+            page = self.session_store.load_page(self.session_id, before_seq=self.oldest_seq, limit=self.PAGE_SIZE)
+            if not page:
+                self.oldest_seq = 0
+                break
+            self.oldest_seq = page[0]['seq']
+            messages = [message for message in map(self.format_message, page) if message]
+
+        if not messages:
+            return
+
+        had_rows = self.message_model.rowCount() > 0
+        self.message_model.prepend_messages(messages)
+        if had_rows:
+            # Keep the previously first message where it was on screen
+            self.scrollTo(self.message_model.index(len(messages), 0), QAbstractItemView.ScrollHint.PositionAtTop)
+
+    def on_scroll(self, value):
+        if value == self.verticalScrollBar().minimum() and self.oldest_seq > 0:
+            self.load_older_page()
+
+    def keyPressEvent(self, event):
+        if event.matches(QKeySequence.StandardKey.Copy):
+            rows = sorted(index.row() for index in self.selectedIndexes())
+            text = "\n\n".join(self.message_model.index(row, 0).data() for row in rows)
+            QApplication.clipboard().setText(text)
+            event.accept()
+            return
+        super().keyPressEvent(event)
+
+class ToolOutputView(QPlainTextEdit):
+    """Read-only, block-capped output log; double-click a collapsed entry to expand it"""
+    EXPAND_MARKER = "[+] "
+
+    def __init__(self, panel, max_blocks, parent=None):
+        super().__init__(parent)
+        self.panel = panel
         self.setReadOnly(True)
-        self.highlighter = CodeHighlighter(self.document())
+        self.setMaximumBlockCount(max_blocks)
+        self.setLineWrapMode(QPlainTextEdit.LineWrapMode.NoWrap)
+
+    def mouseDoubleClickEvent(self, event):
+        cursor = self.cursorForPosition(event.pos())
+        text = cursor.block().text()
+        if text.startswith(self.EXPAND_MARKER) and "#" in text:
+            payload_id = text.rsplit("#", 1)[1].strip()
+            full_text, preview_blocks = self.panel.expand_payload(payload_id)
+            # Replace the preview lines above the marker along with the marker itself
+            cursor.movePosition(cursor.MoveOperation.EndOfBlock)
+            cursor.movePosition(cursor.MoveOperation.StartOfBlock, cursor.MoveMode.KeepAnchor)
+            for _ in range(preview_blocks):
+                if not cursor.movePosition(cursor.MoveOperation.PreviousBlock, cursor.MoveMode.KeepAnchor):
+                    break
+            cursor.insertText(full_text)
+            event.accept()
+            return
+        super().mouseDoubleClickEvent(event)
+
+class ToolOutputPanel(QTabWidget):
+    """Tool output tabs that coalesce incoming chunks and repaint at most ~30 times a second.
+
+    add_output() may be called from any thread: chunks are queued and the
+    GUI thread flushes them per tab in a single append. Large payloads are
+    shown as a preview and only formatted in full when expanded.
+    """
+    chunk_ready = pyqtSignal()
+
+    FLUSH_INTERVAL_MS = 33
+    MAX_BLOCKS = 5000
+    COLLAPSE_CHARS = 4000
+    PREVIEW_CHARS = 600
+    PREVIEW_ITEMS = 5
+    MAX_PAYLOADS = 100
+    MAX_PROCESS_TABS = 8
+    ALL = "all"
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setTabsClosable(True)
+        self.tabCloseRequested.connect(self.close_tab)
+
+        self.pending = deque()
+        self.pending_lock = threading.Lock()
+        self.payloads = OrderedDict()
+        self.payload_ids = itertools.count(1)
+        self.views = {}
+        self.finished = []
+
+        self.views[self.ALL] = ToolOutputView(self, self.MAX_BLOCKS)
+        self.addTab(self.views[self.ALL], "All")
+
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(self.FLUSH_INTERVAL_MS)
+        self.flush_timer.timeout.connect(self.flush)
+        self.chunk_ready.connect(self.schedule_flush)
+
+    def add_output(self, output, source=None, title=None):
+        """Queue output for display; `source` routes it to its own process tab as well"""
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.enqueue(("output", source, title, f"[{timestamp}]\n{self.format_output(output)}\n"))
+
+    def finish_process(self, source, status="done"):
+        """Queue marking a process tab finished"""
+        self.enqueue(("finish", source, status, None))
+
+    def enqueue(self, entry):
+        with self.pending_lock:
+            was_empty = not self.pending
+            self.pending.append(entry)
+        if was_empty:
+            self.chunk_ready.emit()
+
+    def schedule_flush(self):
+        if not self.flush_timer.isActive():
+            self.flush_timer.start()
+
+    def flush(self):
+        """Append all queued chunks, one append per tab"""
+        with self.pending_lock:
+            entries = list(self.pending)
+            self.pending.clear()
+
+        grouped = OrderedDict()
+        finished = []
+        for kind, source, title, text in entries:
+            if kind == "finish":
+                finished.append((source, title))
+                continue
+            grouped.setdefault(self.ALL, []).append(text)
+            if source is not None:
+                self.process_view(source, title)
+                grouped.setdefault(source, []).append(text)
+
+        for source, texts in grouped.items():
+            view = self.views.get(source)
+            if view is None:
+                continue
+            text = "\n".join(texts)
+            if text.count("\n") >= self.MAX_BLOCKS:
+                # Drop lines the block cap would discard anyway before laying them out
+                text = "\n".join(text.split("\n")[-self.MAX_BLOCKS:])
+            view.appendPlainText(text)
+
+        for source, status in finished:
+            self.mark_finished(source, status)
+
+    def format_output(self, output):
+        """Format output cheaply, collapsing anything large behind an expand marker"""
+        if isinstance(output, str):
+            size = len(output)
+        elif isinstance(output, (dict, list)):
+            # Nested values such as content blocks count at their serialized length
+            size = len(json.dumps(output, default=str))
+        else:
+            output = str(output)
+            size = len(output)
+
+        if size <= self.COLLAPSE_CHARS:
+            return output if isinstance(output, str) else json.dumps(output, indent=2, default=str)
+
+        if isinstance(output, str):
+            preview = output[:self.PREVIEW_CHARS] + "..."
+        else:
+            preview = json.dumps(self.preview_value(output), indent=2, default=str)
+
+        payload_id = str(next(self.payload_ids))
+        self.payloads[payload_id] = (output, preview.count("\n") + 1)
+        if len(self.payloads) > self.MAX_PAYLOADS:
+            self.payloads.popitem(last=False)
+        return f"{preview}\n{ToolOutputView.EXPAND_MARKER}{size} characters, double-click to expand #{payload_id}"
+
+    def preview_value(self, value, depth=0):
+        """Shorten long strings and lists at any depth of a JSON-like value"""
+        if isinstance(value, str):
+            return value[:self.PREVIEW_CHARS] + "..." if len(value) > self.PREVIEW_CHARS else value
+        if depth >= 4:
+            return "..." if isinstance(value, (dict, list)) else value
+        if isinstance(value, dict):
+            return {key: self.preview_value(item, depth + 1) for key, item in value.items()}
+        if isinstance(value, list):
+            items = [self.preview_value(item, depth + 1) for item in value[:self.PREVIEW_ITEMS]]
+            if len(value) > self.PREVIEW_ITEMS:
+                items.append(f"... {len(value) - self.PREVIEW_ITEMS} more")
+            return items
+        return value
+
+    def expand_payload(self, payload_id):
+        """Return the full text of a collapsed payload and the number of preview lines it replaces"""
+        payload = self.payloads.get(payload_id)
+        if payload is None:
+            return "(output no longer retained)", 0
+        output, preview_blocks = payload
+        return (output if isinstance(output, str) else json.dumps(output, indent=2, default=str)), preview_blocks
+
+    def process_view(self, source, title=None):
+        """Return the tab for a process, creating it on first output"""
+        view = self.views.get(source)
+        if view is None:
+            view = ToolOutputView(self, self.MAX_BLOCKS)
+            self.views[source] = view
+            self.addTab(view, title or str(source))
+        return view
+
+    def mark_finished(self, source, status):
+        """Mark a process tab finished; the oldest finished tabs are closed beyond the limit"""
+        view = self.views.get(source)
+        if view is None:
+            return
+        index = self.indexOf(view)
+        self.setTabText(index, f"{self.tabText(index)} ({status})")
+        self.finished.append(source)
+        while len(self.finished) > self.MAX_PROCESS_TABS:
+            self.remove_process(self.finished.pop(0))
+
+    def remove_process(self, source):
+        view = self.views.pop(source, None)
+        if view is not None:
+            self.removeTab(self.indexOf(view))
+            view.deleteLater()
+        if source in self.finished:
+            self.finished.remove(source)
+
+    def close_tab(self, index):
+        for source, view in list(self.views.items()):
+            if source != self.ALL and self.indexOf(view) == index:
+                self.remove_process(source)
 
 class ToolsPanel(QTreeWidget):
     def __init__(self, parent=None):
@@ -64,26 +600,230 @@ class ToolsPanel(QTreeWidget):
         for tool in file_list:
             QTreeWidgetItem(file_tools, [tool, "Available"])
 
+class DirectoryScanSignals(QObject):
+    # path, generation, [(name, is_dir, size, mtime)], done
+    entries_ready = pyqtSignal(str, int, list, bool)
+    # path, {child_path: child_count}
+    counts_ready = pyqtSignal(str, dict)
+
+class DirectoryScanJob(QRunnable):
+    """Lists one directory off the GUI thread, emitting entries in batches"""
+    BATCH_SIZE = 256
+
+    def __init__(self, signals, path, generation):
+        super().__init__()
+        self.signals = signals
+        self.path = path
+        self.generation = generation
+
+    def run(self):
+        batch = []
+        try:
+            with os.scandir(self.path) as entries:
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                        stat = entry.stat(follow_symlinks=False)
+                        batch.append((entry.name, is_dir, 0 if is_dir else stat.st_size, stat.st_mtime))
+                    except OSError:
+                        continue
+                    if len(batch) >= self.BATCH_SIZE:
+                        self.signals.entries_ready.emit(self.path, self.generation, batch, False)
+                        batch = []
+        except OSError as e:
+            logger.warning(f"Cannot list {self.path}: {e}")
+        self.signals.entries_ready.emit(self.path, self.generation, batch, True)
+
+class ChildCountJob(QRunnable):
+    """Counts the direct children of a batch of directories, capped per directory"""
+    LIMIT = 1000
+
+    def __init__(self, signals, parent_path, paths):
+        super().__init__()
+        self.signals = signals
+        self.parent_path = parent_path
+        self.paths = paths
+
+    def run(self):
+        counts = {}
+        for path in self.paths:
+            count = 0
+            try:
+                with os.scandir(path) as entries:
+                    for _ in entries:
+                        count += 1
+                        if count >= self.LIMIT:
+                            break
+            except OSError:
+                count = -1
+            counts[path] = count
+        self.signals.counts_ready.emit(self.parent_path, counts)
+
 class FileSystemBrowser(QTreeWidget):
-    def __init__(self, parent=None):
+    """Browser over the allowed directories.
+
+    Nothing is listed until a directory is expanded; listings and child
+    counts run on the thread pool and arrive in batches, and a watcher
+    applies incremental updates to directories that are open. A directory's
+    children are sorted once, when its scan finishes, on a hidden key column
+    that Qt compares natively.
+    """
+    PathRole = Qt.ItemDataRole.UserRole
+    IsDirRole = Qt.ItemDataRole.UserRole + 1
+    SORT_COLUMN = 3  # Hidden; directories first, then case-insensitive name
+    PLACEHOLDER = "Loading..."
+
+    def __init__(self, allowed_directories=None, parent=None):
         super().__init__(parent)
-        self.setHeaderLabels(["Name", "Type"])
+        self.setHeaderLabels(["Name", "Type", "Size", ""])
+        self.setColumnHidden(self.SORT_COLUMN, True)
+        self.allowed_directories = allowed_directories or [os.path.expanduser("~")]
+
+        self.items = {}         # path -> directory item
+        self.generations = {}   # path -> generation of the scan in flight
+        self.scan_state = {}    # path -> (names received, {name: child item}) for the scan in flight
+        self.thread_pool = QThreadPool.globalInstance()
+        self.signals = DirectoryScanSignals(self)
+        self.signals.entries_ready.connect(self.apply_entries)
+        self.signals.counts_ready.connect(self.apply_counts)
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.scan)
+
+        self.itemExpanded.connect(self.on_expanded)
+        self.itemCollapsed.connect(self.on_collapsed)
         self.populate_root()
 
     def populate_root(self):
-        home = QTreeWidgetItem(self, ["Home", "Directory"])
-        home.setIcon(0, QIcon.fromTheme("folder-home"))
-        
-        # Add some default directories
-        dirs = ["Documents", "Downloads", "Desktop"]
-        for dir_name in dirs:
-            dir_item = QTreeWidgetItem(home, [dir_name, "Directory"])
-            dir_item.setIcon(0, QIcon.fromTheme("folder"))
+        for directory in self.allowed_directories:
+            path = os.path.abspath(os.path.expanduser(directory))
+            item = self.make_item(self, path, path, True)
+            item.setIcon(0, QIcon.fromTheme("folder-home"))
+
+    def make_item(self, parent, path, name, is_dir, size=0):
+        item = QTreeWidgetItem(parent, [
+            name, "Directory" if is_dir else "File", "" if is_dir else self.format_size(size),
+            ("0" if is_dir else "1") + name.casefold()
+        ])
+        item.setData(0, self.PathRole, path)
+        item.setData(0, self.IsDirRole, is_dir)
+        if is_dir:
+            item.setIcon(0, QIcon.fromTheme("folder"))
+            item.setChildIndicatorPolicy(QTreeWidgetItem.ChildIndicatorPolicy.ShowIndicator)
+            self.items[path] = item
+        else:
+            item.setIcon(0, QIcon.fromTheme("text-x-generic"))
+        return item
+
+    @staticmethod
+    def format_size(size):
+        for unit in ("B", "KB", "MB", "GB"):
+            if size < 1024:
+                return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+            size /= 1024
+        return f"{size:.1f} TB"
+
+    def on_expanded(self, item):
+        path = item.data(0, self.PathRole)
+        if path not in self.watcher.directories():
+            self.watcher.addPath(path)
+        self.scan(path)
+
+    def on_collapsed(self, item):
+        # Stop watching; the next expand rescans and diffs against what is shown
+        path = item.data(0, self.PathRole)
+        if path in self.watcher.directories():
+            self.watcher.removePath(path)
+
+    def scan(self, path):
+        """Start a background listing of a directory; older scans of it are discarded"""
+        item = self.items.get(path)
+        if item is None:
+            return
+        generation = self.generations.get(path, 0) + 1
+        self.generations[path] = generation
+        self.scan_state.pop(path, None)
+        if item.childCount() == 0:
+            item.addChild(QTreeWidgetItem([self.PLACEHOLDER]))
+        self.thread_pool.start(DirectoryScanJob(self.signals, path, generation))
+
+    def apply_entries(self, path, generation, entries, done):
+        """Merge a batch of listing results into the tree"""
+        item = self.items.get(path)
+        if item is None or self.generations.get(path) != generation:
+            return
+
+        if path not in self.scan_state:
+            existing = {}
+            for i in range(item.childCount()):
+                child = item.child(i)
+                if child.data(0, self.PathRole) is not None:
+                    existing[child.text(0)] = child
+            self.scan_state[path] = (set(), existing)
+        seen, existing = self.scan_state[path]
+
+        self.setUpdatesEnabled(False)
+        try:
+            new_dirs = []
+            for name, is_dir, size, mtime in entries:
+                seen.add(name)
+                child = existing.get(name)
+                if child is not None and child.data(0, self.IsDirRole) == is_dir:
+                    if not is_dir:
+                        child.setText(2, self.format_size(size))
+                    continue
+                if child is not None:
+                    self.remove_child(item, child)
+                child_path = os.path.join(path, name)
+                existing[name] = self.make_item(item, child_path, name, is_dir, size)
+                if is_dir:
+                    new_dirs.append(child_path)
+
+            if done:
+                for i in reversed(range(item.childCount())):
+                    child = item.child(i)
+                    if child.data(0, self.PathRole) is None or child.text(0) not in seen:
+                        self.remove_child(item, child)
+                item.sortChildren(self.SORT_COLUMN, Qt.SortOrder.AscendingOrder)
+                item.setText(2, f"{len(seen)} items")
+                item.setChildIndicatorPolicy(
+                    QTreeWidgetItem.ChildIndicatorPolicy.DontShowIndicatorWhenChildless)
+                self.scan_state.pop(path, None)
+        finally:
+            self.setUpdatesEnabled(True)
+
+        if new_dirs:
+            self.thread_pool.start(ChildCountJob(self.signals, path, new_dirs))
+
+    def apply_counts(self, parent_path, counts):
+        for path, count in counts.items():
+            item = self.items.get(path)
+            if item is None:
+                continue
+            if count < 0:
+                item.setText(2, "no access")
+            else:
+                item.setText(2, f"{count}+ items" if count >= ChildCountJob.LIMIT else f"{count} items")
+                if count == 0:
+                    item.setChildIndicatorPolicy(QTreeWidgetItem.ChildIndicatorPolicy.DontShowIndicator)
+
+    def remove_child(self, parent, child):
+        """Remove a child item and forget any directories beneath it"""
+        child_path = child.data(0, self.PathRole)
+        if child_path is not None:
+            prefix = child_path + os.sep
+            for path in [p for p in self.items if p == child_path or p.startswith(prefix)]:
+                self.items.pop(path, None)
+                self.generations.pop(path, None)
+                self.scan_state.pop(path, None)
+                if path in self.watcher.directories():
+                    self.watcher.removePath(path)
+        parent.removeChild(child)
 
 class CommandApprovalDialog(QDialog):
-    def __init__(self, command, parent=None):
+    """Asks about every command awaiting approval at once"""
+    def __init__(self, approvals, parent=None):
         super().__init__(parent)
-        self.command = command
+        self.approvals = approvals
         self.result = "deny"
         self.setup_ui()
         
@@ -91,9 +831,19 @@ class CommandApprovalDialog(QDialog):
         self.setWindowTitle("Command Approval Required")
         layout = QVBoxLayout(self)
         
-        # Command display
-        command_label = QLabel(f"Command requires approval:\n{self.command}")
+        # Command display; unchecked commands are denied
+        count = len(self.approvals)
+        command_label = QLabel(f"{count} command{'s' if count != 1 else ''} require{'' if count != 1 else 's'} approval:")
         layout.addWidget(command_label)
+
+        self.command_list = QListWidget()
+        for approval in self.approvals:
+            item = QListWidgetItem(approval.command)
+            item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+            item.setCheckState(Qt.CheckState.Checked)
+            item.setData(Qt.ItemDataRole.UserRole, approval.id)
+            self.command_list.addItem(item)
+        layout.addWidget(self.command_list)
         
         # Buttons
         button_layout = QHBoxLayout()
@@ -112,6 +862,12 @@ class CommandApprovalDialog(QDialog):
         button_layout.addWidget(approve_always_btn)
         
         layout.addLayout(button_layout)
+
+    def checked_ids(self):
+        """Return the ids of the checked commands"""
+        items = (self.command_list.item(row) for row in range(self.command_list.count()))
+        return [item.data(Qt.ItemDataRole.UserRole) for item in items
+                if item.checkState() == Qt.CheckState.Checked]
     
     def deny_clicked(self):
         self.result = "deny"
@@ -125,16 +881,321 @@ class CommandApprovalDialog(QDialog):
         self.result = "approve_always"
         self.accept()
 
+class SessionListDialog(QDialog):
+    def __init__(self, session_store, parent=None):
+        super().__init__(parent)
+        self.session_store = session_store
+        self.session_id = None
+        self.setup_ui()
+
+    def setup_ui(self):
+        self.setWindowTitle("Open Chat")
+        self.resize(500, 400)
+        layout = QVBoxLayout(self)
+
+        self.session_list = QListWidget()
+        for session in self.session_store.list_sessions():
+            updated = datetime.datetime.fromtimestamp(session['updated_at']).strftime("%Y-%m-%d %H:%M")
+            title = session['title'] or "Untitled chat"
+            item = QListWidgetItem(f"{title}  ({session['message_count']} messages, {updated})")
+            item.setData(Qt.ItemDataRole.UserRole, session['id'])
+            self.session_list.addItem(item)
+        self.session_list.itemDoubleClicked.connect(self.open_clicked)
+        layout.addWidget(self.session_list)
+
+        button_layout = QHBoxLayout()
+
+        cancel_btn = QPushButton("Cancel")
+        cancel_btn.clicked.connect(self.reject)
+
+        open_btn = QPushButton("Open")
+        open_btn.clicked.connect(self.open_clicked)
+
+        button_layout.addWidget(cancel_btn)
+        button_layout.addWidget(open_btn)
+
+        layout.addLayout(button_layout)
+
+    def open_clicked(self):
+        item = self.session_list.currentItem()
+        if item:
+            self.session_id = item.data(Qt.ItemDataRole.UserRole)
+            self.accept()
+
+class JobListDialog(QDialog):
+    """Lists background jobs with their progress; jobs can be queued, cancelled and opened"""
+    def __init__(self, job_runner, job_progress, parent=None):
+        super().__init__(parent)
+        self.job_runner = job_runner
+        self.session_id = None
+        self.setup_ui()
+        self.refresh()
+        job_progress.connect(self.refresh)
+
+    def setup_ui(self):
+        self.setWindowTitle("Background Jobs")
+        self.resize(600, 400)
+        layout = QVBoxLayout(self)
+
+        self.job_list = QListWidget()
+        self.job_list.itemDoubleClicked.connect(self.open_clicked)
+        layout.addWidget(self.job_list)
+
+        button_layout = QHBoxLayout()
+
+        new_btn = QPushButton("New Job...")
+        new_btn.clicked.connect(self.new_clicked)
+
+        cancel_job_btn = QPushButton("Cancel Job")
+        cancel_job_btn.clicked.connect(self.cancel_clicked)
+
+        open_btn = QPushButton("Open")
+        open_btn.clicked.connect(self.open_clicked)
+
+        close_btn = QPushButton("Close")
+        close_btn.clicked.connect(self.reject)
+
+        button_layout.addWidget(new_btn)
+        button_layout.addWidget(cancel_job_btn)
+        button_layout.addWidget(open_btn)
+        button_layout.addWidget(close_btn)
+
+        layout.addLayout(button_layout)
+
+    def refresh(self, *_):
+        current = self.job_list.currentItem()
+        selected = current.data(Qt.ItemDataRole.UserRole)['id'] if current else None
+        self.job_list.clear()
+        for job in self.job_runner.jobs():
+            prompt = job['prompt'].splitlines()[0][:50] if job['prompt'] else ''
+            item = QListWidgetItem(f"#{job['id']} [{job['status']}] p{job['priority']}  {prompt}  - {job['progress']}")
+            item.setData(Qt.ItemDataRole.UserRole, job)
+            self.job_list.addItem(item)
+            if job['id'] == selected:
+                self.job_list.setCurrentItem(item)
+
+    def new_clicked(self):
+        prompt, ok = QInputDialog.getMultiLineText(self, "New Job", "Task for the background job:")
+        if not ok or not prompt.strip():
+            return
+        priority, ok = QInputDialog.getInt(self, "New Job", "Priority (higher runs first):", 0, -100, 100)
+        if ok:
+            self.job_runner.submit(prompt.strip(), priority)
+
+    def cancel_clicked(self):
+        item = self.job_list.currentItem()
+        if item:
+            self.job_runner.cancel(item.data(Qt.ItemDataRole.UserRole)['id'])
+
+    def open_clicked(self):
+        item = self.job_list.currentItem()
+        if item and item.data(Qt.ItemDataRole.UserRole)['session_id'] is not None:
+            self.session_id = item.data(Qt.ItemDataRole.UserRole)['session_id']
+            self.accept()
+
+class StartupProfiler:
+    """Collects startup phase timings for --profile-startup"""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.marks = [("process start", STARTUP_T0)]
+        self.lock = threading.Lock()
+
+    def mark(self, label):
+        if self.enabled:
+            with self.lock:
+                self.marks.append((label, time.perf_counter()))
+
+    def report(self):
+        """Print each phase with its offset from process start and its own duration"""
+        if not self.enabled:
+            return
+        with self.lock:
+            marks = sorted(self.marks, key=lambda mark: mark[1])
+        print("Startup profile (ms since start / phase duration):", file=sys.stderr)
+        previous = STARTUP_T0
+        for label, timestamp in marks[1:]:
+            print(f"  {(timestamp - STARTUP_T0) * 1000:8.1f}  {(timestamp - previous) * 1000:8.1f}  {label}",
+                  file=sys.stderr)
+            previous = timestamp
+
+class StallWatchdog:
+    """Detects GUI event-loop stalls and records where the GUI thread was stuck.
+
+    A Qt timer stamps a heartbeat from the event loop. A monitor thread
+    notices when the heartbeat stops for longer than the threshold, captures
+    the GUI thread's Python stack with sys._current_frames() and logs it,
+    then logs the stall's duration once the heartbeat resumes.
+    """
+    HEARTBEAT_MS = 50
+    MAX_RECENT = 20
+
+    def __init__(self, threshold_ms=250, parent=None):
+        self.threshold = threshold_ms / 1000
+        self.gui_thread_id = threading.get_ident()
+        self.last_beat = time.monotonic()
+        self.lock = threading.Lock()
+        self.stall_count = 0
+        self.total_stall = 0.0
+        self.worst = None  # (duration, stack)
+        self.recent = deque(maxlen=self.MAX_RECENT)  # (start time, duration, stack)
+        self.current = None  # (last heartbeat, stack) while stalled
+        self.stopped = threading.Event()
+        self.timer = QTimer(parent)
+        self.timer.setInterval(self.HEARTBEAT_MS)
+        self.timer.timeout.connect(self.beat)
+        self.thread = threading.Thread(target=self.monitor, daemon=True, name="stall-watchdog")
+
+    def start(self):
+        self.last_beat = time.monotonic()
+        self.timer.start()
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.timer.stop()
+
+    def beat(self):
+        self.last_beat = time.monotonic()
+
+    def capture_stack(self):
+        frame = sys._current_frames().get(self.gui_thread_id)
+        return "".join(traceback.format_stack(frame)) if frame else "(GUI thread stack unavailable)\n"
+
+    def monitor(self):
+        interval = min(self.threshold / 4, 0.05)
+        while not self.stopped.wait(interval):
+            last_beat = self.last_beat
+            if self.current is None:
+                gap = time.monotonic() - last_beat
+                if gap > self.threshold:
+                    stack = self.capture_stack()
+                    self.current = (last_beat, stack)
+                    logger.warning(f"GUI event loop blocked for over {gap * 1000:.0f} ms in:\n{stack}")
+            elif last_beat > self.current[0]:
+                # The heartbeat is back: the stall lasted from the last beat before it until this one
+                started, stack = self.current
+                self.current = None
+                self.record(started, last_beat - started, stack)
+
+    def record(self, started, duration, stack):
+        logger.warning(f"GUI event loop stall ended after {duration * 1000:.0f} ms")
+        with self.lock:
+            self.stall_count += 1
+            self.total_stall += duration
+            if self.worst is None or duration > self.worst[0]:
+                self.worst = (duration, stack)
+            self.recent.append((time.time() - (time.monotonic() - started), duration, stack))
+
+    def summary(self):
+        """Return stall counts and durations as a plain dict"""
+        with self.lock:
+            return {
+                'threshold_ms': self.threshold * 1000,
+                'stalls': self.stall_count,
+                'total_ms': self.total_stall * 1000,
+                'worst_ms': self.worst[0] * 1000 if self.worst else 0.0,
+                'worst_stack': self.worst[1] if self.worst else "",
+                'recent': [
+                    {'time': start, 'duration_ms': duration * 1000, 'stack': stack}
+                    for start, duration, stack in self.recent
+                ],
+            }
+
 class MainWindow(QMainWindow):
-    def __init__(self):
+    backend_finished = pyqtSignal()
+    turn_finished = pyqtSignal(str, str)  # speaker, text
+    approvals_changed = pyqtSignal()
+    job_progress = pyqtSignal(dict)
+
+    def __init__(self, config=None, profiler=None):
         super().__init__()
         self.setWindowTitle("Claude AI Assistant")
         self.resize(1200, 800)
-        
-        # Initialize core components
-        self.claude_api = ClaudeAPI()
-        self.config = Config()
+        self.profiler = profiler or StartupProfiler()
+
+        # Initialize core components; the API client is built in the background
+        self.config = config or Config()
+        tracer.configure_from_config(self.config)
+        self.profiler.mark("config loaded")
+        self.session_store = SessionStore(self.config.get_sessions_db_path())
+        self.claude_api = None
+        self.backend = None
+        self.backend_error = None
+        self.backend_thread = None
+        self.backend_finished.connect(self.attach_backend)
+        self.turn_thread = None  # Runs the current message so the window stays responsive
+        self.image_path = None  # Attached to the next message
+        self.job_runner = None  # Started once the API client is ready
+        self.job_progress.connect(self.on_job_progress)
+        self.turn_finished.connect(self.on_turn_finished)
+        self.approval_prompt = QTimer(self)
+        self.approval_prompt.setSingleShot(True)
+        self.approval_prompt.setInterval(150)  # Gathers approvals that arrive together into one prompt
+        self.approval_prompt.timeout.connect(self.show_approval_prompt)
+        self.approvals_changed.connect(self.approval_prompt.start)
+        threshold = self.config.get_stall_threshold_ms()
+        self.watchdog = StallWatchdog(threshold, self) if threshold else None
+        if self.watchdog:
+            self.watchdog.start()
         self.setup_ui()
+        self.setup_menus()
+        self.setup_toolbar()
+        self.setup_statusbar()
+        self.profiler.mark("main window built")
+
+    def start_backend(self):
+        """Import and construct the API client on a background thread"""
+        self.statusBar().showMessage("Connecting...")
+        self.backend_thread = threading.Thread(target=self.init_backend, daemon=True)
+        self.backend_thread.start()
+
+    def init_backend(self):
+        try:
+            from claude_api import ClaudeAPI
+            self.profiler.mark("import claude_api (background)")
+            api = ClaudeAPI(self.config)
+            self.profiler.mark("ClaudeAPI init (background)")
+            api.warm_up()
+            self.profiler.mark("SDK client and tool session ready (background)")
+            threading.Thread(target=self.prune_blobs, args=(api.blob_store,), daemon=True).start()
+            self.backend = api
+        except Exception as e:
+            logger.error(f"Error initializing ClaudeAPI: {e}")
+            self.backend_error = e
+        self.backend_finished.emit()
+
+    def prune_blobs(self, blob_store):
+        try:
+            blob_store.prune(self.config.get_blob_max_bytes(), self.config.get_blob_max_age_days())
+        except Exception as e:
+            logger.error(f"Error pruning blob store: {e}")
+
+    def attach_backend(self):
+        """Wire the background-built ClaudeAPI into the window (safe to call twice)"""
+        if self.claude_api is not None or self.backend is None:
+            if self.backend_error is not None:
+                self.statusBar().showMessage(f"Could not initialize Claude API: {self.backend_error}")
+            return
+        self.backend.set_session_store(self.session_store)
+        self.backend.set_tool_output_callback(self.on_tool_output)
+        self.backend.approvals.add_listener(self.approvals_changed.emit)
+        self.claude_api = self.backend
+        self.start_job_runner()
+        self.statusBar().showMessage("Ready")
+        self.profiler.mark("backend attached")
+        self.profiler.report()
+
+    def api(self):
+        """Return the ClaudeAPI instance, waiting for background initialization if needed"""
+        if self.claude_api is None:
+            if self.backend_thread is None:
+                self.start_backend()
+            self.backend_thread.join()
+            self.attach_backend()
+        if self.claude_api is None:
+            raise RuntimeError(f"Claude API is not available: {self.backend_error}")
+        return self.claude_api
 
     def setup_ui(self):
         # Central widget and main layout
@@ -156,8 +1217,7 @@ class MainWindow(QMainWindow):
         # Initialize command history and tool output tabs with text areas
         self.command_history = QPlainTextEdit()
         self.command_history.setReadOnly(True)
-        self.tool_outputs = QPlainTextEdit()
-        self.tool_outputs.setReadOnly(True)
+        self.tool_outputs = ToolOutputPanel()
         
         tabs.addTab(self.command_history, "Command History")
         tabs.addTab(self.tool_outputs, "Tool Outputs")
@@ -190,7 +1250,7 @@ class MainWindow(QMainWindow):
         central_splitter.addWidget(input_widget)
         
         # Right sidebar: Filesystem Browser
-        filesystem_browser = FileSystemBrowser()
+        filesystem_browser = FileSystemBrowser(self.config.get_allowed_directories())
         filesystem_browser.setMaximumWidth(250)
         
         # Assemble main layout
@@ -206,10 +1266,32 @@ class MainWindow(QMainWindow):
         # File Menu
         file_menu = menubar.addMenu("&File")
         new_chat_action = QAction("New Chat", self)
+        new_chat_action.setShortcut(QKeySequence.StandardKey.New)
+        new_chat_action.triggered.connect(self.new_chat)
         file_menu.addAction(new_chat_action)
+
+        open_chat_action = QAction("Open Chat...", self)
+        open_chat_action.setShortcut(QKeySequence.StandardKey.Open)
+        open_chat_action.triggered.connect(self.open_chat)
+        file_menu.addAction(open_chat_action)
         
         # Tools Menu
         tools_menu = menubar.addMenu("&Tools")
+        route_stats_action = QAction("Model Routing Statistics", self)
+        route_stats_action.triggered.connect(self.show_route_stats)
+        tools_menu.addAction(route_stats_action)
+
+        jobs_action = QAction("Background Jobs...", self)
+        jobs_action.triggered.connect(self.show_jobs)
+        tools_menu.addAction(jobs_action)
+
+        stall_report_action = QAction("UI Stall Report", self)
+        stall_report_action.triggered.connect(self.show_stall_report)
+        tools_menu.addAction(stall_report_action)
+
+        model_action = QAction("Model...", self)
+        model_action.triggered.connect(self.choose_model)
+        tools_menu.addAction(model_action)
         
         # Settings Menu
         settings_menu = menubar.addMenu("&Settings")
@@ -222,47 +1304,230 @@ class MainWindow(QMainWindow):
         
         # Add toolbar actions
         new_chat_action = QAction(QIcon.fromTheme("document-new"), "New Chat", self)
+        new_chat_action.triggered.connect(self.new_chat)
         toolbar.addAction(new_chat_action)
 
     def setup_statusbar(self):
         statusbar = self.statusBar()
         statusbar.showMessage("Ready")
         
+    def turn_running(self):
+        """True while a message is being answered; the conversation must not change meanwhile"""
+        if self.turn_thread is not None and self.turn_thread.is_alive():
+            self.statusBar().showMessage("Claude is still answering the previous message")
+            return True
+        return False
+
+    def new_chat(self):
+        """Start a new conversation; it is saved as a new session on the first message"""
+        if self.turn_running():
+            return
+        if self.claude_api is not None:
+            self.claude_api.clear_conversation()
+        self.conversation_view.clear_messages()
+        self.statusBar().showMessage("New chat started")
+
+    def open_chat(self):
+        """Reopen a stored conversation"""
+        try:
+            api = self.api()
+        except Exception as e:
+            QMessageBox.warning(self, "Open Chat", str(e))
+            return
+        if self.turn_running():
+            return
+        dialog = SessionListDialog(self.session_store, self)
+        if dialog.exec() and dialog.session_id is not None:
+            api.open_session(dialog.session_id)
+            self.conversation_view.show_session(self.session_store, dialog.session_id)
+            session = self.session_store.get_session(dialog.session_id)
+            self.statusBar().showMessage(f"Opened chat: {session['title'] or 'Untitled chat'}")
+
+    def show_route_stats(self):
+        """Show per-route model latency and token statistics"""
+        stats = self.claude_api.get_route_stats() if self.claude_api else {}
+        if not stats:
+            QMessageBox.information(self, "Model Routing Statistics", "No model calls yet.")
+            return
+        lines = []
+        for route, route_stats in stats.items():
+            models = ", ".join(f"{model} x{count}" for model, count in route_stats['models'].items())
+            lines.append(
+                f"{route}: {route_stats['calls']} calls, {route_stats['failures']} failed, "
+                f"mean {route_stats['mean_latency_s']:.2f}s, max {route_stats['max_latency_s']:.2f}s, "
+                f"{route_stats['input_tokens']} in / {route_stats['output_tokens']} out tokens ({models})"
+            )
+        tool_stats = self.claude_api.get_tool_selection_stats()
+        if tool_stats['requests']:
+            lines.append(
+                f"Tool schemas: ~{tool_stats['tokens_sent']} tokens sent, ~{tool_stats['tokens_saved']} saved "
+                f"over {tool_stats['requests']} calls"
+            )
+        QMessageBox.information(self, "Model Routing Statistics", "\n".join(lines))
+
+    def choose_model(self):
+        """Pick a model for every call, or go back to the routing policy"""
+        try:
+            api = self.api()
+        except Exception as e:
+            QMessageBox.warning(self, "Model", str(e))
+            return
+        automatic = "Automatic (model routing)"
+        routing = self.config.get_routing()
+        models = [self.config.get_model(), *routing['routes'].values(),
+                  routing.get('large_input_model'), routing.get('escalation_model')]
+        choices = [automatic] + list(dict.fromkeys(model for model in models if model))
+        current = choices.index(api.model_override) if api.model_override in choices else 0
+        choice, ok = QInputDialog.getItem(self, "Model", "Model for every call:", choices, current, True)
+        if not ok:
+            return
+        choice = choice.strip()
+        api.set_model_override(None if choice in ("", automatic) else choice)
+        self.statusBar().showMessage(f"Using {api.model_override}" if api.model_override else "Using model routing")
+
+    def start_job_runner(self):
+        """Start the background job workers, resuming jobs left unfinished by the last run"""
+        from jobs import JobRunner
+
+        def job_api():
+            api = self.claude_api.spawn_child(subagent=False)
+            api.set_tool_output_callback(None)  # Job tool output stays out of the foreground view
+            return api
+
+        self.job_runner = JobRunner(
+            self.session_store,
+            job_api,
+            workers=self.config.get_job_workers(),
+            progress_callback=self.job_progress.emit,
+            max_iterations=self.config.get_job_max_iterations(),
+            max_seconds=self.config.get_job_max_seconds()
+        )
+        self.job_runner.start()
+
+    def on_job_progress(self, job):
+        self.statusBar().showMessage(f"Job #{job['id']} {job['status']}: {job['progress']}")
+
+    def show_jobs(self):
+        """List background jobs; opening one shows its conversation"""
+        try:
+            self.api()
+        except Exception as e:
+            QMessageBox.warning(self, "Background Jobs", str(e))
+            return
+        if self.turn_running():
+            return
+        dialog = JobListDialog(self.job_runner, self.job_progress, self)
+        if dialog.exec() and dialog.session_id is not None:
+            self.claude_api.open_session(dialog.session_id)
+            self.conversation_view.show_session(self.session_store, dialog.session_id)
+            self.statusBar().showMessage(f"Opened job conversation {dialog.session_id}")
+
+    def show_stall_report(self):
+        """Show how often and how long the event loop has been blocked, and where"""
+        if self.watchdog is None:
+            QMessageBox.information(self, "UI Stall Report", "The stall watchdog is disabled (stall_threshold_ms is 0).")
+            return
+        summary = self.watchdog.summary()
+        lines = [
+            f"Stalls over {summary['threshold_ms']:.0f} ms: {summary['stalls']}",
+            f"Total time blocked: {summary['total_ms']:.0f} ms",
+            f"Worst stall: {summary['worst_ms']:.0f} ms",
+        ]
+        for stall in reversed(summary['recent'][-5:]):
+            when = datetime.datetime.fromtimestamp(stall['time']).strftime("%H:%M:%S")
+            lines.append(f"  {when}  {stall['duration_ms']:.0f} ms")
+        box = QMessageBox(QMessageBox.Icon.Information, "UI Stall Report", "\n".join(lines),
+                          QMessageBox.StandardButton.Ok, self)
+        if summary['worst_stack']:
+            box.setDetailedText(f"GUI thread stack during the worst stall:\n{summary['worst_stack']}")
+        box.exec()
+
+    def closeEvent(self, event):
+        if self.watchdog:
+            self.watchdog.stop()
+        if self.job_runner:
+            # Running jobs stay marked running and resume from their last checkpoint next time
+            self.job_runner.stop()
+        self.session_store.close()
+        super().closeEvent(event)
+
     def add_to_command_history(self, command):
         """Add a command to the command history tab"""
         timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         self.command_history.appendPlainText(f"[{timestamp}] {command}")
         
-    def add_to_tool_outputs(self, output):
+    def add_to_tool_outputs(self, output, source=None, title=None):
         """Add tool output to the tool outputs tab"""
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        if isinstance(output, dict):
-            formatted_output = json.dumps(output, indent=2)
+        self.tool_outputs.add_output(output, source, title)
+
+    def on_tool_output(self, tool_name, tool_input, result):
+        """Route a finished tool call to the output panel; commands get their own tab"""
+        if tool_name == "execute_command":
+            source = result.get("tool_use_id") if isinstance(result, dict) else None
+            command = tool_input.get("command", "")
+            title = command if len(command) <= 24 else command[:21] + "..."
+            self.add_to_tool_outputs(result, source, title)
+            if source:
+                self.tool_outputs.finish_process(source, "failed" if result.get("is_error") else "done")
         else:
-            formatted_output = str(output)
-        self.tool_outputs.appendPlainText(f"[{timestamp}]\n{formatted_output}\n")
-        
+            self.add_to_tool_outputs(result)
+
     def send_message(self):
-        """Send the current message to Claude"""
+        """Send the current message to Claude on a worker thread"""
         message = self.message_input.toPlainText().strip()
-        if message:
+        if message and not self.turn_running():
+            try:
+                api = self.api()
+            except Exception as e:
+                self.conversation_view.add_message("Error", str(e))
+                return
+
             # Add user message to conversation
-            self.conversation_view.append(f"You: {message}")
+            image_path, self.image_path = self.image_path, None
+            shown = f"{message}\n[Image: {os.path.basename(image_path)}]" if image_path else message
+            self.conversation_view.add_message("You", shown)
             self.add_to_command_history(message)
             
-            # Get Claude's response
+            # Get Claude's response; commands awaiting approval must not block the window
+            self.statusBar().showMessage("Waiting for Claude...")
+            self.turn_thread = threading.Thread(target=self.run_turn, args=(api, message, image_path), daemon=True)
+            self.turn_thread.start()
+            
+            # Clear input
+            self.message_input.clear()
+
+    def run_turn(self, api, message, image_path=None):
+        with tracer.span('gui.send_message', chars=len(message)):
             try:
-                response = self.claude_api.send_message(message)
+                response = api.send_message(message, image_path)
                 if isinstance(response, dict) and 'type' in response and response['type'] == 'tool_result':
                     self.add_to_tool_outputs(response)
-                    self.conversation_view.append("Claude: Tool execution completed. See Tool Outputs tab for details.")
+                    self.turn_finished.emit("Claude", "Tool execution completed. See Tool Outputs tab for details.")
                 else:
-                    self.conversation_view.append(f"Claude: {response}")
+                    self.turn_finished.emit("Claude", response)
             except Exception as e:
-                self.conversation_view.append(f"Error: {str(e)}")
-            
-            # Clear input
-            self.message_input.clear()
+                self.turn_finished.emit("Error", str(e))
+
+    def on_turn_finished(self, speaker, text):
+        self.conversation_view.add_message(speaker, text)
+        self.statusBar().showMessage("Ready")
+
+    def show_approval_prompt(self):
+        """Ask about every pending command in one dialog; decisions release the parked calls"""
+        if self.claude_api is None:
+            return
+        approvals = self.claude_api.approvals
+        pending = approvals.pending()
+        if not pending:
+            return
+        dialog = CommandApprovalDialog(pending, self)
+        dialog.exec()
+        checked = set(dialog.checked_ids())
+        approvals.decide([p.id for p in pending if p.id in checked], dialog.result)
+        approvals.decide([p.id for p in pending if p.id not in checked], DENY)
+        if approvals.pending():
+            # More commands arrived while the dialog was open
+            self.approval_prompt.start()
             
     def attach_image(self):
         """Open file dialog to attach an image"""
@@ -287,9 +1552,19 @@ class MainWindow(QMainWindow):
         super().keyPressEvent(event)
         
 def main():
-    app = QApplication(sys.argv)
-    window = MainWindow()
+    profiler = StartupProfiler(enabled="--profile-startup" in sys.argv)
+    profiler.mark("imports done")
+    app = QApplication([arg for arg in sys.argv if arg != "--profile-startup"])
+    profiler.mark("QApplication created")
+    window = MainWindow(profiler=profiler)
     window.show()
+    profiler.mark("window shown")
+
+    def on_first_event():
+        profiler.mark("event loop running (interactive)")
+        window.start_backend()
+
+    QTimer.singleShot(0, on_first_event)
     sys.exit(app.exec())
 
 if __name__ == "__main__":
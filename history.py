@@ -0,0 +1,124 @@
+import json
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Content blocks whose base64 payload is kept out of the history
+BINARY_BLOCK_TYPES = ('image', 'document')
+
+
+class Message:
+    """One history entry; `content` is a string or a tuple of shared content blocks"""
+    __slots__ = ('role', 'content')
+
+    def __init__(self, role, content):
+        self.role = role
+        self.content = content
+
+    def to_dict(self):
+        content = self.content if isinstance(self.content, str) else list(self.content)
+        return {'role': self.role, 'content': content}
+
+
+class ConversationHistory:
+    """Compact conversation history.
+
+    Identical content blocks are stored once and shared between messages, and
+    base64 image and document payloads go to the blob store, leaving a small
+    reference in the history. Payloads are read back only while a request is
+    built, so memory grows with unique text rather than with attachments or
+    the number of iterations.
+    """
+
+    def __init__(self, blob_store):
+        self.blob_store = blob_store
+        self.messages = []
+        self._blocks = {}  # digest of canonical JSON -> shared block
+        self._strings = {}  # string content -> the one shared copy
+
+    def __len__(self):
+        return len(self.messages)
+
+    def __iter__(self):
+        return iter(self.messages)
+
+    def __getitem__(self, index):
+        return self.messages[index]
+
+    def clear(self):
+        self.messages = []
+        self._blocks = {}
+        self._strings = {}
+
+    def append(self, role, content):
+        """Append a message and return its compact Message"""
+        message = Message(role, self._compact_content(content))
+        self.messages.append(message)
+        return message
+
+    def replace_last(self, role, content):
+        message = Message(role, self._compact_content(content))
+        self.messages[-1] = message
+        return message
+
+    def compact(self, content):
+        """Return content in its stored form (blob references instead of payloads)"""
+        content = self._compact_content(content)
+        return content if isinstance(content, str) else list(content)
+
+    def _compact_content(self, content):
+        if isinstance(content, str):
+            return self._strings.setdefault(content, content)
+        return tuple(self._compact_block(block) for block in content)
+
+    def _compact_block(self, block):
+        if not isinstance(block, dict):
+            return block
+        block_type = block.get('type')
+        source = block.get('source')
+        if block_type in BINARY_BLOCK_TYPES and isinstance(source, dict) and source.get('type') == 'base64':
+            handle = self.blob_store.put(source['data'])
+            block = dict(block, source={'type': 'blob', 'media_type': source.get('media_type'), 'handle': handle})
+        elif block_type == 'tool_result' and isinstance(block.get('content'), list):
+            block = dict(block, content=[self._compact_block(inner) for inner in block['content']])
+        elif block_type == 'tool_result' and isinstance(block.get('content'), str):
+            # Results differ by tool_use_id, but repeated output is shared
+            block = dict(block, content=self._strings.setdefault(block['content'], block['content']))
+        elif block_type == 'text' and isinstance(block.get('text'), str):
+            block = dict(block, text=self._strings.setdefault(block['text'], block['text']))
+
+        canonical = json.dumps(block, sort_keys=True, separators=(',', ':'), default=str)
+        return self._blocks.setdefault(hashlib.sha256(canonical.encode('utf-8')).digest(), block)
+
+    def to_compact(self):
+        """Return the history as plain dicts with blob references left in place"""
+        return [message.to_dict() for message in self.messages]
+
+    def to_request(self):
+        """Return the history as API messages, turning blob references back into payloads"""
+        payloads = {}  # Each blob is read once per request
+        return [
+            {
+                'role': message.role,
+                'content': message.content if isinstance(message.content, str)
+                else [self._materialize(block, payloads) for block in message.content]
+            }
+            for message in self.messages
+        ]
+
+    def _materialize(self, block, payloads):
+        if not isinstance(block, dict):
+            return block
+        source = block.get('source')
+        if isinstance(source, dict) and source.get('type') == 'blob':
+            handle = source.get('handle')
+            if handle not in payloads:
+                payloads[handle] = self.blob_store.get(handle)
+            if payloads[handle] is None:
+                logger.warning(f"Attachment {handle} is missing from the blob store")
+                return {'type': 'text', 'text': f"[{block.get('type', 'attachment')} no longer available]"}
+            return dict(block, source={'type': 'base64', 'media_type': source.get('media_type'), 'data': payloads[handle]})
+        if block.get('type') == 'tool_result' and isinstance(block.get('content'), list):
+            return dict(block, content=[self._materialize(inner, payloads) for inner in block['content']])
+        return block
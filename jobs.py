@@ -0,0 +1,164 @@
+import queue
+import logging
+import itertools
+import threading
+
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Job statuses
+QUEUED = 'queued'
+RUNNING = 'running'
+CANCELLING = 'cancelling'  # Cancel requested; the job stops at its next checkpoint
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+
+class JobCancelled(Exception):
+    """Raised from a checkpoint to stop a cancelled job between iterations"""
+
+
+class JobRunner:
+    """Runs long agent tasks in the background and checkpoints them after every iteration.
+
+    Each job is a conversation stored as a session in the SessionStore, and
+    its loop state (iteration count, tokens used and tool calls in flight)
+    is saved in the jobs table whenever the history reaches a resumable
+    point. Jobs wait in a priority queue (higher priority first, then oldest
+    first) for a pool of worker threads. On start, jobs a previous process
+    left queued or running are resumed from their last checkpoint. A cancel
+    request is stored with the job, so a job cancelled while running is not
+    resumed after a restart.
+    """
+
+    def __init__(self, session_store, api_factory, workers=2, progress_callback=None,
+                 max_iterations=50, max_seconds=3600):
+        self.session_store = session_store
+        self.api_factory = api_factory  # Returns a fresh ClaudeAPI for each job
+        self.workers = max(1, workers)
+        self.progress_callback = progress_callback  # Called as callback(job) from worker threads
+        self.max_iterations = max_iterations
+        self.max_seconds = max_seconds
+        self._queue = queue.PriorityQueue()
+        self._order = itertools.count()
+        self._threads = []
+        self._stopped = threading.Event()
+
+    def start(self):
+        """Start the workers and requeue the jobs an earlier run did not finish"""
+        if self._threads:
+            return
+        for job in self.session_store.list_jobs((CANCELLING,), limit=1000):
+            self.session_store.update_job(job['id'], status=CANCELLED, progress="Cancelled")
+        for job in self.session_store.list_jobs((QUEUED, RUNNING), limit=1000):
+            if job['status'] == RUNNING:
+                logger.info(f"Resuming job {job['id']} from iteration {job['iteration']}")
+                self.session_store.update_job(job['id'], status=QUEUED, progress="Waiting to resume")
+            self._enqueue(job['id'], job['priority'])
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, daemon=True, name=f"job-worker-{index}")
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Stop taking new jobs; running jobs stay resumable from their last checkpoint"""
+        self._stopped.set()
+
+    def submit(self, prompt, priority=0):
+        """Queue a job and return its id"""
+        job_id = self.session_store.create_job(prompt, priority, QUEUED)
+        self._enqueue(job_id, priority)
+        self._report(job_id)
+        return job_id
+
+    def cancel(self, job_id):
+        """Cancel a job; a running job stops at its next checkpoint"""
+        job = self.session_store.get_job(job_id)
+        if job is None:
+            return False
+        if job['status'] == QUEUED and self.session_store.update_job(
+                job_id, expected_status=QUEUED, status=CANCELLED, progress="Cancelled"):
+            self._report(job_id)
+            return True
+        # A job that started in the meantime is cancelled like a running one
+        if self.session_store.update_job(job_id, expected_status=RUNNING, status=CANCELLING, progress="Cancelling"):
+            self._report(job_id)
+            return True
+        return False
+
+    def jobs(self, statuses=None):
+        return self.session_store.list_jobs(statuses)
+
+    def _enqueue(self, job_id, priority):
+        self._queue.put((-priority, next(self._order), job_id))
+
+    def _report(self, job_id):
+        if not self.progress_callback:
+            return
+        try:
+            self.progress_callback(self.session_store.get_job(job_id))
+        except Exception as e:
+            logger.error(f"Error in job progress callback: {e}")
+
+    def _work(self):
+        while not self._stopped.is_set():
+            try:
+                _, _, job_id = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            job = self.session_store.get_job(job_id)
+            if job is None or job['status'] != QUEUED:
+                continue
+            self._run(job)
+
+    def _run(self, job):
+        job_id = job['id']
+        if not self.session_store.update_job(job_id, expected_status=QUEUED, status=RUNNING, progress="Starting"):
+            return  # Cancelled after it was taken off the queue
+        self._report(job_id)
+
+        api = None
+
+        def checkpoint(iteration_count, tokens_used, pending_tool_calls):
+            if self.session_store.get_job(job_id)['status'] == CANCELLING:
+                raise JobCancelled()
+            if pending_tool_calls:
+                names = ", ".join(call['name'] for call in pending_tool_calls)
+                progress = f"Iteration {iteration_count}: running {names}"
+            else:
+                progress = f"Iteration {iteration_count}: waiting for Claude"
+            self.session_store.update_job(
+                job_id,
+                session_id=api.session_id,
+                iteration=iteration_count,
+                tokens_used=tokens_used,
+                pending_tool_calls=pending_tool_calls,
+                progress=progress
+            )
+            self._report(job_id)
+
+        try:
+            # A factory failure (no API key, for example) fails the job instead of the worker
+            api = self.api_factory()
+            api.set_session_store(self.session_store)
+            api.max_iterations = self.max_iterations
+            api.max_turn_seconds = self.max_seconds
+            with tracer.span('job', job_id=job_id, priority=job['priority']):
+                if job['session_id'] is None:
+                    result = api.send_message(job['prompt'], checkpoint=checkpoint)
+                else:
+                    api.open_session(job['session_id'])
+                    result = api.resume_turn(job['iteration'], job['tokens_used'], checkpoint=checkpoint)
+            self.session_store.update_job(job_id, status=DONE, result=result, pending_tool_calls=[],
+                                          progress="Finished")
+        except JobCancelled:
+            self.session_store.update_job(job_id, status=CANCELLED, progress="Cancelled")
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            self.session_store.update_job(job_id, status=FAILED, error=str(e), progress="Failed")
+        finally:
+            if api is not None:
+                api.release_child()
+        self._report(job_id)
@@ -0,0 +1,96 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Turn types the router distinguishes
+FIRST_TURN = 'first_turn'
+TOOL_CONTINUATION = 'tool_continuation'
+
+# Route names that are not turn types
+OVERRIDE = 'override'
+LARGE_INPUT = 'large_input'
+ESCALATION = 'escalation'
+
+
+class RouteStats:
+    """Latency and token counters for one route"""
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.models = {}
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'failures': self.failures,
+            'mean_latency_s': self.total_latency / self.calls if self.calls else 0.0,
+            'max_latency_s': self.max_latency,
+            'input_tokens': self.input_tokens,
+            'output_tokens': self.output_tokens,
+            'models': dict(self.models),
+        }
+
+
+class ModelRouter:
+    """Picks a model for each API call from the routing section of the config.
+
+    Rules are checked in order: a user override (Tools > Model...), then the
+    large-input rule, then the route for the turn type, falling back to the
+    configured model.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def select(self, turn_type, estimated_input_tokens=0, override=None):
+        """Return (route, model) for a call"""
+        routing = self.config.get_routing()
+        default_model = self.config.get_model()
+
+        if override:
+            return OVERRIDE, override
+        if not routing.get('enabled', True):
+            return turn_type, default_model
+
+        threshold = routing.get('large_input_tokens')
+        if threshold and estimated_input_tokens >= threshold:
+            return LARGE_INPUT, routing.get('large_input_model') or default_model
+
+        return turn_type, routing.get('routes', {}).get(turn_type) or default_model
+
+    def escalation_model(self, failed_model):
+        """Return the model to retry a failed call with, or None"""
+        routing = self.config.get_routing()
+        if not routing.get('escalate_on_failure', True):
+            return None
+        model = routing.get('escalation_model') or self.config.get_model()
+        return model if model != failed_model else None
+
+    def record(self, route, model, latency, input_tokens=0, output_tokens=0, failed=False):
+        """Record the outcome of one call on a route"""
+        with self._lock:
+            stats = self._stats.setdefault(route, RouteStats())
+            stats.calls += 1
+            stats.failures += int(failed)
+            stats.total_latency += latency
+            stats.max_latency = max(stats.max_latency, latency)
+            stats.input_tokens += input_tokens
+            stats.output_tokens += output_tokens
+            stats.models[model] = stats.models.get(model, 0) + 1
+
+    def stats(self):
+        """Return per-route statistics as plain dicts"""
+        with self._lock:
+            return {route: stats.to_dict() for route, stats in self._stats.items()}
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {}
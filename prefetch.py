@@ -0,0 +1,141 @@
+import os
+import re
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Path-like tokens: anything with a slash, or a name with a file extension
+PATH_PATTERN = re.compile(r"(?:~|\.{1,2})?[\w.\-/\\]*[/\\][\w.\-/\\]+|[\w.\-]+\.[A-Za-z][\w]{0,7}\b")
+TRAILING_PUNCTUATION = ".,:;!?)]}'\"`"
+MAX_CANDIDATES = 64  # Tokens checked on disk per message
+
+
+class PrefetchedFile:
+    """A file read ahead of the first model call"""
+    __slots__ = ('path', 'text', 'size', 'truncated')
+
+    def __init__(self, path, text, size, truncated=False):
+        self.path = path
+        self.text = text
+        self.size = size
+        self.truncated = truncated
+
+
+class FilePrefetcher:
+    """Reads the files a message names before the model asks for them.
+
+    Candidate paths are taken from the message text, resolved against the
+    working directory and the allowed directories (the filesystem server's
+    own allowlist), and kept only if they are regular files inside an
+    allowed directory. The files are read
+    concurrently and returned as plain-text document blocks, capped per
+    file and in total, so the model does not spend its first round trip
+    on read_file calls.
+    """
+
+    def __init__(self, allowed_directories, max_files=8, max_file_bytes=32768,
+                 max_total_bytes=131072, workers=4):
+        self.allowed_directories = [os.path.realpath(os.path.expanduser(directory))
+                                    for directory in allowed_directories]
+        self.max_files = max_files
+        self.max_file_bytes = max_file_bytes
+        self.max_total_bytes = max_total_bytes
+        self.workers = max(1, workers)
+
+    def extract_paths(self, text):
+        """Return the path-like tokens of a message in order of appearance"""
+        candidates = []
+        for match in PATH_PATTERN.finditer(text or ''):
+            token = match.group(0).rstrip(TRAILING_PUNCTUATION)
+            start = match.start()
+            if not token or '://' in text[start:start + len(token) + 3]:
+                continue  # Part of a URL
+            if start > 0 and text[start - 1] in '@:':
+                continue  # Email addresses and URL hosts
+            if token not in candidates:
+                candidates.append(token)
+            if len(candidates) >= MAX_CANDIDATES:
+                break
+        return candidates
+
+    def is_allowed(self, path):
+        real = os.path.realpath(path)
+        for directory in self.allowed_directories:
+            try:
+                if os.path.commonpath([real, directory]) == directory:
+                    return True
+            except ValueError:
+                continue  # Different drives on Windows
+        return False
+
+    def resolve(self, candidate):
+        """Return the real path of an allowed regular file the candidate names, or None"""
+        candidate = os.path.expanduser(candidate)
+        if os.path.isabs(candidate):
+            options = [candidate]
+        else:
+            options = [os.path.join(os.getcwd(), candidate)]
+            options += [os.path.join(directory, candidate) for directory in self.allowed_directories]
+        for option in options:
+            if os.path.isfile(option) and self.is_allowed(option):
+                return os.path.realpath(option)
+        return None
+
+    def prefetch(self, text):
+        """Read the allowed files a message mentions, within the size budget"""
+        paths = []
+        for candidate in self.extract_paths(text):
+            path = self.resolve(candidate)
+            if path and path not in paths:
+                paths.append(path)
+            if len(paths) >= self.max_files:
+                break
+        if not paths:
+            return []
+
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(paths)), thread_name_prefix='prefetch') as pool:
+            results = list(pool.map(self._read, paths))
+
+        files = []
+        remaining = self.max_total_bytes
+        for result in results:
+            if result is None or remaining <= 0:
+                continue
+            if len(result.text) > remaining:
+                result.text = result.text[:remaining]
+                result.truncated = True
+            remaining -= len(result.text)
+            files.append(result)
+        return files
+
+    def _read(self, path):
+        try:
+            with open(path, 'rb') as f:
+                data = f.read(self.max_file_bytes + 1)
+            if b'\0' in data[:8192]:
+                return None  # Binary file
+            size = os.path.getsize(path)
+            text = data[:self.max_file_bytes].decode('utf-8', errors='replace')
+            return PrefetchedFile(path, text, size, truncated=size > self.max_file_bytes)
+        except OSError as e:
+            logger.debug(f"Could not prefetch {path}: {e}")
+            return None
+
+    @staticmethod
+    def to_blocks(files):
+        """Turn prefetched files into document blocks for the user turn"""
+        blocks = []
+        for file in files:
+            text = file.text
+            if file.truncated:
+                text += f"\n[Truncated: showing the first {len(file.text)} characters of {file.size} bytes; " \
+                        "use read_file for the rest]"
+            blocks.append({
+                "type": "document",
+                "source": {"type": "text", "media_type": "text/plain", "data": text},
+                "title": file.path,
+                "context": "Read in advance because the message mentions this file; "
+                           "read_file is only needed for changes made after this point."
+            })
+        return blocks
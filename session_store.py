@@ -0,0 +1,237 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL DEFAULT '',
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions (updated_at DESC);
+
+CREATE TABLE IF NOT EXISTS messages (
+    session_id INTEGER NOT NULL REFERENCES sessions (id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id INTEGER REFERENCES sessions (id) ON DELETE SET NULL,
+    prompt TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    iteration INTEGER NOT NULL DEFAULT 0,
+    tokens_used INTEGER NOT NULL DEFAULT 0,
+    pending_tool_calls TEXT NOT NULL DEFAULT '[]',
+    progress TEXT NOT NULL DEFAULT '',
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, priority DESC, id);
+"""
+
+JOB_FIELDS = ('session_id', 'priority', 'status', 'iteration', 'tokens_used', 'pending_tool_calls',
+              'progress', 'result', 'error')
+
+TITLE_LENGTH = 60
+
+
+def message_text(content):
+    """Extract the displayable text from message content (string or content blocks)"""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        parts = [block.get('text', '') for block in content
+                 if isinstance(block, dict) and block.get('type') == 'text']
+        return "\n".join(part for part in parts if part)
+    return ""
+
+
+class SessionStore:
+    """Append-only conversation store backed by SQLite in WAL mode.
+
+    Messages are appended one row at a time, so saving never re-serializes
+    the whole history, and transcripts are read back in pages keyed by
+    (session_id, seq) so reopening a long session only touches the rows
+    that are actually shown.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = os.path.expanduser(db_path)
+        if self.db_path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def create_session(self, title=''):
+        """Create a new, empty session and return its id"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO sessions (title, created_at, updated_at) VALUES (?, ?, ?)",
+                (title, now, now)
+            )
+            return cursor.lastrowid
+
+    def list_sessions(self, limit=100, offset=0):
+        """List sessions, most recently updated first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, title, created_at, updated_at, message_count FROM sessions "
+                "ORDER BY updated_at DESC LIMIT ? OFFSET ?",
+                (limit, offset)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_session(self, session_id):
+        """Return session metadata, or None if it does not exist"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, title, created_at, updated_at, message_count FROM sessions WHERE id = ?",
+                (session_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def rename_session(self, session_id, title):
+        with self._lock:
+            self._conn.execute("UPDATE sessions SET title = ? WHERE id = ?", (title, session_id))
+
+    def delete_session(self, session_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def append_message(self, session_id, role, content):
+        """Append one message to a session and return its sequence number"""
+        now = time.time()
+        encoded = json.dumps(content)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT message_count, title FROM sessions WHERE id = ?", (session_id,)
+                ).fetchone()
+                if row is None:
+                    raise KeyError(f"Unknown session: {session_id}")
+                seq = row['message_count']
+                title = row['title']
+                if not title and role == 'user':
+                    text = message_text(content).strip()
+                    title = text.splitlines()[0][:TITLE_LENGTH] if text else ''
+                self._conn.execute(
+                    "INSERT INTO messages (session_id, seq, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (session_id, seq, role, encoded, now)
+                )
+                self._conn.execute(
+                    "UPDATE sessions SET message_count = ?, updated_at = ?, title = ? WHERE id = ?",
+                    (seq + 1, now, title, session_id)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return seq
+
+    def message_count(self, session_id):
+        session = self.get_session(session_id)
+        return session['message_count'] if session else 0
+
+    def load_page(self, session_id, before_seq=None, limit=50):
+        """Load up to `limit` messages preceding `before_seq` (or the newest ones), oldest first"""
+        if before_seq is None:
+            before_seq = self.message_count(session_id)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, role, content FROM messages WHERE session_id = ? AND seq < ? "
+                "ORDER BY seq DESC LIMIT ?",
+                (session_id, before_seq, limit)
+            ).fetchall()
+        return [
+            {'seq': row['seq'], 'role': row['role'], 'content': json.loads(row['content'])}
+            for row in reversed(rows)
+        ]
+
+    def load_history(self, session_id):
+        """Load the complete message history of a session in API format"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT role, content FROM messages WHERE session_id = ? ORDER BY seq",
+                (session_id,)
+            ).fetchall()
+        return [{'role': row['role'], 'content': json.loads(row['content'])} for row in rows]
+
+    def create_job(self, prompt, priority=0, status='queued'):
+        """Create a background job and return its id"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (prompt, priority, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (prompt, priority, status, now, now)
+            )
+            return cursor.lastrowid
+
+    def update_job(self, job_id, expected_status=None, **fields):
+        """Update job fields; pending_tool_calls is stored as JSON.
+
+        With `expected_status`, the job is only updated while it has that
+        status. Returns whether a row was updated.
+        """
+        unknown = set(fields) - set(JOB_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown job fields: {', '.join(sorted(unknown))}")
+        if 'pending_tool_calls' in fields:
+            fields['pending_tool_calls'] = json.dumps(fields['pending_tool_calls'])
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        query = f"UPDATE jobs SET {assignments}, updated_at = ? WHERE id = ?"
+        params = [*fields.values(), time.time(), job_id]
+        if expected_status is not None:
+            query += " AND status = ?"
+            params.append(expected_status)
+        with self._lock:
+            return self._conn.execute(query, params).rowcount > 0
+
+    def get_job(self, job_id):
+        """Return a job as a dict, or None if it does not exist"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job_from_row(row) if row else None
+
+    def list_jobs(self, statuses=None, limit=100):
+        """List jobs, highest priority first, optionally only those with the given statuses"""
+        query = "SELECT * FROM jobs"
+        params = []
+        if statuses:
+            query += f" WHERE status IN ({', '.join('?' for _ in statuses)})"
+            params.extend(statuses)
+        query += " ORDER BY priority DESC, id LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(query, (*params, limit)).fetchall()
+        return [self._job_from_row(row) for row in rows]
+
+    @staticmethod
+    def _job_from_row(row):
+        job = dict(row)
+        job['pending_tool_calls'] = json.loads(job['pending_tool_calls'])
+        return job
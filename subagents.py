@@ -0,0 +1,78 @@
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+SUBAGENT_PREAMBLE = (
+    "You are a sub-agent working on one part of a larger task. Work only on the task below, "
+    "use the tools you need, and reply with your findings for this part."
+)
+
+
+class SubAgentResult:
+    """The outcome of one child conversation"""
+    __slots__ = ('task', 'text', 'error', 'seconds')
+
+    def __init__(self, task, text='', error=None, seconds=0.0):
+        self.task = task
+        self.text = text
+        self.error = error
+        self.seconds = seconds
+
+
+class SubAgentRunner:
+    """Fans a turn out over independent child conversations and merges their answers.
+
+    Each child is a ClaudeAPI created by the parent's spawn_child(): it starts
+    with a history holding only its task, shares the parent's config, clients
+    and tool endpoints, and cannot start sub-agents of its own. At most
+    `max_concurrency` children run at a time.
+    """
+
+    def __init__(self, parent, max_concurrency=4):
+        self.parent = parent
+        self.max_concurrency = max(1, max_concurrency)
+
+    def run(self, tasks, instructions=''):
+        """Run one child per task and return their SubAgentResults in task order"""
+        if not tasks:
+            return []
+        parent_span = tracer.current()
+        workers = min(self.max_concurrency, len(tasks))
+        logger.info(f"Running {len(tasks)} sub-agents, {workers} at a time")
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='subagent') as pool:
+            futures = [
+                pool.submit(self._run_one, index, task, instructions, parent_span)
+                for index, task in enumerate(tasks)
+            ]
+            return [future.result() for future in futures]
+
+    def _run_one(self, index, task, instructions, parent_span):
+        started = time.monotonic()
+        child = None
+        with tracer.span('subagent', parent=parent_span, index=index):
+            try:
+                child = self.parent.spawn_child()
+                prompt = f"{SUBAGENT_PREAMBLE}\n\n{instructions}\n\nTask: {task}" if instructions \
+                    else f"{SUBAGENT_PREAMBLE}\n\nTask: {task}"
+                text = child.send_message(prompt)
+                return SubAgentResult(task, text, seconds=time.monotonic() - started)
+            except Exception as e:
+                logger.error(f"Sub-agent {index} failed: {e}")
+                return SubAgentResult(task, error=str(e), seconds=time.monotonic() - started)
+            finally:
+                if child is not None:
+                    child.release_child()
+
+    @staticmethod
+    def reduce(results):
+        """Merge child results into one report for the parent conversation"""
+        finished = sum(1 for result in results if result.error is None)
+        parts = [f"{finished} of {len(results)} sub-agents finished."]
+        for number, result in enumerate(results, 1):
+            status = f"failed: {result.error}" if result.error else f"finished in {result.seconds:.1f}s"
+            parts.append(f"## Sub-agent {number}: {result.task}\n[{status}]\n{result.text}".rstrip())
+        return "\n\n".join(parts)
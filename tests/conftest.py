@@ -0,0 +1,47 @@
+import os
+import sys
+import json
+from types import SimpleNamespace
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.join(REPO_ROOT, 'benchmarks'))
+
+from fakes import FakeAnthropicServer, FakeFilesystemServer, FakeCmdToolServer  # noqa: E402
+
+
+@pytest.fixture
+def fakes(tmp_path, monkeypatch):
+    """Local fake API and tool servers, with a config that keeps all state in tmp_path"""
+    servers = SimpleNamespace(
+        anthropic=FakeAnthropicServer().start(),
+        filesystem=FakeFilesystemServer(payload_size=64).start(),
+        cmdtool=FakeCmdToolServer(payload_size=64).start(),
+    )
+    monkeypatch.setenv('ANTHROPIC_API_KEY', 'sk-test-offline')
+    monkeypatch.setenv('ANTHROPIC_BASE_URL', servers.anthropic.base_url)
+    monkeypatch.chdir(tmp_path)
+    with open(tmp_path / 'config.json', 'w') as f:
+        json.dump({
+            'sessions_db': str(tmp_path / 'sessions.db'),
+            'blob_dir': str(tmp_path / 'blobs'),
+            'cmdtool_endpoints': [servers.cmdtool.base_url],
+        }, f)
+    yield servers
+    for server in (servers.anthropic, servers.filesystem, servers.cmdtool):
+        server.stop()
+
+
+@pytest.fixture
+def api(fakes):
+    """A ClaudeAPI wired to the fake servers"""
+    from claude_api import ClaudeAPI
+
+    api = ClaudeAPI()
+    api.filesystem_url = f"{fakes.filesystem.base_url}/mcp"
+    api.set_cmdtool_endpoints([fakes.cmdtool.base_url])
+    api.retry_delay = 0
+    return api
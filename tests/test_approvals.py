@@ -0,0 +1,89 @@
+import threading
+from types import SimpleNamespace
+
+from approval_queue import APPROVE, DENY
+
+
+def record_calls(fakes, needs_approval):
+    """Log tool server calls in order; commands in `needs_approval` must be approved once"""
+    calls = []
+    approved = set()
+    read = fakes.filesystem.handle
+
+    def cmdtool(path, payload, headers):
+        if path == '/approve':
+            approved.add(payload['command'])
+            calls.append(('approve', payload['command']))
+            return 200, {'status': 'approved'}
+        command = payload['command']
+        if command in needs_approval and command not in approved:
+            calls.append(('parked', command))
+            return 200, {'status': 'approval_required'}
+        calls.append(('execute', command))
+        return 200, {'status': 'completed', 'output': f"{command} done\n", 'exit_code': 0}
+
+    def filesystem(path, payload, headers):
+        calls.append(('filesystem', payload.get('params', {}).get('name')))
+        return read(path, payload, headers)
+
+    fakes.cmdtool.handle = cmdtool
+    fakes.filesystem.handle = filesystem
+    return calls
+
+
+def answer_with(api, decision):
+    """Decide every queued command shortly after it is queued, as the GUI would"""
+    def listener():
+        pending = api.approvals.pending()[-1]
+        threading.Timer(0.05, api.approvals.decide, ([pending.id], decision)).start()
+
+    api.approvals.add_listener(listener)
+
+
+def tool_uses():
+    return [
+        SimpleNamespace(name='execute_command', input={'command': 'rm -r build'}, id='t1'),
+        SimpleNamespace(name='read_file', input={'path': 'a.txt'}, id='t2'),
+        SimpleNamespace(name='execute_command', input={'command': 'ls'}, id='t3'),
+    ]
+
+
+def test_parked_command_lets_other_tools_run_and_keeps_command_order(api, fakes):
+    calls = record_calls(fakes, {'rm -r build'})
+    answer_with(api, APPROVE)
+
+    results = api._run_tool_calls(tool_uses())
+
+    assert [result['tool_use_id'] for result in results] == ['t1', 't2', 't3']
+    assert all(not result.get('is_error') for result in results)
+    assert calls == [
+        ('parked', 'rm -r build'),
+        ('filesystem', 'read_file'),  # Runs while the command waits for a decision
+        ('approve', 'rm -r build'),
+        ('execute', 'rm -r build'),
+        ('execute', 'ls'),  # Queued behind the parked command
+    ]
+
+
+def test_denied_command_is_answered_and_later_commands_still_run(api, fakes):
+    calls = record_calls(fakes, {'rm -r build'})
+    answer_with(api, DENY)
+
+    results = api._run_tool_calls(tool_uses())
+
+    assert results[0]['is_error'] is True
+    assert results[0]['content'].startswith('Command was not approved')
+    assert ('execute', 'rm -r build') not in calls
+    assert calls[-1] == ('execute', 'ls')
+
+
+def test_unanswered_command_is_denied_after_the_timeout(api, fakes):
+    record_calls(fakes, {'rm -r build'})
+    api.approvals.timeout = 0.1
+    api.approvals.add_listener(lambda: None)
+
+    result = api._run_tool_calls(tool_uses()[:1])[0]
+
+    assert result['is_error'] is True
+    assert 'no decision within 0.1 seconds' in result['content']
+    assert api.approvals.pending() == []
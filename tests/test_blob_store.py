@@ -0,0 +1,36 @@
+import os
+import time
+
+from blob_store import BlobStore
+
+
+def test_prune_removes_old_then_least_recently_used(tmp_path):
+    store = BlobStore(str(tmp_path))
+    old = store.put("old" * 100)
+    stale = store.put("stale" * 100)
+    fresh = store.put("fresh" * 100)
+    now = time.time()
+    os.utime(store._path(store._blob_id(old)), (now - 40 * 86400, now - 40 * 86400))
+    os.utime(store._path(store._blob_id(stale)), (now - 60, now - 60))
+
+    removed, _ = store.prune(max_bytes=600, max_age_days=30)
+
+    assert removed == 2
+    assert store.get(old) is None
+    assert store.get(stale) is None
+    assert store.get(fresh) == "fresh" * 100
+
+
+def test_reading_a_blob_marks_it_recently_used(tmp_path):
+    store = BlobStore(str(tmp_path))
+    first = store.put("a" * 400)
+    second = store.put("b" * 400)
+    past = time.time() - 3600
+    for handle in (first, second):
+        os.utime(store._path(store._blob_id(handle)), (past, past))
+    store.get(first)
+
+    store.prune(max_bytes=500)
+
+    assert store.get(first) == "a" * 400
+    assert store.get(second) is None
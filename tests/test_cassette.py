@@ -0,0 +1,45 @@
+import pytest
+
+from cassette import Cassette, CassetteMiss, RECORD, REPLAY
+from fakes import FakeAnthropicServer
+
+
+def script(fakes):
+    fakes.anthropic.script([
+        FakeAnthropicServer.tool_use('read_file', {'path': 'a.txt'}),
+        FakeAnthropicServer.tool_use('execute_command', {'command': 'make test'}),
+        FakeAnthropicServer.text("Tests pass."),
+    ])
+
+
+def server_requests(fakes):
+    return sum(server.request_count for server in (fakes.anthropic, fakes.filesystem, fakes.cmdtool))
+
+
+def test_a_recorded_turn_replays_offline(api, fakes, tmp_path):
+    path = str(tmp_path / 'cassette.jsonl')
+    script(fakes)
+    api.set_cassette(Cassette(path, mode=RECORD))
+    recorded = api.send_message("Read a.txt and run the tests")
+    recorded_history = api.conversation_history.to_compact()
+
+    api.clear_conversation()
+    api.set_cassette(Cassette(path, mode=REPLAY, strict=True))
+    before = server_requests(fakes)
+    replayed = api.send_message("Read a.txt and run the tests")
+
+    assert replayed == recorded
+    assert server_requests(fakes) == before
+    assert api.conversation_history.to_compact() == recorded_history
+
+
+def test_strict_replay_rejects_a_changed_request(api, fakes, tmp_path):
+    path = str(tmp_path / 'cassette.jsonl')
+    script(fakes)
+    api.set_cassette(Cassette(path, mode=RECORD))
+    api.send_message("Read a.txt and run the tests")
+
+    api.clear_conversation()
+    api.set_cassette(Cassette(path, mode=REPLAY, strict=True))
+    with pytest.raises(CassetteMiss):
+        api.send_message("Read b.txt instead")
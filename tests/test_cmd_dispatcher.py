@@ -0,0 +1,76 @@
+import socket
+import threading
+
+import pytest
+import requests
+
+from cmd_dispatcher import CmdToolDispatcher
+from fakes import FakeCmdToolServer
+
+
+def closed_port_url():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+@pytest.fixture
+def aborting_server():
+    """Accepts a request, reads it and closes the connection without answering"""
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen()
+    received = []
+
+    def serve():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            with conn:
+                received.append(conn.recv(65536))
+
+    threading.Thread(target=serve, daemon=True).start()
+    yield f"http://127.0.0.1:{server.getsockname()[1]}", received
+    server.close()
+
+
+def test_refused_connection_fails_over():
+    with FakeCmdToolServer() as worker:
+        dispatcher = CmdToolDispatcher([closed_port_url(), worker.base_url], health_interval=0)
+        response = dispatcher.post('/execute', 'conv-1', {'command': 'dir'}, timeout=5)
+        assert response.json()['status'] == 'completed'
+        assert worker.request_count == 1
+        assert dispatcher.endpoints[0].healthy is False
+
+
+def test_connection_aborted_after_sending_is_not_failed_over(aborting_server):
+    url, received = aborting_server
+    with FakeCmdToolServer() as worker:
+        dispatcher = CmdToolDispatcher([url, worker.base_url], health_interval=0)
+        with pytest.raises(requests.ConnectionError):
+            dispatcher.post('/execute', 'conv-1', {'command': 'dir'}, timeout=5)
+        assert received  # The first worker got the command
+        assert worker.request_count == 0
+
+
+def test_token_is_sent_to_workers():
+    with FakeCmdToolServer() as worker:
+        seen = []
+        handle = worker.handle
+        worker.handle = lambda path, payload, headers: seen.append(headers.get('Authorization')) or handle(path, payload, headers)
+        CmdToolDispatcher([worker.base_url], token='s3cret').post('/execute', 'c', {'command': 'dir'}, timeout=5)
+        assert seen == ['Bearer s3cret']
+
+
+def test_failover_of_a_session_is_reported_once():
+    with FakeCmdToolServer() as first, FakeCmdToolServer() as second:
+        dispatcher = CmdToolDispatcher([first.base_url, second.base_url], health_interval=0)
+        assert dispatcher.post('/execute', 'conv-1', {'command': 'dir'}, timeout=5).moved is False
+        dispatcher.affinity['conv-1'].healthy = False  # As after a failed health check
+
+        # An approval does not use up the report; the command that follows gets it
+        assert dispatcher.post('/approve', 'conv-1', {'command': 'dir'}, timeout=5, report_move=False).moved is True
+        assert dispatcher.post('/execute', 'conv-1', {'command': 'dir'}, timeout=5).moved is True
+        assert dispatcher.post('/execute', 'conv-1', {'command': 'dir'}, timeout=5).moved is False
@@ -0,0 +1,49 @@
+import os
+
+from blob_store import BlobStore
+from command_outputs import CommandOutputHistory
+
+
+def lines(count, changed=()):
+    return "".join(f"line {i}{' changed' if i in changed else ''}\n" for i in range(count))
+
+
+def blob_count(root):
+    return sum(len(files) for _, _, files in os.walk(root))
+
+
+def test_first_run_and_short_outputs_pass_through(tmp_path):
+    history = CommandOutputHistory(BlobStore(str(tmp_path)))
+    assert history.report("echo hi", "/a", "hi\n") == "hi\n"
+    assert history.report("echo hi", "/a", "hi\n") == "hi\n"
+    assert blob_count(tmp_path) == 0  # Short outputs are never diffed and stay in memory
+
+    output = lines(100)
+    assert history.report("pytest", "/a", output) == output
+
+
+def test_rerun_is_reported_as_identical_or_as_a_diff(tmp_path):
+    history = CommandOutputHistory(BlobStore(str(tmp_path)))
+    history.report("pytest", "/a", lines(100), 1)
+
+    identical = history.report("pytest", "/a", lines(100), 1)
+    assert identical.startswith("[Output identical to the previous run of this command (101 lines, exit code 1)")
+
+    diff = history.report("pytest", "/a", lines(100, changed={50}), 0)
+    assert diff.startswith("[Re-run of a previous command: 1 lines added and 1 removed of 101 "
+                           "(exit code 1 before, 0 now)")
+    assert "-line 50\n+line 50 changed" in diff
+
+
+def test_large_diffs_fall_back_to_the_full_output(tmp_path):
+    history = CommandOutputHistory(BlobStore(str(tmp_path)))
+    history.report("pytest", "/a", lines(100))
+    rewritten = lines(100, changed=set(range(100)))
+    assert history.report("pytest", "/a", rewritten) == rewritten
+
+
+def test_outputs_are_keyed_by_directory(tmp_path):
+    history = CommandOutputHistory(BlobStore(str(tmp_path)))
+    history.report("git status", "/repo/one", lines(100))
+    other = lines(100, changed={1})
+    assert history.report("git status", "/repo/two", other) == other
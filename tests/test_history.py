@@ -0,0 +1,52 @@
+import base64
+import os
+
+from blob_store import BlobStore
+from history import ConversationHistory
+
+PNG = base64.b64encode(b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 64).decode('ascii')
+
+
+def image_block():
+    return {'type': 'image', 'source': {'type': 'base64', 'media_type': 'image/png', 'data': PNG}}
+
+
+def blob_files(root):
+    return [name for _, _, files in os.walk(root) for name in files]
+
+
+def test_an_image_is_stored_once_across_iterations(tmp_path):
+    store = BlobStore(str(tmp_path / 'blobs'))
+    history = ConversationHistory(store)
+
+    for turn in range(3):
+        history.append('user', [image_block(), {'type': 'text', 'text': f"What changed in turn {turn}?"}])
+        history.append('assistant', "Nothing much.")
+
+    assert len(blob_files(tmp_path / 'blobs')) == 1
+    images = [message.content[0] for message in history if message.role == 'user']
+    assert all(image is images[0] for image in images)  # One shared compact block
+    assert images[0]['source']['type'] == 'blob'
+    assert PNG not in str(history.to_compact())
+
+
+def test_to_request_restores_the_payload(tmp_path):
+    history = ConversationHistory(BlobStore(str(tmp_path / 'blobs')))
+    history.append('user', [image_block(), {'type': 'text', 'text': "Describe it"}])
+
+    request = history.to_request()
+
+    assert request == [{'role': 'user', 'content': [image_block(), {'type': 'text', 'text': "Describe it"}]}]
+
+
+def test_a_missing_blob_becomes_a_placeholder(tmp_path):
+    store = BlobStore(str(tmp_path / 'blobs'))
+    history = ConversationHistory(store)
+    history.append('user', [image_block(), {'type': 'text', 'text': "Describe it"}])
+    for name in blob_files(tmp_path / 'blobs'):
+        os.remove(store._path(name))
+
+    content = history.to_request()[0]['content']
+
+    assert content[0] == {'type': 'text', 'text': "[image no longer available]"}
+    assert content[1] == {'type': 'text', 'text': "Describe it"}
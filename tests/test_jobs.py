@@ -0,0 +1,66 @@
+from jobs import JobRunner, CANCELLED, CANCELLING, FAILED, QUEUED, RUNNING
+from session_store import SessionStore
+
+
+def test_a_failing_api_factory_fails_the_job(tmp_path):
+    store = SessionStore(str(tmp_path / 'sessions.db'))
+
+    def api_factory():
+        raise ValueError("No API key found")
+
+    runner = JobRunner(store, api_factory)
+    job_id = store.create_job("summarize the repo", 0, QUEUED)
+
+    runner._run(store.get_job(job_id))
+
+    job = store.get_job(job_id)
+    assert job['status'] == FAILED
+    assert job['error'] == "No API key found"
+    store.close()
+
+
+class CheckpointingAPI:
+    """Stands in for ClaudeAPI: each iteration calls the checkpoint, and `on_iteration` runs in between"""
+    session_id = None
+
+    def __init__(self, on_iteration):
+        self.on_iteration = on_iteration
+
+    def set_session_store(self, store):
+        pass
+
+    def send_message(self, prompt, checkpoint=None):
+        for iteration in range(1, 4):
+            checkpoint(iteration, 0, [])
+            self.on_iteration(iteration)
+        return "finished"
+
+    def release_child(self):
+        pass
+
+
+def test_cancelling_a_running_job_stops_it_at_the_next_checkpoint(tmp_path):
+    store = SessionStore(str(tmp_path / 'sessions.db'))
+    job_id = store.create_job("long task", 0, QUEUED)
+    runner = JobRunner(store, lambda: CheckpointingAPI(lambda iteration: runner.cancel(job_id)))
+
+    runner._run(store.get_job(job_id))
+
+    assert store.get_job(job_id)['status'] == CANCELLED
+    store.close()
+
+
+def test_a_cancel_request_survives_a_restart(tmp_path):
+    store = SessionStore(str(tmp_path / 'sessions.db'))
+    job_id = store.create_job("long task", 0, QUEUED)
+    store.update_job(job_id, status=RUNNING)
+    assert JobRunner(store, None).cancel(job_id)
+    assert store.get_job(job_id)['status'] == CANCELLING
+
+    # The app closes before the job reaches a checkpoint; the next start must not resume it
+    runner = JobRunner(store, None, workers=1)
+    runner.start()
+    runner.stop()
+    assert store.get_job(job_id)['status'] == CANCELLED
+    assert runner._queue.empty()
+    store.close()
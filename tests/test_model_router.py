@@ -0,0 +1,51 @@
+import anthropic
+import pytest
+
+from fakes import FakeAnthropicServer
+from model_router import ESCALATION, FIRST_TURN, OVERRIDE, TOOL_CONTINUATION
+
+HAIKU = 'claude-3-haiku-20240307'
+
+
+def script_tool_turn(fakes):
+    fakes.anthropic.script([
+        FakeAnthropicServer.tool_use('read_file', {'path': 'a.txt'}),
+        FakeAnthropicServer.text("Read it."),
+    ])
+
+
+def test_failed_routed_call_is_retried_on_the_escalation_model(api, fakes):
+    fakes.anthropic.fail_models = {HAIKU}
+    script_tool_turn(fakes)
+
+    assert api.send_message("Read a.txt").endswith("Read it.")
+
+    model = api.config.get_model()
+    stats = api.get_route_stats()
+    assert stats[FIRST_TURN]['models'] == {model: 1}
+    assert stats[TOOL_CONTINUATION]['failures'] == 1
+    assert stats[TOOL_CONTINUATION]['models'] == {HAIKU: 1}
+    assert stats[ESCALATION]['calls'] == 1
+    assert stats[ESCALATION]['failures'] == 0
+    assert stats[ESCALATION]['models'] == {model: 1}
+
+
+def test_failure_is_raised_when_escalation_is_off(api, fakes):
+    api.config.config['routing'] = {'escalate_on_failure': False}
+    fakes.anthropic.fail_models = {HAIKU}
+    script_tool_turn(fakes)
+
+    with pytest.raises(anthropic.NotFoundError):
+        api.send_message("Read a.txt")
+    assert ESCALATION not in api.get_route_stats()
+    assert api.get_route_stats()[TOOL_CONTINUATION]['failures'] == 1
+
+
+def test_override_bypasses_routing(api, fakes):
+    api.set_model_override(HAIKU)
+    script_tool_turn(fakes)
+
+    api.send_message("Read a.txt")
+
+    assert list(api.get_route_stats()) == [OVERRIDE]
+    assert api.get_route_stats()[OVERRIDE]['models'] == {HAIKU: 2}
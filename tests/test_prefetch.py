@@ -0,0 +1,45 @@
+import os
+
+
+def allowlist(fakes, directories):
+    handle = fakes.filesystem.handle
+
+    def respond(path, payload, headers):
+        if payload.get('params', {}).get('name') == 'list_allowed_directories':
+            text = "Allowed directories:\n" + "\n".join(directories)
+            return 200, {'content': [{'type': 'text', 'text': text}]}
+        return handle(path, payload, headers)
+
+    fakes.filesystem.handle = respond
+
+
+def test_prefetch_is_off_by_default(api, tmp_path):
+    (tmp_path / 'notes.txt').write_text("hello")
+    assert api._prefetch_files("see notes.txt") == []
+
+
+def test_prefetch_uses_the_servers_allowlist_and_offloads_large_files(api, fakes, tmp_path):
+    allowed = tmp_path / 'project'
+    allowed.mkdir()
+    (allowed / 'small.py').write_text("print('hi')\n")
+    (allowed / 'big.py').write_text("x = 1\n" * 3000)
+    (tmp_path / 'secret.txt').write_text("not shared")
+    allowlist(fakes, [str(allowed)])
+    api.config.config['prefetch'] = {'enabled': True}
+
+    blocks = api._prefetch_files(f"Compare small.py, big.py and {tmp_path / 'secret.txt'}")
+
+    by_title = {os.path.basename(block['title']): block['source']['data'] for block in blocks}
+    assert set(by_title) == {'small.py', 'big.py'}
+    assert by_title['small.py'] == "print('hi')\n"
+    big = by_title['big.py']
+    assert len(big) < api.config.get_blob_threshold()
+    handle = big.split('stored as ')[1].split(';')[0]
+    assert api.blob_store.get(handle) == "x = 1\n" * 3000
+
+
+def test_prefetch_is_skipped_when_the_allowlist_is_unavailable(api, fakes, tmp_path):
+    (tmp_path / 'notes.txt').write_text("hello")
+    fakes.filesystem.handle = lambda path, payload, headers: (200, {'content': 'boom', 'is_error': True})
+    api.config.config['prefetch'] = {'enabled': True}
+    assert api._prefetch_files("see notes.txt") == []
@@ -0,0 +1,57 @@
+import pytest
+
+from session_store import SessionStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SessionStore(str(tmp_path / 'sessions.db'))
+    yield store
+    store.close()
+
+
+def fill(store, count):
+    session_id = store.create_session()
+    for index in range(count):
+        role = 'user' if index % 2 == 0 else 'assistant'
+        store.append_message(session_id, role, f"message {index}")
+    return session_id
+
+
+def test_pages_walk_back_from_the_newest_message(store):
+    session_id = fill(store, 120)
+
+    newest = store.load_page(session_id, limit=50)
+    assert [message['seq'] for message in newest] == list(range(70, 120))
+    assert newest[-1]['content'] == "message 119"
+
+    older = store.load_page(session_id, before_seq=newest[0]['seq'], limit=50)
+    assert [message['seq'] for message in older] == list(range(20, 70))
+
+    oldest = store.load_page(session_id, before_seq=older[0]['seq'], limit=50)
+    assert [message['seq'] for message in oldest] == list(range(20))
+    assert store.load_page(session_id, before_seq=0) == []
+
+
+def test_history_and_metadata_survive_reopening(tmp_path):
+    path = str(tmp_path / 'sessions.db')
+    store = SessionStore(path)
+    session_id = store.create_session()
+    store.append_message(session_id, 'user', [{'type': 'text', 'text': "Fix the build\nIt fails on CI"}])
+    store.append_message(session_id, 'assistant', "Looking at it.")
+    store.close()
+
+    store = SessionStore(path)
+    session = store.get_session(session_id)
+    assert session['title'] == "Fix the build"
+    assert session['message_count'] == 2
+    assert store.load_history(session_id) == [
+        {'role': 'user', 'content': [{'type': 'text', 'text': "Fix the build\nIt fails on CI"}]},
+        {'role': 'assistant', 'content': "Looking at it."},
+    ]
+    store.close()
+
+
+def test_appending_to_an_unknown_session_fails(store):
+    with pytest.raises(KeyError):
+        store.append_message(12345, 'user', "hello")
@@ -0,0 +1,90 @@
+import os
+import importlib.util
+
+import pytest
+
+from conftest import REPO_ROOT
+
+spec = importlib.util.spec_from_file_location('cmd_tool', os.path.join(REPO_ROOT, 'Tools', 'cmd-tool', 'cmd-tool.py'))
+cmd_tool = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(cmd_tool)
+
+pytestmark = pytest.mark.skipif(not os.path.exists('/bin/bash'), reason="persistent shells need bash")
+
+
+@pytest.fixture
+def shell():
+    session = cmd_tool.ShellSession('/bin/bash')
+    yield session
+    session.close()
+
+
+def test_state_carries_over_between_commands(shell, tmp_path):
+    assert shell.run(f"cd {tmp_path} && export GREETING=hi", timeout=5)[1:3] == (0, cmd_tool.COMPLETED)
+    output, exit_code, outcome, _ = shell.run('echo "$GREETING $PWD"', timeout=5)
+    assert (output, exit_code, outcome) == (f"hi {tmp_path}\n", 0, cmd_tool.COMPLETED)
+
+
+@pytest.mark.parametrize('command', ['echo ok )', 'echo "unbalanced', "echo 'unbalanced"])
+def test_syntax_errors_fail_the_command_not_the_shell(shell, command):
+    shell.run('export KEPT=yes', timeout=5)
+    output, exit_code, outcome, _ = shell.run(command, timeout=5)
+    assert outcome == cmd_tool.COMPLETED
+    assert exit_code == 2
+    assert 'syntax error' in output or 'unexpected EOF' in output
+    assert shell.run("echo $KEPT", timeout=5)[0] == "yes\n"
+
+
+def test_exit_is_reported_as_shell_exit(shell):
+    output, exit_code, outcome, _ = shell.run('echo bye; exit 3', timeout=5)
+    assert (output, exit_code, outcome) == ("bye\n", 3, cmd_tool.SHELL_EXITED)
+
+
+def test_timeout_returns_partial_output(shell):
+    output, exit_code, outcome, _ = shell.run('echo started; sleep 5', timeout=0.5)
+    assert (output, exit_code, outcome) == ("started\n", None, cmd_tool.TIMED_OUT)
+
+
+def test_output_containing_framing_text_is_kept(shell):
+    output, exit_code, _, _ = shell.run("printf '__CMDTOOL_DONE_x__ 1\\n'; echo after", timeout=5)
+    assert output == "__CMDTOOL_DONE_x__ 1\nafter\n"
+    assert exit_code == 0
+
+
+def test_token_is_required_when_configured(monkeypatch):
+    monkeypatch.setattr(cmd_tool, 'AUTH_TOKEN', 's3cret')
+    client = cmd_tool.app.test_client()
+    assert client.post('/approve', json={'command': 'ls'}).status_code == 401
+    assert client.post('/approve', json={'command': 'ls'},
+                       headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert client.post('/approve', json={'command': 'ls'},
+                       headers={'Authorization': 'Bearer s3cret'}).status_code == 200
+    assert client.get('/health').status_code == 200
+
+
+def test_reports_the_shells_working_directory(shell, tmp_path):
+    spaced = tmp_path / 'with space'
+    spaced.mkdir()
+    assert shell.run(f"cd '{spaced}'", timeout=5)[3] == str(spaced)
+    assert shell.run("true", timeout=5)[3] == str(spaced)
+    assert shell.run("exit 1", timeout=5)[3] is None
+
+
+def test_a_reaped_or_dead_shell_is_reported_as_replaced():
+    manager = cmd_tool.ShellSessionManager('/bin/bash', warm_size=0)
+    try:
+        assert manager.run('s1', 'export KEPT=yes', timeout=5)[4] is False
+        assert manager.run('s1', 'echo $KEPT', timeout=5)[0::4] == ("yes\n", False)
+
+        manager.idle_timeout = 0
+        manager.reap()
+        manager.idle_timeout = 900
+        assert manager.run('s1', 'echo "[$KEPT]"', timeout=5)[0::4] == ("[]\n", True)
+        assert manager.run('s1', 'true', timeout=5)[4] is False  # Reported once
+
+        manager.sessions['s1'].process.kill()
+        manager.sessions['s1'].process.wait()
+        assert manager.run('s1', 'true', timeout=5)[4] is True
+    finally:
+        for session_id in list(manager.sessions):
+            manager.close(session_id)
@@ -0,0 +1,111 @@
+from fakes import FakeAnthropicServer
+
+
+def test_failing_tool_is_answered_with_an_error_result(api, fakes, monkeypatch):
+    def broken(operation, tool_input, tool_id):
+        raise RuntimeError("filesystem handler crashed")
+
+    monkeypatch.setattr(api, '_handle_filesystem_operation', broken)
+    fakes.anthropic.script([
+        FakeAnthropicServer.tool_use('read_file', {'path': 'a.txt'}),
+        FakeAnthropicServer.text("Could not read it."),
+    ])
+
+    assert api.send_message("Read a.txt") == "Working on the next step.\nCould not read it."
+
+    roles = [message.role for message in api.conversation_history]
+    assert roles == ['user', 'assistant', 'user', 'assistant']
+    tool_use = api.conversation_history[1].content[1]
+    result = api.conversation_history[2].content[0]
+    assert result['tool_use_id'] == tool_use['id']
+    assert result['is_error'] is True
+    assert "filesystem handler crashed" in result['content']
+
+    # The history stays valid for the next turn
+    api.send_message("Thanks")
+    assert [message.role for message in api.conversation_history][-2:] == ['user', 'assistant']
+
+
+def test_fetch_result_rejects_invalid_offsets(api):
+    handle = api.blob_store.put("x" * 100)
+
+    result = api._fetch_result({'handle': handle, 'offset': 'next'}, 'toolu_1')
+    assert result['is_error'] is True
+    assert 'offset' in result['content']
+
+    result = api._fetch_result({'handle': handle, 'offset': '10', 'length': 5}, 'toolu_2')
+    assert result.get('is_error') is not True
+    assert result['content'].endswith('xxxxx')
+
+
+def test_command_timeout_and_shell_exit_are_reported(api, fakes, monkeypatch):
+    from types import SimpleNamespace
+
+    responses = [
+        (504, {'status': 'timed_out', 'error': 'Command timed out after 1.0 seconds',
+               'partial_output': 'started\n', 'shell_reset': True}),
+        (200, {'status': 'shell_exited', 'output': 'bye\n', 'exit_code': 3, 'shell_reset': True}),
+    ]
+    monkeypatch.setattr(fakes.cmdtool, 'handle', lambda path, payload, headers: responses.pop(0))
+
+    timed_out = api.handle_tool_use(SimpleNamespace(name='execute_command', input={'command': 'sleep 9'}, id='t1'))
+    assert timed_out['is_error'] is True
+    assert timed_out['content'].startswith('started\n[Command timed out after 1.0 seconds.')
+    assert 'fresh shell' in timed_out['content']
+
+    exited = api.handle_tool_use(SimpleNamespace(name='execute_command', input={'command': 'exit 3'}, id='t2'))
+    assert 'The shell exited (exit code 3)' in exited['content']
+    assert not responses  # Neither command was retried
+
+
+def test_tool_use_cut_off_by_max_tokens_is_answered(api, fakes, tmp_path):
+    from session_store import SessionStore
+
+    store = SessionStore(str(tmp_path / 'sessions.db'))
+    api.set_session_store(store)
+    truncated = FakeAnthropicServer.tool_use('write_file', {'path': 'a.txt'}, text="Writing it now.")
+    truncated['stop_reason'] = 'max_tokens'
+    fakes.anthropic.script([truncated, FakeAnthropicServer.text("Sorry, let me try again.")])
+
+    assert api.send_message("Write a.txt") == "Writing it now."
+
+    tool_use = api.conversation_history[1].content[1]
+    result = api.conversation_history[2].content[0]
+    assert result['tool_use_id'] == tool_use['id']
+    assert result['is_error'] is True
+    assert 'max_tokens' in result['content']
+
+    # The next message joins the answered turn, here and in the stored session
+    assert api.send_message("Go on") == "Sorry, let me try again."
+    stored = store.load_history(api.session_id)
+    assert [message['role'] for message in stored] == ['user', 'assistant', 'user', 'user', 'assistant']
+    assert stored[2]['content'][0]['tool_use_id'] == tool_use['id']
+
+    # Reopening the session rebuilds the merged turn
+    api.open_session(api.session_id)
+    api._ensure_history_loaded()
+    assert [message.role for message in api.conversation_history] == ['user', 'assistant', 'user', 'assistant']
+    assert api.conversation_history[2].content[0]['tool_use_id'] == tool_use['id']
+    store.close()
+
+
+def test_command_in_a_replaced_shell_is_reported(api, fakes, monkeypatch):
+    from types import SimpleNamespace
+
+    monkeypatch.setattr(fakes.cmdtool, 'handle', lambda path, payload, headers: (200, {
+        'status': 'completed', 'output': 'ok\n', 'exit_code': 0, 'shell_reset': True, 'shell_replaced': True
+    }))
+
+    result = api.handle_tool_use(SimpleNamespace(name='execute_command', input={'command': 'make'}, id='t1'))
+    assert result['content'].startswith('ok\n')
+    assert 'ran in a new shell' in result['content']
+
+
+def test_command_on_another_worker_is_reported(api, monkeypatch):
+    from types import SimpleNamespace
+
+    response = SimpleNamespace(moved=True, json=lambda: {'status': 'completed', 'output': 'ok\n', 'exit_code': 0})
+    monkeypatch.setattr(api.cmd_dispatcher, 'post', lambda *args, **kwargs: response)
+
+    result = api.handle_tool_use(SimpleNamespace(name='execute_command', input={'command': 'make'}, id='t1'))
+    assert 'on another command worker' in result['content']
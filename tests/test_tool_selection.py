@@ -0,0 +1,43 @@
+from history import Message
+from tool_selection import compact_tool
+
+
+def names(tools):
+    return {tool['name'] for tool in tools}
+
+
+def test_a_command_request_gets_execute_command(api):
+    tools = api.tool_selector.select(api.define_tools(), [Message('user', "run the tests")])
+    assert 'execute_command' in names(tools)
+
+
+def test_a_conversational_message_gets_no_tools(api):
+    assert api.tool_selector.select(api.define_tools(), [Message('user', "thanks, that helps")]) == []
+
+
+def test_a_continuation_offers_every_tool(api):
+    catalog = api.define_tools()
+    history = [
+        Message('user', "read config.py"),
+        Message('assistant', ({'type': 'tool_use', 'id': 't1', 'name': 'read_file',
+                               'input': {'path': 'config.py'}},)),
+        Message('user', ({'type': 'tool_result', 'tool_use_id': 't1', 'content': "x = 1"},)),
+    ]
+
+    tools = api.tool_selector.select(catalog, history, continuation=True)
+
+    assert names(tools) == names(catalog)
+    by_name = {tool['name']: tool for tool in tools}
+    full = {tool['name']: tool for tool in catalog}
+    assert by_name['read_file'] == full['read_file']
+    assert by_name['execute_command'] == compact_tool(full['execute_command'])
+
+
+def test_an_offloaded_prefetched_file_offers_fetch_result(api):
+    api.config.config['blob_threshold_chars'] = 100
+    data = api._offload_large_content("x = 1\n" * 100)
+    document = {'type': 'document', 'title': 'big.py',
+                'source': {'type': 'text', 'media_type': 'text/plain', 'data': data}}
+    history = [Message('user', (document, {'type': 'text', 'text': "What does big.py do?"}))]
+
+    assert 'fetch_result' in names(api.tool_selector.select(api.define_tools(), history))
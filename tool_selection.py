@@ -0,0 +1,178 @@
+import re
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Selection modes
+AUTO = 'auto'
+ALL = 'all'
+
+# Tools served by the filesystem MCP server
+FILESYSTEM_TOOLS = (
+    'read_file', 'read_multiple_files', 'write_file', 'edit_file', 'create_directory',
+    'list_directory', 'move_file', 'search_files', 'get_file_info', 'list_allowed_directories'
+)
+
+# Tools offered together, and the words in a message that call for them
+TOOL_GROUPS = {
+    'read': ('read_file', 'read_multiple_files', 'list_directory', 'search_files',
+             'get_file_info', 'list_allowed_directories'),
+    'write': ('write_file', 'edit_file', 'create_directory', 'move_file'),
+    'command': ('execute_command',),
+    'results': ('fetch_result',),
+    'subagents': ('run_subagents',),
+}
+GROUP_TRIGGERS = {
+    'read': r"\b(?:files?|read|open|look|show|list|find|search|director(?:y|ies)|folders?|paths?|code|"
+            r"project|repo(?:sitory)?|source|contents?|module|script|config)\b|[\w\-]+\.[A-Za-z]\w{0,7}\b|/",
+    'write': r"\b(?:write|create|edit|modify|change|fix|rename|move|save|update|refactor|add|remove|delete|"
+             r"replace|implement|mkdir)\b",
+    'command': r"\b(?:run|execute|command|shell|terminal|install|test|tests|build|compile|git|pip|npm|make|"
+               r"process(?:es)?|ls|cat|grep)\b",
+    'results': r"\bblob:[0-9a-f]+|\bfetch_result\b",
+    'subagents': r"\b(?:each|every|all (?:the )?(?:files|modules)|in parallel|parallel|sub-?agents?)\b",
+}
+# Groups that are useless without another group
+GROUP_IMPLIES = {'write': ('read',), 'subagents': ('read',)}
+
+
+def estimate_tokens(value):
+    """Rough token count (about four bytes per token), matching the router's estimate"""
+    return len(json.dumps(value, default=str)) // 4
+
+
+def compact_tool(tool):
+    """Return a tool schema with its description cut to the first sentence"""
+    description = tool.get('description', '')
+    first = re.split(r"(?<=\.)\s", description, maxsplit=1)[0]
+    return dict(tool, description=first) if first != description else tool
+
+
+class ToolSelector:
+    """Chooses the tool schemas sent with each model call.
+
+    In auto mode a call gets the tool groups its turn needs: groups whose
+    trigger words appear in the user's latest message, groups of tools used
+    in the recent history, and every tool already called in the current
+    turn, so a tool_use continuation always has the tools it was using. A
+    continuation also gets every other tool in compact form, so the model
+    can move on to a step the user's wording did not anticipate. A purely
+    conversational first turn is sent with no tools at all. With compact
+    descriptions, each selected schema keeps only the first sentence of its
+    description. Token savings against the full catalog are kept per
+    instance.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._compact = {}  # tool name -> compact schema
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.tokens_sent = 0
+        self.tokens_saved = 0
+
+    def select(self, catalog, history, continuation=False):
+        """Return the tools for one call from the full catalog"""
+        settings = self.config.get_tool_selection()
+        if settings.get('mode', AUTO) == ALL:
+            names = [tool['name'] for tool in catalog]
+        else:
+            names = self._select_names(catalog, history, continuation, settings.get('recent_messages', 6))
+
+        compact = settings.get('compact_descriptions')
+        tools = []
+        for tool in catalog:
+            if tool['name'] in names:
+                tools.append(self._compact_schema(tool) if compact else tool)
+            elif continuation:
+                # Mid-turn the model may need a tool the user's words did not call for
+                tools.append(self._compact_schema(tool))
+
+        full_tokens = estimate_tokens(catalog)
+        sent_tokens = estimate_tokens(tools) if tools else 0
+        with self._lock:
+            self.requests += 1
+            self.tokens_sent += sent_tokens
+            self.tokens_saved += full_tokens - sent_tokens
+        logger.info(f"Sending {len(tools)} of {len(catalog)} tools "
+                    f"(~{sent_tokens} tokens, ~{full_tokens - sent_tokens} saved)")
+        return tools
+
+    def stats(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'tokens_sent': self.tokens_sent,
+                'tokens_saved': self.tokens_saved,
+            }
+
+    def _compact_schema(self, tool):
+        compact = self._compact.get(tool['name'])
+        if compact is None:
+            compact = self._compact[tool['name']] = compact_tool(tool)
+        return compact
+
+    def _select_names(self, catalog, history, continuation, recent_messages):
+        available = {tool['name'] for tool in catalog}
+        user_text, turn_tools, recent_tools, any_tools, recent_text = self._scan(history, recent_messages)
+
+        groups = set()
+        for group, pattern in GROUP_TRIGGERS.items():
+            if re.search(pattern, user_text, re.IGNORECASE):
+                groups.add(group)
+        if re.search(GROUP_TRIGGERS['results'], recent_text):
+            groups.add('results')  # A truncated result points at fetch_result
+        for name in turn_tools | recent_tools:
+            groups.update(group for group, members in TOOL_GROUPS.items() if name in members)
+        for group in list(groups):
+            groups.update(GROUP_IMPLIES.get(group, ()))
+
+        names = set(turn_tools)  # A continuation always keeps the tools it is using
+        for group in groups:
+            names.update(TOOL_GROUPS[group])
+        names &= available
+        if not names and (continuation or any_tools):
+            # Requests whose history holds tool_use blocks must define tools
+            names = (turn_tools | recent_tools) & available or set(TOOL_GROUPS['read']) & available
+        return names
+
+    @staticmethod
+    def _scan(history, recent_messages):
+        """Collect the current turn's user text and the tools used in the turn and recent history"""
+        user_text = ''
+        turn_tools = set()
+        recent_tools = set()
+        recent_text = []
+        any_tools = False
+        in_turn = True
+        for position, message in enumerate(reversed(history)):
+            blocks = [{'type': 'text', 'text': message.content}] if isinstance(message.content, str) \
+                else message.content
+            texts = []
+            for block in blocks:
+                if not isinstance(block, dict):
+                    continue
+                if block.get('type') == 'tool_use':
+                    any_tools = True
+                    if in_turn:
+                        turn_tools.add(block.get('name'))
+                    if position < recent_messages:
+                        recent_tools.add(block.get('name'))
+                elif block.get('type') == 'text':
+                    texts.append(block.get('text', ''))
+                elif block.get('type') == 'tool_result' and position < recent_messages:
+                    content = block.get('content')
+                    recent_text.append(content if isinstance(content, str) else json.dumps(content, default=str))
+                elif block.get('type') == 'document' and position < recent_messages:
+                    # A prefetched file that was too large carries a fetch_result handle
+                    source = block.get('source') or {}
+                    if source.get('type') == 'text':
+                        recent_text.append(source.get('data', ''))
+            if in_turn and message.role == 'user' and texts:
+                user_text = "\n".join(texts)
+                in_turn = False  # The user's message starts the current turn
+            if not in_turn and position >= recent_messages and any_tools:
+                break
+        return user_text, turn_tools, recent_tools, any_tools, "\n".join(recent_text)
@@ -0,0 +1,204 @@
+import os
+import json
+import time
+import uuid
+import logging
+import cProfile
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT = 'traceparent'
+
+
+def now_us():
+    """Wall-clock microseconds, comparable across processes"""
+    return time.time_ns() // 1000
+
+
+def parse_traceparent(value):
+    """Return (trace_id, parent_span_id) from a W3C traceparent header, or (None, None)"""
+    parts = (value or '').split('-')
+    if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+        return parts[1], parts[2]
+    return None, None
+
+
+class Span:
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'start_us', 'end_us',
+                 'attributes', 'process', 'pid', 'tid')
+
+    def __init__(self, name, trace_id, parent_id, process, attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.start_us = now_us()
+        self.end_us = None
+        self.attributes = attributes
+        self.process = process
+        self.pid = os.getpid()
+        self.tid = threading.get_ident()
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data):
+        span = cls.__new__(cls)
+        for name in cls.__slots__:
+            setattr(span, name, data.get(name))
+        span.attributes = span.attributes or {}
+        return span
+
+
+class Tracer:
+    """Lightweight span tracer with W3C traceparent propagation and Chrome trace export.
+
+    Spans nest per thread. When a root span ends, every span of its trace,
+    including spans returned by the tool servers, is written to one
+    trace-*.json file that chrome://tracing or Perfetto can open.
+    """
+
+    def __init__(self, process='claudechat'):
+        self.process = process
+        self.enabled = False
+        self.output_dir = None
+        self.profile_turns = False
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._traces = {}
+        self._profile_lock = threading.Lock()
+
+    def configure(self, enabled=False, output_dir=None, profile_turns=False):
+        self.enabled = enabled
+        self.output_dir = os.path.expanduser(output_dir) if output_dir else None
+        self.profile_turns = profile_turns
+        if enabled and self.output_dir:
+            os.makedirs(self.output_dir, exist_ok=True)
+
+    def configure_from_config(self, config):
+        settings = config.get_tracing()
+        self.configure(settings['enabled'], settings['output_dir'], settings['profile_turns'])
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def current(self):
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def span(self, name, parent=None, traceparent=None, **attributes):
+        """Time a block as a span; `parent` links spans across threads"""
+        if not self.enabled:
+            yield None
+            return
+
+        parent = parent or self.current()
+        remote_trace_id, remote_parent_id = parse_traceparent(traceparent)
+        if parent is not None:
+            trace_id, parent_id = parent.trace_id, parent.span_id
+        else:
+            trace_id, parent_id = remote_trace_id or uuid.uuid4().hex, remote_parent_id
+
+        span = Span(name, trace_id, parent_id, self.process, attributes)
+        stack = self._stack()
+        stack.append(span)
+        try:
+            yield span
+        except Exception as e:
+            span.attributes['error'] = str(e)
+            raise
+        finally:
+            stack.pop()
+            span.end_us = now_us()
+            self._finish(span, is_root=parent is None)
+
+    def inject(self, headers=None):
+        """Return headers carrying the current span's trace context"""
+        headers = dict(headers or {})
+        span = self.current()
+        if span is not None:
+            headers[TRACEPARENT] = f"00-{span.trace_id}-{span.span_id}-01"
+        return headers
+
+    def add_remote_spans(self, spans):
+        """Add spans reported by another process to their trace"""
+        if not self.enabled or not spans:
+            return
+        with self._lock:
+            for data in spans:
+                span = Span.from_dict(data)
+                self._traces.setdefault(span.trace_id, []).append(span)
+
+    def _finish(self, span, is_root):
+        with self._lock:
+            spans = self._traces.setdefault(span.trace_id, [])
+            spans.append(span)
+            if not is_root:
+                return
+            del self._traces[span.trace_id]
+        self.export(span, spans)
+
+    def export(self, root, spans):
+        """Write a trace as Chrome trace-event JSON"""
+        if not self.output_dir:
+            return None
+        events = []
+        processes = {}
+        for span in spans:
+            processes[span.pid] = span.process
+            events.append({
+                'name': span.name,
+                'cat': span.process,
+                'ph': 'X',
+                'ts': span.start_us,
+                'dur': max(0, (span.end_us or span.start_us) - span.start_us),
+                'pid': span.pid,
+                'tid': span.tid,
+                'args': dict(span.attributes, trace_id=span.trace_id, span_id=span.span_id,
+                             parent_id=span.parent_id),
+            })
+        for pid, process in processes.items():
+            events.append({'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': process}})
+
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(root.start_us / 1e6))
+        path = os.path.join(self.output_dir, f"trace-{stamp}-{root.trace_id[:8]}.json")
+        try:
+            with open(path, 'w') as f:
+                json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+            logger.info(f"Wrote trace {root.trace_id} ({len(spans)} spans) to {path}")
+        except OSError as e:
+            logger.error(f"Error writing trace: {e}")
+            return None
+        return path
+
+    @contextmanager
+    def profile(self, name):
+        """Capture a cProfile of the block when per-turn profiling is on"""
+        if not (self.enabled and self.profile_turns and self.output_dir) or not self._profile_lock.acquire(blocking=False):
+            # Only one profiler can run at a time; concurrent turns go unprofiled
+            yield
+            return
+        profiler = cProfile.Profile()
+        span = self.current()
+        try:
+            profiler.enable()
+            yield
+        finally:
+            profiler.disable()
+            self._profile_lock.release()
+            suffix = span.trace_id[:8] if span else uuid.uuid4().hex[:8]
+            path = os.path.join(self.output_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{suffix}.prof")
+            try:
+                profiler.dump_stats(path)
+                logger.info(f"Wrote profile to {path}")
+            except OSError as e:
+                logger.error(f"Error writing profile: {e}")
+
+
+tracer = Tracer()